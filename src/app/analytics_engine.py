@@ -0,0 +1,195 @@
+"""Optional columnar execution engine for the analytical reports.
+
+With FOOD_RESCUE_ANALYTICS_ENGINE=duckdb (and duckdb + pyarrow installed)
+the reports in reports.py run vectorized in DuckDB instead of SQLite's row
+store, and come back as Arrow-backed DataFrames (pd.ArrowDtype) with no
+per-row Python conversion.
+
+DuckDB reads the data in one of two ways:
+- attach: the SQLite file is attached read-only through DuckDB's sqlite
+  extension (needs the extension installed or downloadable)
+- mirror: tables are copied column-wise into an in-memory DuckDB database
+  via Arrow, and re-copied when the source changes and the mirror is older
+  than FOOD_RESCUE_ANALYTICS_MAX_STALENESS seconds
+'attach' is tried first when FOOD_RESCUE_DUCKDB_ATTACH=1, otherwise the mirror is used.
+"""
+import os
+import threading
+import time
+from importlib.util import find_spec
+
+import pandas as pd
+
+import db
+from reports import DUCKDB_SQL, EDA_QUERIES, REPORT_QUERIES
+
+# duckdb + pyarrow add tens of ms to every cold start; import them on first use
+HAS_DUCKDB = find_spec('duckdb') is not None and find_spec('pyarrow') is not None
+duckdb = None
+pa = None
+
+ENGINE = os.environ.get('FOOD_RESCUE_ANALYTICS_ENGINE', 'sqlite')
+MIRROR_MAX_STALENESS = float(os.environ.get('FOOD_RESCUE_ANALYTICS_MAX_STALENESS', 60))
+DUCKDB_ATTACH = os.environ.get('FOOD_RESCUE_DUCKDB_ATTACH', '0') == '1'
+MIRROR_CHUNK_SIZE = 100000
+
+MIRROR_TABLES = ('providers', 'receivers', 'food_listings', 'claims',
+                 'food_listings_archive', 'claims_archive', 'calendar')
+# Union views rebuilt on the DuckDB side: view -> (hot table, archive table)
+MIRROR_VIEWS = {
+    'food_listings_all': ('food_listings', 'food_listings_archive'),
+    'claims_all': ('claims', 'claims_archive'),
+}
+# SQLite keeps these as text; give DuckDB real temporal types
+DATE_COLUMNS = {'expiry_date': 'DATE', 'timestamp': 'TIMESTAMP'}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def _import_columnar():
+    """Import duckdb and pyarrow on first use; returns the duckdb module or None"""
+    global duckdb, pa
+    if duckdb is None and HAS_DUCKDB:
+        import duckdb as duckdb_module
+        import pyarrow as pyarrow_module
+        duckdb, pa = duckdb_module, pyarrow_module
+    return duckdb
+
+def available_engines():
+    engines = ['sqlite', 'duckdb'] if HAS_DUCKDB else ['sqlite']
+    # Only once split: the shards are then the live data for every region
+    if db.REGION is not None:
+        engines.append('sharded')
+    return engines
+
+def _arrow_column(values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite columns can mix types (e.g. numeric and text contacts)
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+def _read_arrow_table(conn, table):
+    """Read a SQLite table into an Arrow table, one column array per chunk"""
+    cursor = conn.execute(f"SELECT * FROM {table}")
+    columns = [col[0] for col in cursor.description]
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(MIRROR_CHUNK_SIZE)
+        if not rows:
+            break
+        arrays = [_arrow_column(list(values)) for values in zip(*rows)]
+        chunks.append(pa.Table.from_arrays(arrays, names=columns))
+    if not chunks:
+        return pa.table({name: pa.array([], type=pa.string()) for name in columns})
+    return pa.concat_tables(chunks, promote_options='permissive')
+
+def _source_version(path):
+    stamps = []
+    for candidate in (str(path), f'{path}-wal'):
+        try:
+            stamps.append(os.stat(candidate).st_mtime_ns)
+        except FileNotFoundError:
+            stamps.append(0)
+    return tuple(stamps)
+
+class DuckDBEngine:
+    """One DuckDB database per source file, shared by all sessions in the process"""
+
+    def __init__(self, source_path, max_staleness=MIRROR_MAX_STALENESS, attach=DUCKDB_ATTACH):
+        if _import_columnar() is None:
+            raise RuntimeError('duckdb and pyarrow are required for the columnar engine')
+        self.source_path = source_path
+        self.max_staleness = max_staleness
+        self.conn = duckdb.connect(':memory:')
+        self.lock = threading.Lock()
+        self.mode = None
+        self.loaded_version = None
+        self.loaded_at = 0.0
+        if attach:
+            try:
+                self.conn.execute('INSTALL sqlite')
+                self.conn.execute('LOAD sqlite')
+                self.conn.execute(f"ATTACH '{source_path}' AS food (TYPE sqlite, READ_ONLY)")
+                self.conn.execute('USE food')
+                self.mode = 'attach'
+            except Exception:
+                self.mode = None
+        if self.mode is None:
+            self.mode = 'mirror'
+
+    def refresh(self, force=False):
+        """(Re)build the mirror if the source changed and the copy is stale"""
+        if self.mode != 'mirror':
+            return False
+        with self.lock:
+            version = _source_version(self.source_path)
+            fresh = time.monotonic() - self.loaded_at < self.max_staleness
+            if not force and self.loaded_version is not None and (version == self.loaded_version or fresh):
+                return False
+            conn = db.get_read_connection()
+            try:
+                existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+                for table in MIRROR_TABLES:
+                    if table not in existing:
+                        continue
+                    arrow_table = _read_arrow_table(conn, table)
+                    casts = [f'TRY_CAST("{col}" AS {kind}) AS "{col}"'
+                             for col, kind in DATE_COLUMNS.items() if col in arrow_table.column_names]
+                    replace = f" REPLACE ({', '.join(casts)})" if casts else ''
+                    self.conn.register('_incoming', arrow_table)
+                    self.conn.execute(f'CREATE OR REPLACE TABLE "{table}" AS SELECT *{replace} FROM _incoming')
+                    self.conn.unregister('_incoming')
+            finally:
+                conn.close()
+            for view, (hot, archive) in MIRROR_VIEWS.items():
+                if hot not in existing:
+                    continue
+                if archive in existing:
+                    # An empty or sparse archive may have looser Arrow types; align it to the hot table
+                    hot_types = self.conn.execute(f'DESCRIBE "{hot}"').fetchall()
+                    columns = ', '.join(f'"{row[0]}"' for row in hot_types)
+                    casts = ', '.join(f'TRY_CAST("{row[0]}" AS {row[1]}) AS "{row[0]}"' for row in hot_types)
+                    body = f'SELECT {columns} FROM "{hot}" UNION ALL SELECT {casts} FROM "{archive}"'
+                else:
+                    body = f'SELECT * FROM "{hot}"'
+                self.conn.execute(f'CREATE OR REPLACE VIEW "{view}" AS {body}')
+            self.loaded_version = version
+            self.loaded_at = time.monotonic()
+            return True
+
+    def query(self, sql, params=None):
+        """Run SQL and return an Arrow-backed DataFrame"""
+        self.refresh()
+        cursor = self.conn.cursor()
+        try:
+            table = cursor.execute(sql, list(params) if params else None).arrow()
+            if hasattr(table, 'read_all'):
+                table = table.read_all()  # newer DuckDB returns a RecordBatchReader
+        finally:
+            cursor.close()
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def get_engine(source_path=None):
+    source_path = str(source_path or db.DB_PATH)
+    with _engines_lock:
+        engine = _engines.get(source_path)
+        if engine is None:
+            engine = _engines[source_path] = DuckDBEngine(source_path)
+        return engine
+
+def _sql_for(name, engine):
+    base = REPORT_QUERIES.get(name, EDA_QUERIES.get(name))
+    if base is None:
+        raise KeyError(f'Unknown report: {name}')
+    return DUCKDB_SQL.get(name, base) if engine == 'duckdb' else base
+
+def run_report(name, params=None, engine=None):
+    """Run a named report from reports.py on the chosen (or configured) engine"""
+    engine = engine or ENGINE
+    if engine == 'sharded':
+        from sharding import run_scatter_report
+        return run_scatter_report(name, params)
+    if engine == 'duckdb' and HAS_DUCKDB:
+        return get_engine().query(_sql_for(name, 'duckdb'), params)
+    return db.run_query(_sql_for(name, 'sqlite'), params)
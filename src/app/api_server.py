@@ -0,0 +1,541 @@
+"""Headless JSON API for partner integrations (POS systems, dispatch software).
+
+A small asyncio HTTP/1.1 server (stdlib only, keep-alive) over the same
+SQLite file and write paths as the Streamlit app. Database work runs on a
+thread pool; writes go through db.insert_query / execute_query, i.e. the
+group-committing write queue.
+
+    GET  /health
+    GET  /listings?city=&food_type=&meal_type=&provider_id=&q=&available=1&after=&limit=
+    GET  /listings/<food_id>
+    GET  /availability?food_id=1,2,3
+    GET  /listings/near?receiver_id= | lat=&lon=  &radius_km=&limit=
+    POST /claims            {"food_id": 1, "receiver_id": 2, "quantity": 3}
+    POST /listings/bulk     JSON list of listings, or a CSV body (text/csv)
+
+Lists are keyset-paginated on food_id: each page returns `next_after`
+(and a Link rel="next" header) to pass as `after` for the next one.
+available=1 (the default) lists only unexpired listings with quantity left.
+
+GET responses carry a strong ETag and are cached per URL, stamped with the
+change-log version they were read at. A repeat request is answered from the
+cache (or with 304 Not Modified for a matching If-None-Match) until one of
+the endpoint's tables changes, or the day changes.
+
+Claims are created with a single INSERT ... SELECT that only inserts when
+the listing is unexpired and still has the requested quantity available,
+so concurrent claims can never over-claim (or claim an expired) listing.
+
+    python src/app/api_server.py --port 8600
+    FOOD_RESCUE_API_PORT=8600 streamlit run src/app/main_sqlite.py   # alongside the app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import socket
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import StringIO
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import pandas as pd
+
+import db
+from changefeed import current_version, unchanged_between
+from coordination import is_busy_error
+from geo import DEFAULT_RADIUS_KM, NEAR_LIMIT, nearby_listings, receiver_location
+from metrics import CLAIM_CONFLICTS, CLAIM_SECONDS, CLAIMS_CREATED
+from snapshot import PRIVATE_COLUMNS
+from validation import bulk_import
+
+API_HOST = os.environ.get('FOOD_RESCUE_API_HOST', '127.0.0.1')
+# Port for the API started alongside the app; 0 leaves it off
+API_PORT = int(os.environ.get('FOOD_RESCUE_API_PORT', 0))
+# When set, every request needs "Authorization: Bearer <token>"
+API_TOKEN = os.environ.get('FOOD_RESCUE_API_TOKEN', '')
+API_WORKERS = int(os.environ.get('FOOD_RESCUE_API_WORKERS', 8))
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+MAX_AVAILABILITY_IDS = 1000
+MAX_BODY_BYTES = int(os.environ.get('FOOD_RESCUE_API_MAX_BODY', 10 * 1024 * 1024))
+RESPONSE_CACHE_ENTRIES = 1024
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+KEEPALIVE_TIMEOUT = 15
+
+LISTING_TABLES = ('food_listings', 'providers', 'claims')
+REASONS = {200: 'OK', 201: 'Created', 304: 'Not Modified', 400: 'Bad Request', 401: 'Unauthorized',
+           404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict', 411: 'Length Required',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+LISTING_COLUMNS = '''
+    f.food_id, f.food_name, f.quantity, f.expiry_date, f.provider_id, p.name AS provider_name,
+    p.city, f.location, f.food_type, f.meal_type,
+    f.quantity - COALESCE((SELECT SUM(c.claimed_quantity) FROM claims c
+                           WHERE c.food_id = f.food_id AND c.status != 'Cancelled'), 0) AS available_quantity
+'''
+SEARCH_FILTERS = {
+    'city': 'p.city = ?',
+    'food_type': 'f.food_type = ?',
+    'meal_type': 'f.meal_type = ?',
+    'provider_id': 'f.provider_id = ?',
+    'expires_before': 'f.expiry_date <= ?',
+}
+# Inserts only while the listing is unexpired and still has `quantity` unclaimed
+# (checked inside the write transaction)
+CLAIM_INSERT = '''
+    INSERT INTO claims(food_id, receiver_id, claimed_quantity, status, timestamp)
+    SELECT f.food_id, r.receiver_id, ?, 'Pending', ?
+    FROM food_listings f, receivers r
+    WHERE f.food_id = ? AND r.receiver_id = ? AND f.expiry_date >= date('now')
+      AND f.quantity - COALESCE((SELECT SUM(c.claimed_quantity) FROM claims c
+                                 WHERE c.food_id = f.food_id AND c.status != 'Cancelled'), 0) >= ?
+'''
+
+Request = namedtuple('Request', ['method', 'path', 'query', 'headers', 'body'])
+
+api_stats = {'requests': 0, 'cache_hits': 0, 'cache_misses': 0, 'not_modified': 0, 'claims': 0, 'claim_conflicts': 0, 'errors': 0}
+_stats_lock = threading.Lock()
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+_responses_bytes = 0
+_local = threading.local()
+
+def _count(stat, n=1):
+    with _stats_lock:
+        api_stats[stat] += n
+
+def api_metrics():
+    with _stats_lock:
+        stats = dict(api_stats)
+    with _responses_lock:
+        stats.update(cached_responses=len(_responses), cached_bytes=_responses_bytes)
+    return stats
+
+class ApiError(Exception):
+    """Turned into a JSON error response with this HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def ensure_api_indexes(conn):
+    """Indexes behind the availability subqueries and city search"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_claims_food_status ON claims(food_id, status, claimed_quantity)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_providers_city ON providers(city)")
+    conn.commit()
+
+def _int(value, name, minimum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f'{name} must be an integer')
+    if minimum is not None and value < minimum:
+        raise ApiError(400, f'{name} must be at least {minimum}')
+    return value
+
+def _float(value, name):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f'{name} must be a number')
+
+def _connection():
+    """This worker thread's read connection, kept open so the schema is parsed once, not per request"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != db.DB_PATH:
+        conn = _local.conn = db.get_db_connection()
+        conn.row_factory = None
+        _local.path = db.DB_PATH
+    return conn
+
+def _rows(sql, params=()):
+    cursor = _connection().execute(sql, params)
+    names = [col[0] for col in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+def get_health(request):
+    return {'status': 'ok', 'version': current_version(_connection())}
+
+def search_listings(request):
+    query = request.query
+    limit = min(_int(query.get('limit', API_PAGE_SIZE), 'limit', 1), API_MAX_PAGE_SIZE)
+    where, params = ['f.food_id > ?'], [_int(query.get('after', 0), 'after')]
+    for name, clause in SEARCH_FILTERS.items():
+        if query.get(name):
+            where.append(clause)
+            params.append(query[name])
+    if query.get('q'):
+        where.append("f.food_name LIKE ? ESCAPE '\\'")
+        params.append('%' + re.sub(r'([%_\\])', r'\\\1', query['q']) + '%')
+    if query.get('available', '1') != '0':
+        where.extend(["f.expiry_date >= date('now')", 'available_quantity > 0'])
+    items = _rows(f'''
+        SELECT {LISTING_COLUMNS}
+        FROM food_listings f
+        JOIN providers p ON p.provider_id = f.provider_id
+        WHERE {' AND '.join(where)}
+        ORDER BY f.food_id
+        LIMIT ?
+    ''', params + [limit + 1])
+    next_after = items[limit - 1]['food_id'] if len(items) > limit else None
+    return {'items': items[:limit], 'next_after': next_after}
+
+def get_listing(request, food_id):
+    items = _rows(f'''
+        SELECT {LISTING_COLUMNS}
+        FROM food_listings f
+        JOIN providers p ON p.provider_id = f.provider_id
+        WHERE f.food_id = ?
+    ''', (_int(food_id, 'food_id'),))
+    if not items:
+        raise ApiError(404, f'Listing {food_id} not found')
+    return items[0]
+
+def get_availability(request):
+    raw = request.query.get('food_id', '')
+    ids = [_int(i, 'food_id') for i in raw.split(',') if i.strip()]
+    if not ids:
+        raise ApiError(400, 'food_id is required (comma-separated)')
+    if len(ids) > MAX_AVAILABILITY_IDS:
+        raise ApiError(400, f'At most {MAX_AVAILABILITY_IDS} food_id values per request')
+    items = _rows(f'''
+        SELECT f.food_id, f.quantity,
+               COALESCE((SELECT SUM(c.claimed_quantity) FROM claims c
+                         WHERE c.food_id = f.food_id AND c.status != 'Cancelled'), 0) AS claimed
+        FROM food_listings f
+        WHERE f.food_id IN ({', '.join('?' for _ in ids)})
+    ''', ids)
+    for item in items:
+        item['available_quantity'] = (item['quantity'] or 0) - item['claimed']
+    found = {item['food_id'] for item in items}
+    return {'items': items, 'missing': [i for i in ids if i not in found]}
+
+def get_nearby(request):
+    query = request.query
+    if query.get('receiver_id'):
+        receiver_id = _int(query['receiver_id'], 'receiver_id', 1)
+        point = receiver_location(receiver_id, _connection())
+        if point is None:
+            raise ApiError(404, f'Receiver {receiver_id} not found or its city is not in the gazetteer')
+    elif query.get('lat') and query.get('lon'):
+        point = _float(query['lat'], 'lat'), _float(query['lon'], 'lon')
+        if not (-90 <= point[0] <= 90 and -180 <= point[1] <= 180):
+            raise ApiError(400, 'lat/lon out of range')
+    else:
+        raise ApiError(400, 'receiver_id, or lat and lon, is required')
+    radius_km = _float(query.get('radius_km', DEFAULT_RADIUS_KM), 'radius_km')
+    limit = min(_int(query.get('limit', NEAR_LIMIT), 'limit', 1), API_MAX_PAGE_SIZE)
+    try:
+        items = nearby_listings(*point, radius_km=radius_km, limit=limit, conn=_connection())
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    # Same public columns as /listings: no provider contact details
+    items = [{k: v for k, v in item.items() if k not in PRIVATE_COLUMNS} for item in items]
+    return {'latitude': point[0], 'longitude': point[1], 'radius_km': radius_km, 'items': items}
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b'null')
+    except ValueError:
+        raise ApiError(400, 'Body is not valid JSON')
+
+def create_claim(request):
+    body = _json_body(request)
+    if not isinstance(body, dict):
+        raise ApiError(400, 'Expected a JSON object')
+    food_id = _int(body.get('food_id'), 'food_id', 1)
+    receiver_id = _int(body.get('receiver_id'), 'receiver_id', 1)
+    quantity = _int(body.get('quantity'), 'quantity', 1)
+    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with CLAIM_SECONDS.time(source='api'):
+        rowcount, claim_id = db.insert_query(CLAIM_INSERT, (quantity, ts, food_id, receiver_id, quantity))
+    if rowcount != 1:
+        # Nothing inserted: say why
+        _count('claim_conflicts')
+        CLAIM_CONFLICTS.inc()
+        if not _rows("SELECT 1 FROM receivers WHERE receiver_id = ?", (receiver_id,)):
+            raise ApiError(404, f'Receiver {receiver_id} not found')
+        availability = get_availability(Request('GET', '', {'food_id': str(food_id)}, {}, b''))
+        if not availability['items']:
+            raise ApiError(404, f'Listing {food_id} not found')
+        if _rows("SELECT 1 FROM food_listings WHERE food_id = ? AND expiry_date < date('now')", (food_id,)):
+            raise ApiError(409, f'Listing {food_id} has expired')
+        available = availability['items'][0]['available_quantity']
+        raise ApiError(409, f'Only {available} left for listing {food_id}')
+    _count('claims')
+    CLAIMS_CREATED.inc(source='api')
+    db.log_audit('create_claim', f'claim_id={claim_id}, food_id={food_id}, receiver_id={receiver_id}, quantity={quantity}', user='api')
+    return 201, {'claim_id': claim_id, 'food_id': food_id, 'receiver_id': receiver_id,
+                 'claimed_quantity': quantity, 'status': 'Pending', 'timestamp': ts}
+
+def ingest_listings(request):
+    if request.headers.get('content-type', '').startswith('text/csv'):
+        source = StringIO(request.body.decode('utf-8'))
+    else:
+        body = _json_body(request)
+        if isinstance(body, dict):
+            body = body.get('listings')
+        if not isinstance(body, list) or not body or not all(isinstance(row, dict) for row in body):
+            raise ApiError(400, 'Expected a non-empty JSON list of listings')
+        source = StringIO(pd.DataFrame(body).to_csv(index=False))
+    try:
+        summary = bulk_import('food_listings', source)
+    except pd.errors.EmptyDataError:
+        raise ApiError(400, 'No rows to import')
+    summary['reject_file'] = os.path.basename(summary['reject_file']) if summary['reject_file'] else None
+    db.log_audit('bulk_ingest', f"table=food_listings, loaded={summary['loaded']}, rejected={summary['rejected']}", user='api')
+    return summary
+
+# (method, path pattern, handler, tables a cached GET response depends on)
+ROUTES = [
+    ('GET', re.compile(r'/health'), get_health, None),
+    ('GET', re.compile(r'/listings'), search_listings, LISTING_TABLES),
+    ('GET', re.compile(r'/listings/(\d+)'), get_listing, LISTING_TABLES),
+    ('GET', re.compile(r'/listings/near'), get_nearby, LISTING_TABLES + ('receivers',)),
+    ('GET', re.compile(r'/availability'), get_availability, ('food_listings', 'claims')),
+    ('POST', re.compile(r'/claims'), create_claim, None),
+    ('POST', re.compile(r'/listings/bulk'), ingest_listings, None),
+]
+
+def _route(method, path):
+    allowed = False
+    for route_method, pattern, handler, tables in ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            if route_method == method:
+                return handler, match.groups(), tables
+            allowed = True
+    raise ApiError(405 if allowed else 404, f'{method} {path} not supported' if allowed else f'No such endpoint: {path}')
+
+def _encode(payload):
+    return json.dumps(payload, separators=(',', ':'), default=str).encode()
+
+def _etag(body):
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+def _version():
+    try:
+        return current_version(_connection())
+    except sqlite3.OperationalError:
+        return None
+
+def _cached_get(request, handler, args, tables):
+    """(body, etag) from the response cache while `tables` are unchanged, else freshly built"""
+    # Keyed by day too: availability also changes when listings expire, without a write
+    key = (request.path, tuple(sorted(request.query.items())), datetime.utcnow().strftime('%Y-%m-%d'))
+    version = _version()
+    with _responses_lock:
+        entry = _responses.get(key)
+    if entry is not None and version is not None:
+        try:
+            fresh = unchanged_between(entry[0], version, tables, _connection())
+        except sqlite3.OperationalError:
+            fresh = False
+        if fresh:
+            with _responses_lock:
+                _responses[key] = (version,) + entry[1:]
+                _responses.move_to_end(key)
+            _count('cache_hits')
+            return entry[1], entry[2]
+    _count('cache_misses')
+    body = _encode(handler(request, *args))
+    etag = _etag(body)
+    if version is not None:
+        global _responses_bytes
+        with _responses_lock:
+            old = _responses.pop(key, None)
+            _responses_bytes += len(body) - (len(old[1]) if old else 0)
+            _responses[key] = (version, body, etag)
+            while len(_responses) > RESPONSE_CACHE_ENTRIES or _responses_bytes > RESPONSE_CACHE_BYTES:
+                _, dropped = _responses.popitem(last=False)
+                _responses_bytes -= len(dropped[1])
+    return body, etag
+
+def _link_header(request, payload):
+    if not isinstance(payload, dict) or payload.get('next_after') is None:
+        return {}
+    query = dict(request.query, after=payload['next_after'])
+    return {'Link': f'<{request.path}?{urlencode(query)}>; rel="next"'}
+
+def handle(request):
+    """Run one request; returns (status, headers, body bytes). Blocking - call off the event loop"""
+    _count('requests')
+    try:
+        if API_TOKEN and request.headers.get('authorization') != f'Bearer {API_TOKEN}':
+            raise ApiError(401, 'Missing or invalid API token')
+        handler, args, tables = _route(request.method, request.path)
+        if request.method != 'GET':
+            result = handler(request, *args)
+            status, payload = result if isinstance(result, tuple) else (200, result)
+            return status, {}, _encode(payload)
+        if tables is None:
+            return 200, {'Cache-Control': 'no-store'}, _encode(handler(request, *args))
+        body, etag = _cached_get(request, handler, args, tables)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in (tag.strip() for tag in request.headers.get('if-none-match', '').split(',')):
+            _count('not_modified')
+            return 304, headers, b''
+        if request.path == '/listings':
+            headers.update(_link_header(request, json.loads(body)))
+        return 200, headers, body
+    except ApiError as e:
+        return e.status, {}, _encode({'error': str(e)})
+    except Exception as e:
+        _count('errors')
+        if is_busy_error(e):
+            return 503, {'Retry-After': '1'}, _encode({'error': 'Database busy, retry shortly'})
+        return 500, {}, _encode({'error': str(e)})
+
+class ApiServer:
+    """asyncio HTTP/1.1 server; blocking handlers run on a thread pool"""
+
+    def __init__(self, host=API_HOST, port=API_PORT, workers=API_WORKERS):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='food-rescue-api')
+        self.server = None
+        self.loop = None
+        self.thread = None
+        self.last_error = None
+
+    async def _read_request(self, reader):
+        line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+        if not line.strip():
+            return None, None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise ApiError(400, 'Malformed request line')
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'transfer-encoding' in headers:
+            raise ApiError(411, 'Send a Content-Length body')
+        length = _int(headers.get('content-length') or 0, 'Content-Length', minimum=0)
+        if length > MAX_BODY_BYTES:
+            raise ApiError(413, f'Body over {MAX_BODY_BYTES} bytes')
+        body = await reader.readexactly(length) if length else b''
+        url = urlsplit(target)
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+        return Request(method.upper(), url.path.rstrip('/') or '/', dict(parse_qsl(url.query)), headers, body), keep_alive
+
+    def _write(self, writer, status, headers, body, keep_alive):
+        lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+                 'Content-Type: application/json',
+                 f'Content-Length: {len(body)}',
+                 f'Connection: {"keep-alive" if keep_alive else "close"}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+    async def _serve(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request, keep_alive = await self._read_request(reader)
+                except ApiError as e:
+                    self._write(writer, e.status, {}, _encode({'error': str(e)}), False)
+                    break
+                if request is None:
+                    break
+                status, headers, body = await loop.run_in_executor(self.executor, handle, request)
+                self._write(writer, status, headers, body, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        # SO_REUSEPORT lets every app process on the host bind the same API port
+        self.server = await asyncio.start_server(self._serve, self.host, self.port,
+                                                 reuse_port=hasattr(socket, 'SO_REUSEPORT'))
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start_in_thread(self):
+        """Serve on a daemon thread with its own event loop; returns once listening"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            try:
+                self.loop.run_until_complete(self.start())
+            except OSError as e:
+                self.last_error = str(e)
+                ready.set()
+                return
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name='food-rescue-api-server', daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
+
+    def status(self):
+        return {'host': self.host, 'port': self.port, 'running': self.thread is not None and self.thread.is_alive(),
+                'last_error': self.last_error, **api_metrics()}
+
+_api_server = None
+_api_server_lock = threading.Lock()
+
+def start_api_server():
+    """Start the API alongside the app once per process; no-op unless FOOD_RESCUE_API_PORT is set"""
+    global _api_server
+    if not API_PORT:
+        return None
+    with _api_server_lock:
+        if _api_server is None:
+            _api_server = ApiServer().start_in_thread()
+        return _api_server
+
+def api_status():
+    return _api_server.status() if _api_server is not None else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Food rescue partner JSON API')
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT or 8600)
+    parser.add_argument('--workers', type=int, default=API_WORKERS)
+    args = parser.parse_args(argv)
+
+    conn = db.get_db_connection()
+    try:
+        ensure_api_indexes(conn)
+    finally:
+        conn.close()
+    server = ApiServer(args.host, args.port, args.workers)
+    print(f'Serving {db.DB_PATH} on http://{args.host}:{args.port}')
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Hot/cold archival of finished claims and long-expired listings.
+
+Cold rows are moved into claims_archive / food_listings_archive so the hot
+tables that the availability aggregate scans stay small. The claims_all and
+food_listings_all views union both sides for historical reports.
+
+Only rows that cannot affect availability are moved: listings expired for
+more than `days` days with no Pending claims (together with all their
+claims), and Cancelled claims older than `days` days.
+
+    python src/app/archive.py --days 30
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+import db
+
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 5000
+
+# hot table -> (archive table, union view, primary key)
+ARCHIVED_TABLES = {
+    'food_listings': ('food_listings_archive', 'food_listings_all', 'food_id'),
+    'claims': ('claims_archive', 'claims_all', 'claim_id'),
+}
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def _table_exists(conn, table):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    return row is not None
+
+def ensure_archive_schema(conn):
+    """Create/align archive tables with their hot tables and rebuild the union views"""
+    for hot, (archive, view, pk) in ARCHIVED_TABLES.items():
+        if not _table_exists(conn, hot):
+            continue
+        hot_columns = _columns(conn, hot)
+        if not _table_exists(conn, archive):
+            conn.execute(f"CREATE TABLE {archive} AS SELECT * FROM {hot} WHERE 0")
+            conn.execute(f"ALTER TABLE {archive} ADD COLUMN archived_at DATETIME")
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{archive}_{pk} ON {archive}({pk})")
+        # Hot tables gain columns through migrations; keep the archive in step
+        archive_columns = _columns(conn, archive)
+        for column in hot_columns:
+            if column not in archive_columns:
+                conn.execute(f"ALTER TABLE {archive} ADD COLUMN {column}")
+        column_list = ', '.join(hot_columns)
+        view_sql = (f'CREATE VIEW {view} AS SELECT {column_list} FROM {hot} '
+                    f'UNION ALL SELECT {column_list} FROM {archive}')
+        # Only replace a view whose columns changed: every DROP/CREATE bumps the
+        # schema version, which makes other app processes re-run their migrations
+        current = conn.execute("SELECT sql FROM sqlite_master WHERE type='view' AND name=?", (view,)).fetchone()
+        if current is None or current[0] != view_sql:
+            conn.execute(f"DROP VIEW IF EXISTS {view}")
+            conn.execute(view_sql)
+    conn.commit()
+
+def drop_archive(conn):
+    """Remove archive tables and views (used when the hot tables are re-imported)"""
+    for archive, view, _ in ARCHIVED_TABLES.values():
+        conn.execute(f"DROP VIEW IF EXISTS {view}")
+        conn.execute(f"DROP TABLE IF EXISTS {archive}")
+    conn.commit()
+
+def _move(conn, hot, where, params):
+    """Copy matching rows into the archive table and delete them from the hot table"""
+    archive = ARCHIVED_TABLES[hot][0]
+    column_list = ', '.join(_columns(conn, hot))
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute(f'''
+        INSERT OR REPLACE INTO {archive} ({column_list}, archived_at)
+        SELECT {column_list}, ? FROM {hot} WHERE {where}
+    ''', (now, *params))
+    return conn.execute(f"DELETE FROM {hot} WHERE {where}", params).rowcount
+
+def archive_cold_rows(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, conn=None):
+    """Move cold rows to the archive in short transactions; returns moved row counts"""
+    own_conn = conn is None
+    conn = conn or db.get_db_connection()
+    moved = {'food_listings': 0, 'claims': 0}
+    cutoff = f'-{int(days)} day'
+    try:
+        ensure_archive_schema(conn)
+        while True:
+            # One batch per transaction keeps each write lock short
+            conn.execute('BEGIN IMMEDIATE')
+            food_ids = [row[0] for row in conn.execute('''
+                SELECT f.food_id FROM food_listings f
+                WHERE f.expiry_date < date('now', ?)
+                  AND NOT EXISTS (SELECT 1 FROM claims c WHERE c.food_id = f.food_id AND c.status = 'Pending')
+                LIMIT ?
+            ''', (cutoff, batch_size))]
+            if not food_ids:
+                conn.rollback()
+                break
+            marks = ', '.join('?' for _ in food_ids)
+            moved['claims'] += _move(conn, 'claims', f'food_id IN ({marks})', food_ids)
+            moved['food_listings'] += _move(conn, 'food_listings', f'food_id IN ({marks})', food_ids)
+            conn.commit()
+
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            claim_ids = [row[0] for row in conn.execute('''
+                SELECT claim_id FROM claims
+                WHERE status = 'Cancelled' AND timestamp < datetime('now', ?)
+                LIMIT ?
+            ''', (cutoff, batch_size))]
+            if not claim_ids:
+                conn.rollback()
+                break
+            marks = ', '.join('?' for _ in claim_ids)
+            moved['claims'] += _move(conn, 'claims', f'claim_id IN ({marks})', claim_ids)
+            conn.commit()
+        return moved
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+def archive_counts(conn=None):
+    """Row counts of the hot and archive tables"""
+    own_conn = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        counts = {}
+        for hot, (archive, _, _) in ARCHIVED_TABLES.items():
+            for table in (hot, archive):
+                if _table_exists(conn, table):
+                    counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return counts
+    finally:
+        if own_conn:
+            conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archive cold claims and expired listings')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    try:
+        moved = archive_cold_rows(args.days, args.batch_size)
+    except sqlite3.Error as e:
+        print(f'Archive failed: {e}')
+        return 1
+    print(f"Archived {moved['food_listings']} listings and {moved['claims']} claims")
+    print(archive_counts())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
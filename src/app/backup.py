@@ -0,0 +1,180 @@
+"""Online database backups.
+
+Copies are taken with sqlite3.Connection.backup in small page steps with a
+pause between steps, so writers only ever wait for one step. Every copy is
+integrity-checked before it is kept, and old copies are pruned by count.
+"""
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import db
+from geo import GEO_INDEX_STATEMENT, ensure_geo_schema, rebuild_listing_index
+
+BACKUP_DIR = Path(os.environ.get('FOOD_RESCUE_BACKUP_DIR', db.ROOT / 'backups'))
+BACKUP_PAGES_PER_STEP = int(os.environ.get('FOOD_RESCUE_BACKUP_PAGES', 256))
+BACKUP_STEP_PAUSE = float(os.environ.get('FOOD_RESCUE_BACKUP_PAUSE', 0.01))
+# Seconds between scheduled backups; 0 disables the scheduler
+BACKUP_INTERVAL = int(os.environ.get('FOOD_RESCUE_BACKUP_INTERVAL', 0))
+BACKUP_KEEP = int(os.environ.get('FOOD_RESCUE_BACKUP_KEEP', 7))
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def _copy(src, dst, pages, pause):
+    def progress(status, remaining, total):
+        # Yield the source between steps so claims can commit
+        if remaining and pause:
+            time.sleep(pause)
+    src.backup(dst, pages=pages, progress=progress)
+
+def verify_backup(path):
+    """Run PRAGMA integrity_check on a backup; returns (ok, message)"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute('PRAGMA integrity_check').fetchall()
+    except sqlite3.DatabaseError as e:
+        return False, str(e)
+    finally:
+        conn.close()
+    messages = [row[0] for row in rows]
+    return messages == ['ok'], '; '.join(messages)
+
+def create_backup(backup_dir=None, pages=None, pause=None):
+    """Take a verified online backup of the live database; returns its path"""
+    backup_dir = Path(backup_dir or BACKUP_DIR)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    pages = BACKUP_PAGES_PER_STEP if pages is None else pages
+    pause = BACKUP_STEP_PAUSE if pause is None else pause
+
+    target = backup_dir / f"food_rescue_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.db"
+    partial = target.with_suffix('.db.partial')
+    src = sqlite3.connect(str(db.DB_PATH))
+    dst = sqlite3.connect(str(partial))
+    try:
+        _copy(src, dst, pages, pause)
+    finally:
+        dst.close()
+        src.close()
+
+    ok, message = verify_backup(partial)
+    if not ok:
+        partial.unlink(missing_ok=True)
+        raise RuntimeError(f'Backup failed integrity check: {message}')
+    os.replace(partial, target)
+    return target
+
+def list_backups(backup_dir=None):
+    """Completed backups, newest first"""
+    backup_dir = Path(backup_dir or BACKUP_DIR)
+    if not backup_dir.exists():
+        return []
+    return sorted(backup_dir.glob('food_rescue_*.db'), key=lambda p: p.name, reverse=True)
+
+def prune_backups(keep=None, backup_dir=None):
+    """Delete all but the newest `keep` backups; returns the removed paths"""
+    keep = BACKUP_KEEP if keep is None else keep
+    removed = []
+    for path in list_backups(backup_dir)[keep:]:
+        path.unlink(missing_ok=True)
+        removed.append(path)
+    return removed
+
+def restore_backup(path, pages=None, pause=None):
+    """Copy a verified backup (or restored dump) over the live database"""
+    ok, message = verify_backup(path)
+    if not ok:
+        raise RuntimeError(f'Refusing to restore {path}: {message}')
+    src = sqlite3.connect(str(path))
+    dst = sqlite3.connect(str(db.DB_PATH))
+    try:
+        _copy(src, dst, BACKUP_PAGES_PER_STEP if pages is None else pages,
+              BACKUP_STEP_PAUSE if pause is None else pause)
+    finally:
+        dst.close()
+        src.close()
+
+def dump_sql(sink):
+    """Write a full SQL dump (schema and rows) of the live database to a text file object.
+
+    The listing_geo R*Tree is left out: iterdump() writes virtual tables as
+    raw sqlite_master inserts that do not load back. restore_sql_dump()
+    rebuilds it from the listings instead.
+    """
+    conn = sqlite3.connect(str(db.DB_PATH))
+    try:
+        for statement in conn.iterdump():
+            if not GEO_INDEX_STATEMENT.match(statement):
+                sink.write(f'{statement}\n')
+    finally:
+        conn.close()
+
+def export_sql_dump():
+    """Full SQL dump as a spooled binary file rewound to the start"""
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+    dump_sql(text)
+    text.flush()
+    text.detach()
+    spool.seek(0)
+    return spool
+
+def restore_sql_dump(dump_text):
+    """Rebuild the database from a SQL dump produced by export_sql_dump.
+
+    The dump is loaded into a scratch file and checked first, then copied
+    over the live database with the backup API, so a bad dump never
+    leaves the live file half-restored.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        staged = Path(tmp) / 'restore.db'
+        conn = sqlite3.connect(str(staged))
+        try:
+            conn.executescript(dump_text)
+            conn.commit()
+            ensure_geo_schema(conn)
+            rebuild_listing_index(conn)
+        finally:
+            conn.close()
+        restore_backup(staged)
+
+class BackupScheduler(threading.Thread):
+    """Daemon thread taking a backup every `interval` seconds with retention"""
+
+    def __init__(self, interval, keep, backup_dir=None):
+        super().__init__(name='food-rescue-backup', daemon=True)
+        self.interval = interval
+        self.keep = keep
+        self.backup_dir = backup_dir
+        self.stop_event = threading.Event()
+        self.last_backup = None
+        self.last_error = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.last_backup = create_backup(self.backup_dir)
+                prune_backups(self.keep, self.backup_dir)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+
+    def stop(self):
+        self.stop_event.set()
+
+def start_backup_scheduler(interval=None, keep=None, backup_dir=None):
+    """Start the per-process backup scheduler once; no-op when interval is 0"""
+    global _scheduler
+    interval = BACKUP_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = BackupScheduler(interval, BACKUP_KEEP if keep is None else keep, backup_dir)
+            _scheduler.start()
+        return _scheduler
@@ -0,0 +1,132 @@
+"""Benchmark the SQLite and DuckDB analytics engines on a synthetic database.
+
+    python src/app/bench_analytics.py --claims 1000000
+
+Builds a scratch database (providers, receivers, listings, claims, time
+columns, archive views), then times every report in reports.py on each
+available engine. The DuckDB mirror build is timed separately from the
+warm queries.
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import db
+from archive import ensure_archive_schema
+from reports import EDA_QUERIES, REPORT_QUERIES
+from time_dimension import ensure_time_columns
+
+CITIES = ['Mysore', 'Bangalore', 'Chennai', 'Hyderabad', 'Mumbai', 'Delhi', 'Pune', 'Kolkata',
+          'New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix']
+PROVIDER_TYPES = ['Restaurant', 'Cafe', 'Grocery Store', 'Supermarket', 'Bakery', 'Hotel', 'Catering Service']
+RECEIVER_TYPES = ['Individual', 'Food Bank', 'Shelter', 'Community Center', 'Church', 'School', 'NGO']
+FOOD_TYPES = ['Veg', 'Non-Veg', 'Vegan', 'Dairy', 'Grain', 'Fruits']
+MEAL_TYPES = ['Breakfast', 'Lunch', 'Dinner', 'Snack']
+STATUSES = ['Pending', 'Completed', 'Cancelled']
+
+def build_database(path, claims, listings, providers, receivers, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(str(path))
+    conn.executescript('''
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE providers (provider_id INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT,
+                                address TEXT, city TEXT, contact TEXT);
+        CREATE TABLE receivers (receiver_id INTEGER PRIMARY KEY, name TEXT, type TEXT, city TEXT, contact TEXT);
+        CREATE TABLE food_listings (food_id INTEGER PRIMARY KEY, food_name TEXT, quantity INTEGER,
+                                    expiry_date DATE, provider_id INTEGER, provider_type TEXT, location TEXT,
+                                    food_type TEXT, meal_type TEXT);
+        CREATE TABLE claims (claim_id INTEGER PRIMARY KEY, food_id INTEGER, receiver_id INTEGER,
+                             claimed_quantity INTEGER DEFAULT 0,
+                             status TEXT CHECK (status IN ('Pending','Completed','Cancelled')), timestamp DATETIME);
+        CREATE TABLE audit_log (id INTEGER PRIMARY KEY AUTOINCREMENT, operation TEXT NOT NULL,
+                                user TEXT DEFAULT 'streamlit', details TEXT, ts_utc DATETIME NOT NULL);
+    ''')
+    conn.executemany("INSERT INTO providers VALUES (?, ?, ?, ?, ?, ?)", (
+        (i, f'Provider {i}', rng.choice(PROVIDER_TYPES), f'{i} Main St', rng.choice(CITIES), f'+91-{9000000000 + i}')
+        for i in range(1, providers + 1)))
+    conn.executemany("INSERT INTO receivers VALUES (?, ?, ?, ?, ?)", (
+        (i, f'Receiver {i}', rng.choice(RECEIVER_TYPES), rng.choice(CITIES), f'+91-{8000000000 + i}')
+        for i in range(1, receivers + 1)))
+    conn.executemany("INSERT INTO food_listings VALUES (?, ?, ?, date('now', ?), ?, ?, ?, ?, ?)", (
+        (i, f'Item {i}', rng.randint(1, 200), f'{rng.randint(-400, 30)} day', rng.randint(1, providers),
+         rng.choice(PROVIDER_TYPES), f'Kitchen {i % 97}', rng.choice(FOOD_TYPES), rng.choice(MEAL_TYPES))
+        for i in range(1, listings + 1)))
+    conn.executemany("INSERT INTO claims VALUES (?, ?, ?, ?, ?, datetime('now', ?))", (
+        (i, rng.randint(1, listings), rng.randint(1, receivers), rng.randint(1, 5), rng.choice(STATUSES),
+         f'-{rng.randint(0, 730 * 24 * 3600)} second')
+        for i in range(1, claims + 1)))
+    conn.commit()
+    ensure_time_columns(conn)
+    ensure_archive_schema(conn)
+    conn.close()
+
+def time_call(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SQLite vs DuckDB analytics benchmark')
+    parser.add_argument('--claims', type=int, default=1000000)
+    parser.add_argument('--listings', type=int, default=200000)
+    parser.add_argument('--providers', type=int, default=5000)
+    parser.add_argument('--receivers', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db', help='reuse an existing benchmark database instead of building one')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        path = Path(args.db)
+    else:
+        path = Path(tempfile.mkdtemp(prefix='food_rescue_bench_')) / 'bench.db'
+        print(f'Building {args.claims:,} claims / {args.listings:,} listings in {path} ...')
+        started = time.perf_counter()
+        build_database(path, args.claims, args.listings, args.providers, args.receivers)
+        print(f'  built in {time.perf_counter() - started:.1f} s')
+    db.DB_PATH = path
+
+    import analytics_engine
+    engines = analytics_engine.available_engines()
+    if 'duckdb' in engines:
+        engine = analytics_engine.get_engine(path)
+        started = time.perf_counter()
+        engine.refresh(force=True)
+        print(f'DuckDB {engine.mode} ready in {time.perf_counter() - started:.2f} s')
+    else:
+        print('duckdb/pyarrow not installed: timing SQLite only')
+
+    reports = list(REPORT_QUERIES) + list(EDA_QUERIES)
+    city = db.run_query("SELECT city FROM providers LIMIT 1").iloc[0]['city']
+    header = f"{'report':<40}" + ''.join(f'{name + " (ms)":>16}' for name in engines) + f"{'rows':>10}"
+    if len(engines) > 1:
+        header += f"{'speedup':>10}"
+    print(header)
+    print('-' * len(header))
+    for name in reports:
+        params = (city,) if name == 'Provider contacts in city' else None
+        line = f'{name[:39]:<40}'
+        timings = {}
+        rows = 0
+        for engine_name in engines:
+            elapsed, df = time_call(lambda: analytics_engine.run_report(name, params, engine_name), args.repeat)
+            timings[engine_name] = elapsed
+            rows = len(df)
+            line += f'{elapsed * 1000:>16.1f}'
+        line += f'{rows:>10}'
+        if len(engines) > 1 and timings['duckdb'] > 0:
+            line += f"{timings['sqlite'] / timings['duckdb']:>9.1f}x"
+        print(line)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
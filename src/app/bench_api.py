@@ -0,0 +1,195 @@
+"""Local load test for the partner JSON API.
+
+    python src/app/bench_api.py --connections 32 --duration 10
+
+Starts api_server.py in its own process on a scratch copy of the database
+(seeded with a few small listings by load_harness.prepare_database), then
+drives it from keep-alive client connections with a mix of searches,
+listing lookups, availability checks, conditional GETs and claims against
+the contended listings. Prints requests/sec and latency per endpoint, and
+fails (exit 1) on server errors or if any listing ended up over-claimed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import db
+from api_server import ensure_api_indexes
+from changefeed import ensure_change_log
+from load_harness import check_over_claims, percentile, prepare_database
+
+SERVER = Path(__file__).resolve().parent / 'api_server.py'
+# operation -> weight
+MIX = {'search': 30, 'listing': 20, 'availability': 20, 'conditional': 20, 'claim': 10}
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class Client:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b''
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}', f'Content-Length: {len(payload)}']
+        if payload:
+            lines.append('Content-Type: application/json')
+        lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(response_headers.get('content-length', 0)))
+        if response_headers.get('connection') == 'close':
+            await self.close()
+        return status, response_headers, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+async def _worker(host, port, deadline, targets, rng, results):
+    client = Client(host, port)
+    etags = {}
+    ops, weights = list(MIX), list(MIX.values())
+    try:
+        while time.perf_counter() < deadline:
+            op = rng.choices(ops, weights)[0]
+            headers = None
+            if op == 'search':
+                path = '/listings?' + urlencode({'limit': 50, 'city': rng.choice(targets['cities'])})
+            elif op == 'listing':
+                path = f"/listings/{rng.choice(targets['food_ids'])}"
+            elif op == 'availability':
+                ids = rng.sample(targets['food_ids'], min(10, len(targets['food_ids'])))
+                path = '/availability?food_id=' + ','.join(str(i) for i in ids)
+            elif op == 'conditional':
+                path = '/listings?' + urlencode({'limit': 50, 'city': targets['cities'][0]})
+                headers = {'If-None-Match': etags[path]} if path in etags else None
+            started = time.perf_counter()
+            if op == 'claim':
+                status, _, _ = await client.request('POST', '/claims', {
+                    'food_id': rng.choice(targets['contended']), 'receiver_id': rng.choice(targets['receiver_ids']),
+                    'quantity': 1})
+            else:
+                status, response_headers, _ = await client.request('GET', path, headers=headers)
+                if 'etag' in response_headers:
+                    etags[path] = response_headers['etag']
+            results.append((op, status, time.perf_counter() - started))
+    finally:
+        await client.close()
+
+async def _drive(host, port, connections, duration, targets, seed):
+    results = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(_worker(host, port, deadline, targets, random.Random(seed + i), results)
+                           for i in range(connections)))
+    return results
+
+def _targets(db_path, contended):
+    conn = db.get_db_connection()
+    try:
+        cities = [r[0] for r in conn.execute("SELECT DISTINCT city FROM providers WHERE city IS NOT NULL LIMIT 20")]
+        food_ids = [r[0] for r in conn.execute("SELECT food_id FROM food_listings ORDER BY food_id")]
+        receiver_ids = [r[0] for r in conn.execute("SELECT receiver_id FROM receivers LIMIT 100")]
+    finally:
+        conn.close()
+    return {'cities': cities, 'food_ids': food_ids, 'receiver_ids': receiver_ids,
+            'contended': food_ids[-contended:]}
+
+def _wait_for_server(host, port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('API server exited during startup')
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('API server did not start')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the partner JSON API')
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--workers', type=int, default=8, help='server thread pool size')
+    parser.add_argument('--source', default=str(db.DB_PATH), help='database to copy')
+    parser.add_argument('--contended', type=int, default=3, help='small listings all claims go to')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    db_path = prepare_database(args.source, args.contended, 20)
+    db.DB_PATH = db_path
+    conn = db.get_db_connection()
+    try:
+        ensure_change_log(conn)
+        ensure_api_indexes(conn)
+    finally:
+        conn.close()
+    baseline = {food_id: claimed for food_id, _, claimed in check_over_claims(db_path)}
+    targets = _targets(db_path, args.contended)
+
+    host, port = '127.0.0.1', _free_port()
+    env = dict(os.environ, FOOD_RESCUE_DB=str(db_path), FOOD_RESCUE_JOBS='0')
+    server = subprocess.Popen([sys.executable, str(SERVER), '--host', host, '--port', str(port),
+                               '--workers', str(args.workers)], env=env, stdout=subprocess.DEVNULL)
+    try:
+        _wait_for_server(host, port, server)
+        started = time.perf_counter()
+        results = asyncio.run(_drive(host, port, args.connections, args.duration, targets, args.seed))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    over_claims = [row for row in check_over_claims(db_path)
+                   if row[0] not in baseline or row[2] > baseline[row[0]]]
+    print(f'{len(results)} requests from {args.connections} connections in {elapsed:.1f}s: '
+          f'{len(results) / elapsed:.0f} requests/sec')
+    print(f"{'operation':<14} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}  statuses")
+    for op in MIX:
+        rows = [r for r in results if r[0] == op]
+        latencies = [r[2] for r in rows]
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+        print(f'{op:<14} {len(rows):>9} {len(rows) / elapsed:>8.0f} {percentile(latencies, 50) * 1000:>8.2f} '
+              f'{percentile(latencies, 99) * 1000:>8.2f}  {dict(sorted(statuses.items()))}')
+
+    failures = []
+    server_errors = sum(1 for _, status, _ in results if status >= 500)
+    if server_errors:
+        failures.append(f'{server_errors} server errors')
+    if over_claims:
+        failures.append(f'over-claimed listings: {over_claims}')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    shutil.rmtree(db_path.parent, ignore_errors=True)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Benchmark nearest-listing search on a synthetic database.
+
+    python src/app/bench_geo.py --listings 300000
+
+Builds a scratch database with bench_analytics.build_database, makes every
+listing unexpired, then times geo.nearby_listings from random receivers
+against a full scan computing every available listing's distance. By default
+every provider sits on its city's gazetteer point, as geocoding places it;
+--spread N scatters providers up to N km around their city instead (as
+precise addresses would).
+"""
+import argparse
+import math
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import db
+from bench_analytics import build_database
+from geo import DEFAULT_RADIUS_KM, KM_PER_DEGREE, ensure_geo_schema, geo_status, haversine_km, nearby_listings
+
+# Every available, unexpired listing with its point: what a search without the index has to read
+FULL_SCAN = '''
+    SELECT f.food_id, p.latitude, p.longitude, f.expiry_date
+    FROM food_listings f JOIN providers p ON p.provider_id = f.provider_id
+    WHERE f.expiry_date >= date('now') AND p.latitude IS NOT NULL
+      AND f.quantity - COALESCE((SELECT SUM(c.claimed_quantity) FROM claims c
+                                 WHERE c.food_id = f.food_id AND c.status != 'Cancelled'), 0) > 0
+'''
+
+def full_scan(conn, lat, lon, radius_km, limit):
+    rows = []
+    for food_id, p_lat, p_lon, expiry in conn.execute(FULL_SCAN):
+        distance = haversine_km(lat, lon, p_lat, p_lon)
+        if distance <= radius_km:
+            rows.append((distance, expiry, food_id))
+    return sorted(rows)[:limit]
+
+def spread_providers(conn, spread_km, rng):
+    """Move each geocoded provider to a random point within spread_km of its city centre"""
+    points = conn.execute("SELECT provider_id, latitude, longitude FROM providers WHERE latitude IS NOT NULL").fetchall()
+    moved = []
+    for provider_id, lat, lon in points:
+        distance, bearing = spread_km * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+        moved.append((lat + distance * math.cos(bearing) / KM_PER_DEGREE,
+                      lon + distance * math.sin(bearing) / (KM_PER_DEGREE * math.cos(math.radians(lat))),
+                      provider_id))
+    # The providers_geo_move trigger re-indexes each provider's listings
+    conn.executemany("UPDATE providers SET latitude = ?, longitude = ? WHERE provider_id = ?", moved)
+    conn.commit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Nearest-listing search benchmark')
+    parser.add_argument('--listings', type=int, default=300000)
+    parser.add_argument('--claims', type=int, default=300000)
+    parser.add_argument('--providers', type=int, default=20000)
+    parser.add_argument('--receivers', type=int, default=5000)
+    parser.add_argument('--spread', type=float, default=0.0, help='km around each city centre (0: city points)')
+    parser.add_argument('--radius', type=float, default=DEFAULT_RADIUS_KM, help='search radius, km')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    path = Path(tempfile.mkdtemp(prefix='food_rescue_geo_')) / 'bench.db'
+    print(f'Building {args.listings:,} listings / {args.providers:,} providers in {path} ...')
+    started = time.perf_counter()
+    build_database(path, args.claims, args.listings, args.providers, args.receivers, args.seed)
+    db.DB_PATH = path
+    conn = db.get_db_connection()
+    conn.row_factory = None
+    conn.execute("UPDATE food_listings SET expiry_date = date('now', '+' || (food_id % 14) || ' day')")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_claims_food_status ON claims(food_id, status, claimed_quantity)")
+    conn.commit()
+    ensure_geo_schema(conn)
+    if args.spread:
+        spread_providers(conn, args.spread, rng)
+    conn.execute('ANALYZE')
+    print(f'  built and indexed in {time.perf_counter() - started:.1f} s: {geo_status(conn)}')
+
+    receivers = conn.execute("SELECT latitude, longitude FROM receivers WHERE latitude IS NOT NULL").fetchall()
+    points = [rng.choice(receivers) for _ in range(args.queries)]
+    timings, found = [], []
+    for lat, lon in points:
+        started = time.perf_counter()
+        found.append(len(nearby_listings(lat, lon, args.radius, args.limit, conn=conn)))
+        timings.append(time.perf_counter() - started)
+    scans = []
+    for lat, lon in points[:5]:
+        started = time.perf_counter()
+        expected = full_scan(conn, lat, lon, args.radius, args.limit)
+        scans.append(time.perf_counter() - started)
+        got = [item['distance_km'] for item in nearby_listings(lat, lon, args.radius, args.limit, conn=conn)]
+        # Points are stored as 32-bit floats in the R*Tree: distances agree to about a metre
+        if len(got) != len(expected) or any(abs(a - b) > 0.01 for a, (b, _, _) in zip(got, expected)):
+            print(f'FAIL: results differ from the full scan at ({lat}, {lon})')
+            return 1
+    conn.close()
+
+    timings.sort()
+    print(f'{args.queries} searches, radius {args.radius:g} km, limit {args.limit}: '
+          f'p50 {statistics.median(timings) * 1000:.2f} ms, p99 {timings[int(len(timings) * 0.99) - 1] * 1000:.2f} ms, '
+          f'avg {statistics.mean(found):.1f} results')
+    print(f'full scan: {statistics.median(scans) * 1000:.0f} ms per search (same results)')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
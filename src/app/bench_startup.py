@@ -0,0 +1,119 @@
+"""Cold-start benchmark for the Streamlit app with a time budget.
+
+    python src/app/bench_startup.py --runs 5 --budget 1.5
+
+Each run is a fresh Python process, like a newly autoscaled worker: it
+imports the framework (streamlit + pandas, which a real server has loaded
+before the first session arrives), then renders the app's default page
+once through Streamlit's headless AppTest runner and reruns it once more.
+The database is a scratch copy that is migrated before timing starts, as
+it would be by the first worker.
+
+Exits with status 1 when the median first render or rerun is over budget,
+so CI can run it as a startup regression check.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent / 'main_sqlite.py'
+STARTUP_BUDGET = float(os.environ.get('FOOD_RESCUE_STARTUP_BUDGET', 1.5))
+RERUN_BUDGET = float(os.environ.get('FOOD_RESCUE_RERUN_BUDGET', 0.5))
+# Modules only the pages that use them should import (streamlit itself
+# already loads the plotly and pyarrow base packages)
+DEFERRED_MODULES = ('plotly.express', 'duckdb', 'pyarrow.parquet', 'zstandard')
+
+def child():
+    """Time one cold start in this process and print the result as JSON"""
+    logging.disable(logging.CRITICAL)
+    started = time.perf_counter()
+    import pandas  # noqa: F401
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    framework = time.perf_counter() - started
+
+    before = set(sys.modules)
+    at = AppTest.from_file(str(APP), default_timeout=120)
+    started = time.perf_counter()
+    at.run()
+    first_render = time.perf_counter() - started
+    deferred = sorted(name for name in DEFERRED_MODULES if name in sys.modules and name not in before)
+
+    started = time.perf_counter()
+    at.run()
+    rerun = time.perf_counter() - started
+    print(json.dumps({
+        'framework_s': framework,
+        'first_render_s': first_render,
+        'rerun_s': rerun,
+        'errors': [str(e.value) for e in at.exception],
+        'loaded_deferred': deferred,
+    }))
+
+def _run_child(env):
+    result = subprocess.run([sys.executable, __file__, '--child'], env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def run_bench(runs, source):
+    workdir = Path(tempfile.mkdtemp(prefix='food_rescue_startup_'))
+    env = dict(os.environ, FOOD_RESCUE_DB=str(workdir / 'food_rescue.db'),
+               FOOD_RESCUE_JOBS='0', FOOD_RESCUE_BACKUP_INTERVAL='0')
+    try:
+        shutil.copy2(source, env['FOOD_RESCUE_DB'])
+        # First worker: creates the change log, indexes, job table...
+        _run_child(env)
+        return [_run_child(env) for _ in range(runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cold-start benchmark with a time budget')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET,
+                        help='max median seconds for the first render')
+    parser.add_argument('--rerun-budget', type=float, default=RERUN_BUDGET,
+                        help='max median seconds for a rerun')
+    parser.add_argument('--source', default=str(APP.parents[2] / 'food_rescue.db'),
+                        help='database to copy')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    results = run_bench(args.runs, args.source)
+    print(f"{'run':>4} {'framework':>10} {'first render':>13} {'rerun':>8}")
+    for i, r in enumerate(results, 1):
+        print(f"{i:>4} {r['framework_s']:>9.3f}s {r['first_render_s']:>12.3f}s {r['rerun_s']:>7.3f}s")
+    first = statistics.median(r['first_render_s'] for r in results)
+    rerun = statistics.median(r['rerun_s'] for r in results)
+    print(f'median first render {first:.3f}s (budget {args.budget:.3f}s), '
+          f'rerun {rerun:.3f}s (budget {args.rerun_budget:.3f}s)')
+
+    failures = []
+    if first > args.budget:
+        failures.append('first render over budget')
+    if rerun > args.rerun_budget:
+        failures.append('rerun over budget')
+    errors = {e for r in results for e in r['errors']}
+    if errors:
+        failures.append(f'app raised: {sorted(errors)}')
+    loaded = {m for r in results for m in r['loaded_deferred']}
+    if loaded:
+        failures.append(f'deferred modules imported at startup: {sorted(loaded)}')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,349 @@
+"""Change-data-capture feed for live dashboards.
+
+Triggers on the tracked tables append one row per insert/update/delete to
+change_log, whose INTEGER PRIMARY KEY is a monotonic version number. Readers
+remember the last version they saw and fetch only the newer rows with
+changes_since(), so keeping a dashboard current costs work proportional to
+the number of changes rather than to the size of the tables.
+
+A reset row (op 'R') is logged whenever the triggers had to be recreated
+(e.g. after a CSV re-import dropped the tables); consumers must reload.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+import db
+
+# table -> (key column, columns captured in old/new values)
+TRACKED_TABLES = {
+    'providers': ('provider_id', ('city',)),
+    'receivers': ('receiver_id', ('city',)),
+    'food_listings': ('food_id', ('quantity', 'provider_id')),
+    'food_listings_archive': ('food_id', ('quantity', 'provider_id')),
+    'claims': ('claim_id', ('food_id', 'status', 'claimed_quantity', 'ts_week')),
+    'claims_archive': ('claim_id', ('food_id', 'status', 'claimed_quantity', 'ts_week')),
+}
+# How often the notifier polls MAX(version), in seconds
+POLL_INTERVAL = float(os.environ.get('FOOD_RESCUE_CHANGE_POLL', 1.0))
+CHANGES_PAGE_SIZE = 10000
+# Rerun interval of the home page statistics when live updates are on
+LIVE_REFRESH_SECONDS = float(os.environ.get('FOOD_RESCUE_LIVE_REFRESH', 5))
+
+ChangeBatch = namedtuple('ChangeBatch', ['version', 'changes', 'reset'])
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def _json_values(prefix, columns):
+    pairs = ', '.join(f"'{col}', {prefix}.{col}" for col in columns)
+    return f'json_object({pairs})' if pairs else 'NULL'
+
+def ensure_change_log(conn):
+    """Create change_log and the capture triggers on every tracked table that exists"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D', 'R')),
+            row_key INTEGER,
+            old_values TEXT,
+            new_values TEXT,
+            ts_utc DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger'")}
+    recreated = False
+    for table, (key, tracked) in TRACKED_TABLES.items():
+        existing = _columns(conn, table)
+        if not existing:
+            continue
+        captured = [col for col in tracked if col in existing]
+        old_json, new_json = _json_values('OLD', captured), _json_values('NEW', captured)
+        for suffix, event, op, key_ref, old_sql, new_sql in (
+                ('ai', 'AFTER INSERT', 'I', 'NEW', 'NULL', new_json),
+                ('au', 'AFTER UPDATE', 'U', 'NEW', old_json, new_json),
+                ('ad', 'AFTER DELETE', 'D', 'OLD', old_json, 'NULL')):
+            name = f'{table}_cdc_{suffix}'
+            if name in triggers:
+                continue
+            recreated = True
+            conn.execute(f'''
+                CREATE TRIGGER {name} {event} ON {table}
+                BEGIN
+                    INSERT INTO change_log(table_name, op, row_key, old_values, new_values)
+                    VALUES ('{table}', '{op}', {key_ref}.{key}, {old_sql}, {new_sql});
+                END
+            ''')
+    if recreated:
+        # Rows written while the triggers were missing were not captured
+        conn.execute("INSERT INTO change_log(table_name, op) VALUES ('*', 'R')")
+    conn.commit()
+
+def current_version(conn=None):
+    """Latest change version (0 when nothing has been logged)"""
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        row = conn.execute("SELECT MAX(version) FROM change_log").fetchone()
+        return row[0] or 0
+    finally:
+        if own:
+            conn.close()
+
+def changes_since(version, tables=None, limit=CHANGES_PAGE_SIZE, conn=None):
+    """Changes after `version` as a ChangeBatch(version, changes DataFrame, reset)
+
+    old_values/new_values are decoded to dicts. `reset` is True when a reset
+    marker was logged or the requested version has been pruned away; the
+    caller should then reload from the tables instead of applying deltas.
+    """
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        oldest = conn.execute("SELECT MIN(version) FROM change_log").fetchone()[0]
+        sql = "SELECT version, table_name, op, row_key, old_values, new_values, ts_utc FROM change_log WHERE version > ?"
+        params = [version]
+        if tables:
+            sql += f" AND (table_name IN ({', '.join('?' for _ in tables)}) OR op = 'R')"
+            params.extend(tables)
+        sql += " ORDER BY version LIMIT ?"
+        params.append(limit)
+        changes = pd.read_sql_query(sql, conn, params=params)
+        latest = int(changes['version'].iloc[-1]) if not changes.empty else max(version, current_version(conn))
+    finally:
+        if own:
+            conn.close()
+    for column in ('old_values', 'new_values'):
+        changes[column] = [json.loads(v) if isinstance(v, str) else None for v in changes[column]]
+    pruned = oldest is not None and version and version < oldest - 1
+    reset = bool(pruned or (changes['op'] == 'R').any())
+    return ChangeBatch(latest, changes, reset)
+
+def changed_since(version, tables, conn=None):
+    """True when any of `tables` changed (or a reset was logged) after `version`
+
+    Only scans the log rows newer than `version`, so it stays cheap however
+    long the log is.
+    """
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        marks = ', '.join('?' for _ in tables)
+        row = conn.execute(f'''
+            SELECT 1 FROM change_log
+            WHERE version > ? AND (table_name IN ({marks}) OR op = 'R')
+            LIMIT 1
+        ''', [version, *tables]).fetchone()
+        return row is not None
+    finally:
+        if own:
+            conn.close()
+
+def unchanged_between(cached_version, version, tables, conn=None):
+    """True when a result read at `cached_version` is still valid at `version`"""
+    if cached_version == version:
+        return True
+    if version < cached_version:
+        # The log went backwards (restore / re-import)
+        return False
+    return not changed_since(cached_version, tables, conn)
+
+def prune_changes(keep=100000, conn=None):
+    """Drop all but the newest `keep` change rows; returns rows deleted"""
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        deleted = conn.execute("DELETE FROM change_log WHERE version <= (SELECT MAX(version) FROM change_log) - ?",
+                               (keep,)).rowcount
+        conn.commit()
+        return deleted
+    finally:
+        if own:
+            conn.close()
+
+class ChangeNotifier:
+    """Polls the log head once per interval for the whole process and wakes waiters
+
+    Sessions call wait_for_change() or subscribe() instead of each polling
+    the database; the only per-interval cost is one primary-key lookup.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.version = None
+        self.condition = threading.Condition()
+        self.subscribers = []
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='food-rescue-changefeed', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def subscribe(self, callback):
+        """Call callback(version) on the notifier thread whenever the version advances"""
+        with self.condition:
+            self.subscribers.append(callback)
+        return lambda: self.unsubscribe(callback)
+
+    def unsubscribe(self, callback):
+        with self.condition:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def wait_for_change(self, after_version, timeout=None):
+        """Block until the log is past after_version (or timeout); returns the latest version"""
+        self.start()
+        with self.condition:
+            self.condition.wait_for(lambda: self.version is not None and self.version > after_version, timeout)
+            return self.version
+
+    def _run(self):
+        while True:
+            try:
+                version = current_version()
+            except Exception:
+                version = None
+            if version is not None and version != self.version:
+                with self.condition:
+                    self.version = version
+                    subscribers = list(self.subscribers)
+                    self.condition.notify_all()
+                for callback in subscribers:
+                    try:
+                        callback(version)
+                    except Exception:
+                        pass
+            if self.stop_event.wait(self.interval):
+                break
+
+def get_notifier():
+    """Process-wide started notifier"""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = ChangeNotifier()
+            _notifier.start()
+        return _notifier
+
+def _week_label(week):
+    return f'{week // 100}-W{week % 100:02d}'
+
+class DashboardStats:
+    """Home page KPIs and chart series kept current by applying change deltas"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.counts = {}
+        self.status_counts = {}
+        self.week_counts = {}
+        self.full_loads = 0
+        self.deltas_applied = 0
+
+    def _load(self, conn):
+        # One read transaction so the counts match the version they are stamped with
+        conn.execute('BEGIN')
+        try:
+            version = current_version(conn)
+            self.counts = {
+                'providers': conn.execute("SELECT COUNT(*) FROM providers").fetchone()[0],
+                'receivers': conn.execute("SELECT COUNT(*) FROM receivers").fetchone()[0],
+                'listings': conn.execute("SELECT COUNT(*) FROM food_listings_all").fetchone()[0],
+                'claims': conn.execute("SELECT COUNT(*) FROM claims_all").fetchone()[0],
+            }
+            self.status_counts = dict(conn.execute("SELECT status, COUNT(*) FROM claims_all GROUP BY status").fetchall())
+            self.week_counts = dict(conn.execute('''
+                SELECT c.ts_week, COUNT(*) FROM claims_all c
+                JOIN calendar cal ON cal.day = c.ts_day
+                GROUP BY c.ts_week
+            ''').fetchall())
+        finally:
+            conn.rollback()
+        self.version = version
+        self.full_loads += 1
+
+    def _count(self, mapping, key, delta):
+        if key is None:
+            return
+        mapping[key] = mapping.get(key, 0) + delta
+        if mapping[key] <= 0:
+            del mapping[key]
+
+    def _apply_row(self, row):
+        table = row.table_name
+        sign_old, sign_new = {'I': (0, 1), 'U': (1, 1), 'D': (1, 0)}[row.op]
+        if table in ('providers', 'receivers'):
+            self.counts[table] += sign_new - sign_old
+        elif table in ('food_listings', 'food_listings_archive'):
+            self.counts['listings'] += sign_new - sign_old
+        elif table in ('claims', 'claims_archive'):
+            self.counts['claims'] += sign_new - sign_old
+            for values, sign in ((row.old_values, -sign_old), (row.new_values, sign_new)):
+                if sign and values:
+                    self._count(self.status_counts, values.get('status'), sign)
+                    self._count(self.week_counts, values.get('ts_week'), sign)
+
+    def refresh(self):
+        """Bring the stats up to date; returns the number of changes applied (-1 for a full load)"""
+        with self.lock:
+            conn = db.get_db_connection()
+            try:
+                if self.version is None:
+                    self._load(conn)
+                    return -1
+                applied = 0
+                while True:
+                    batch = changes_since(self.version, tables=list(TRACKED_TABLES), conn=conn)
+                    if batch.reset:
+                        self._load(conn)
+                        return -1
+                    for row in batch.changes.itertuples(index=False):
+                        self._apply_row(row)
+                    applied += len(batch.changes)
+                    self.version = batch.version
+                    if len(batch.changes) < CHANGES_PAGE_SIZE:
+                        break
+                self.deltas_applied += applied
+                return applied
+            finally:
+                conn.close()
+
+    def snapshot(self):
+        """Copies of the current KPIs and chart frames"""
+        with self.lock:
+            completed = self.status_counts.get('Completed', 0)
+            claims = self.counts.get('claims', 0)
+            status = pd.DataFrame(sorted(self.status_counts.items()), columns=['status', 'count'])
+            weeks = sorted(self.week_counts.items())
+            weekly = pd.DataFrame({'week': [_week_label(w) for w, _ in weeks], 'claims': [c for _, c in weeks]})
+            return {
+                'version': self.version,
+                'counts': dict(self.counts),
+                'pct_completed': completed / claims * 100 if claims > 0 else 0,
+                'status': status,
+                'weekly': weekly,
+            }
+
+_dashboard_stats = None
+_dashboard_stats_path = None
+
+def get_dashboard_stats():
+    """Process-wide stats for the current DB_PATH, shared by every session"""
+    global _dashboard_stats, _dashboard_stats_path
+    with _notifier_lock:
+        if _dashboard_stats is None or _dashboard_stats_path != db.DB_PATH:
+            _dashboard_stats = DashboardStats()
+            _dashboard_stats_path = db.DB_PATH
+        return _dashboard_stats
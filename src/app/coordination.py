@@ -0,0 +1,147 @@
+"""Cross-process coordination for several app processes sharing one SQLite file.
+
+- connections get a busy timeout and WAL journal mode
+- SQLITE_BUSY / 'database is locked' is retried with jittered exponential backoff
+- first-run init/migration runs under an exclusive file lock
+- the WAL is checkpointed once it grows past a size limit
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BUSY_TIMEOUT_MS = int(os.environ.get('FOOD_RESCUE_BUSY_TIMEOUT_MS', 5000))
+BUSY_RETRIES = int(os.environ.get('FOOD_RESCUE_BUSY_RETRIES', 5))
+BUSY_BACKOFF_BASE = float(os.environ.get('FOOD_RESCUE_BUSY_BACKOFF_BASE', 0.05))
+BUSY_BACKOFF_MAX = float(os.environ.get('FOOD_RESCUE_BUSY_BACKOFF_MAX', 2.0))
+JOURNAL_MODE = os.environ.get('FOOD_RESCUE_JOURNAL_MODE', 'WAL')
+WAL_AUTOCHECKPOINT_PAGES = int(os.environ.get('FOOD_RESCUE_WAL_AUTOCHECKPOINT', 1000))
+# Force a TRUNCATE checkpoint when the -wal file grows beyond this
+WAL_MAX_BYTES = int(os.environ.get('FOOD_RESCUE_WAL_MAX_BYTES', 64 * 1024 * 1024))
+INIT_LOCK_TIMEOUT = float(os.environ.get('FOOD_RESCUE_INIT_LOCK_TIMEOUT', 300))
+
+busy_stats = {'retries': 0, 'gave_up': 0, 'wait_s': 0.0, 'checkpoints': 0}
+_stats_lock = threading.Lock()
+_journal_configured = set()
+_journal_lock = threading.Lock()
+
+def is_busy_error(exc):
+    """True for SQLITE_BUSY/LOCKED, including pandas' wrapped DatabaseError"""
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database is busy' in message or 'database table is locked' in message
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Full-jitter exponential backoff for the given 0-based attempt"""
+    base = BUSY_BACKOFF_BASE if base is None else base
+    cap = BUSY_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def retry_on_busy(fn, *args, retries=None, **kwargs):
+    """Call fn, retrying busy errors with jittered exponential backoff"""
+    retries = BUSY_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not is_busy_error(e):
+                raise
+            if attempt >= retries:
+                with _stats_lock:
+                    busy_stats['gave_up'] += 1
+                raise
+            delay = backoff_delay(attempt)
+            with _stats_lock:
+                busy_stats['retries'] += 1
+                busy_stats['wait_s'] += delay
+            time.sleep(delay)
+            attempt += 1
+
+def configure_connection(conn, path):
+    """Apply busy timeout and (once per file per process) the journal/checkpoint policy"""
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    key = str(path)
+    if key in _journal_configured or not JOURNAL_MODE:
+        return conn
+    with _journal_lock:
+        if key not in _journal_configured:
+            # journal_mode=WAL is persistent in the file, so this only has to
+            # succeed once; it needs a brief exclusive lock, hence the retry
+            retry_on_busy(conn.execute, f'PRAGMA journal_mode = {JOURNAL_MODE}')
+            conn.execute(f'PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT_PAGES}')
+            _journal_configured.add(key)
+    return conn
+
+def connect(path, **kwargs):
+    conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT_MS / 1000, **kwargs)
+    return configure_connection(conn, path)
+
+def wal_size(path):
+    wal = Path(f'{path}-wal')
+    return wal.stat().st_size if wal.exists() else 0
+
+def checkpoint(conn, mode='PASSIVE'):
+    """Run a WAL checkpoint; returns (busy, wal_pages, checkpointed_pages)"""
+    result = retry_on_busy(lambda: conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone())
+    with _stats_lock:
+        busy_stats['checkpoints'] += 1
+    return tuple(result) if result else (0, 0, 0)
+
+def maybe_checkpoint(conn, path, max_bytes=None):
+    """TRUNCATE-checkpoint when the WAL outgrew max_bytes (autocheckpoint can't shrink it)"""
+    max_bytes = WAL_MAX_BYTES if max_bytes is None else max_bytes
+    if wal_size(path) > max_bytes:
+        return checkpoint(conn, 'TRUNCATE')
+    return None
+
+def lock_path(path, name='init'):
+    path = Path(path)
+    return path.with_name(f'{path.name}.{name}.lock')
+
+@contextmanager
+def file_lock(path, timeout=None):
+    """Exclusive inter-process lock on `path`, polling until `timeout` seconds"""
+    timeout = INIT_LOCK_TIMEOUT if timeout is None else timeout
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = open(path, 'a+')
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    try:
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f'Timed out waiting for lock {path}')
+                time.sleep(backoff_delay(attempt, base=0.05, cap=0.5))
+                attempt += 1
+        yield
+    finally:
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        handle.close()
+
+def coordination_metrics():
+    with _stats_lock:
+        return dict(busy_stats)
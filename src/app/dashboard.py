@@ -0,0 +1,59 @@
+"""Home dashboard building blocks shared by the app and the snapshot publisher"""
+import pandas as pd
+
+from figure_cache import bucket_series
+
+# Listings expiring within this many days are highlighted
+NEAR_EXPIRY_DAYS = 3
+LISTING_COLUMNS = ['food_id', 'food_name', 'quantity', 'expiry_date', 
+                   'provider_name', 'city', 'food_type', 'meal_type', 
+                   'location', 'provider_contact']
+
+def status_pie(claims_data):
+    if claims_data.empty:
+        return None
+    # Deferred: only the dashboard and EDA pages draw Plotly charts
+    import plotly.express as px
+    fig = px.pie(claims_data, names='status', values='count', 
+                 color_discrete_sequence=['#667eea', '#4ECDC4', '#FF6B6B'],
+                 hole=0.4)
+    fig.update_layout(
+        showlegend=True,
+        height=350,
+        margin=dict(t=30, b=0, l=0, r=0)
+    )
+    return fig
+
+def weekly_area(weekly_data):
+    if weekly_data.empty:
+        return None
+    import plotly.express as px
+    # Long histories are summed into buckets of several weeks
+    weekly_data, weeks = bucket_series(weekly_data, 'week', 'claims')
+    fig = px.area(weekly_data, x='week', y='claims',
+                  color_discrete_sequence=['#667eea'])
+    fig.update_layout(
+        showlegend=False,
+        height=350,
+        margin=dict(t=30, b=0, l=0, r=0),
+        xaxis_title="Week" if weeks == 1 else f"{weeks}-week period starting",
+        yaxis_title="Claims" if weeks == 1 else f"Claims per {weeks} weeks"
+    )
+    return fig
+
+def listings_table(listings, mask=None):
+    """Display columns of the available-listings table, with the AVAILABLE quantity as quantity"""
+    # Only include columns that exist; the selection is the only copy made
+    columns = [col for col in LISTING_COLUMNS if col in listings.columns]
+    rows = slice(None) if mask is None else mask
+    table = listings.loc[rows, columns]
+    table['quantity'] = listings.loc[rows, 'available_quantity'].astype(int)
+    if 'expiry_date' in table:
+        # Already datetime64 from typed frames; text when FOOD_RESCUE_TYPED_FRAMES=0
+        table['expiry_date'] = pd.to_datetime(table['expiry_date'], errors='coerce')
+    return table
+
+def near_expiry(table):
+    """Boolean Series: listings expiring within NEAR_EXPIRY_DAYS"""
+    expiry = pd.to_datetime(table['expiry_date'], errors='coerce')
+    return expiry <= pd.Timestamp.now().normalize() + pd.Timedelta(days=NEAR_EXPIRY_DAYS)
@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from coordination import connect, lock_path, file_lock, maybe_checkpoint, retry_on_busy
+from frame_types import typed_frame
+from replica import get_replica, in_analytics_reads
+from typed_fetch import fetch_frame
+from write_queue import WriteQueue
+
+ROOT = Path(__file__).resolve().parents[2]
+# Region shards (sharding.py): once the database has been split, each app
+# process serves one region's file, FOOD_RESCUE_REGION or the map's default
+SHARD_CONFIG = Path(os.environ.get('FOOD_RESCUE_SHARDS', ROOT / 'shards.json'))
+SHARD_DIR = Path(os.environ.get('FOOD_RESCUE_SHARD_DIR', ROOT / 'shards'))
+
+def _served_region():
+    """Region whose shard this process serves, or None while the database is not split"""
+    if os.environ.get('FOOD_RESCUE_DB') or not SHARD_CONFIG.exists():
+        return None
+    with open(SHARD_CONFIG, encoding='utf-8') as f:
+        region = os.environ.get('FOOD_RESCUE_REGION') or json.load(f).get('default', 'default')
+    if (SHARD_DIR / f'{region}.db').exists():
+        return region
+    if os.environ.get('FOOD_RESCUE_REGION'):
+        raise RuntimeError(f"No shard for region '{region}' in {SHARD_DIR}; run sharding.py split first")
+    return None
+
+REGION = _served_region()
+# FOOD_RESCUE_DB lets headless tools (load harness, scripts) point the same
+# helpers at a scratch copy instead of the live database
+DB_PATH = Path(os.environ.get('FOOD_RESCUE_DB', SHARD_DIR / f'{REGION}.db' if REGION else ROOT / 'food_rescue.db'))
+# Route execute_query through the single writer thread (set to 0 to disable)
+USE_WRITE_QUEUE = os.environ.get('FOOD_RESCUE_WRITE_QUEUE', '1') != '0'
+
+_write_queue = None
+_write_queue_path = None
+_write_queue_lock = threading.Lock()
+
+def get_db_connection():
+    """Create SQLite database connection"""
+    # Busy timeout + WAL so several app processes can share the file
+    conn = connect(DB_PATH)
+    conn.row_factory = sqlite3.Row  # This allows accessing columns by name
+    return conn
+
+def get_read_connection():
+    """Connection for reads: the snapshot replica inside analytics_reads(), else the primary"""
+    if in_analytics_reads():
+        replica = get_replica(DB_PATH)
+        if replica is not None:
+            return replica.connect()
+    return get_db_connection()
+
+def schema_version():
+    """(path, PRAGMA schema_version) of the database; bumps on every schema change"""
+    if not DB_PATH.exists():
+        return (str(DB_PATH), None)
+    conn = get_db_connection()
+    try:
+        return (str(DB_PATH), conn.execute('PRAGMA schema_version').fetchone()[0])
+    finally:
+        conn.close()
+
+def replica_status():
+    replica = get_replica(DB_PATH)
+    return replica.status() if replica is not None else None
+
+def _read_frame(query, params=None):
+    conn = get_read_connection()
+    try:
+        return fetch_frame(conn, query, params)
+    finally:
+        conn.close()
+
+def region_for_city(city):
+    """Region shard owning `city`, or None while the database is not split"""
+    if REGION is None:
+        return None
+    from sharding import load_router
+    return load_router().region_for_city(city)
+
+def _shard_router(city):
+    """The shard router when `city` lives in another region than this process serves"""
+    if city is None or REGION is None or region_for_city(city) == REGION:
+        return None
+    from sharding import load_router
+    return load_router()
+
+def get_city_connection(city):
+    """Connection to the database holding `city`'s rows: its region's shard once split"""
+    router = _shard_router(city)
+    return router.connect(router.region_for_city(city)) if router is not None else get_db_connection()
+
+def run_query(query, params=None, city=None):
+    """Run a SQL query and return results as DataFrame"""
+    # Once split, city= sends the read to the shard of that city's region
+    router = _shard_router(city)
+    if router is not None:
+        return typed_frame(router.query(city, query, params))
+    return typed_frame(retry_on_busy(_read_frame, query, params))
+
+def _checkpoint_policy(conn, batches):
+    # Autocheckpoint keeps the WAL bounded in steady state; this catches the
+    # case where readers held it open and it grew past the size limit
+    if batches % 100 == 0:
+        maybe_checkpoint(conn, DB_PATH)
+
+def init_lock():
+    """Inter-process lock held while the database is created or migrated"""
+    return file_lock(lock_path(DB_PATH, 'init'))
+
+def get_write_queue():
+    """Process-wide writer for the current DB_PATH, started on first use"""
+    global _write_queue, _write_queue_path
+    with _write_queue_lock:
+        if _write_queue is None or _write_queue_path != DB_PATH:
+            if _write_queue is not None:
+                _write_queue.stop()
+            _write_queue = WriteQueue(get_db_connection, after_batch=_checkpoint_policy)
+            _write_queue_path = DB_PATH
+        return _write_queue
+
+def write_queue_metrics():
+    """Queue depth / batch-size metrics, or None when the queue is disabled or unused"""
+    return _write_queue.metrics() if _write_queue is not None else None
+
+def execute_query(query, params=None, city=None):
+    """Execute a SQL query (INSERT, UPDATE, DELETE)"""
+    router = _shard_router(city)
+    if router is not None:
+        return router.execute(city, query, params)
+    if USE_WRITE_QUEUE:
+        # Group-committed by the writer thread; raises the statement's own error
+        return get_write_queue().execute(query, params)
+    return retry_on_busy(_execute_direct, query, params)
+
+def insert_query(query, params=None):
+    """Execute an INSERT; returns (rowcount, lastrowid)"""
+    if USE_WRITE_QUEUE:
+        return get_write_queue().insert(query, params)
+    return retry_on_busy(_execute_direct, query, params, with_rowid=True)
+
+def _execute_direct(query, params=None, with_rowid=False):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        conn.commit()
+        return (cursor.rowcount, cursor.lastrowid) if with_rowid else cursor.rowcount
+    finally:
+        conn.close()
+
+def log_audit(operation, details='', user='streamlit'):
+    """Log an operation to audit log"""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    execute_query(
+        "INSERT INTO audit_log(operation, user, details, ts_utc) VALUES (?, ?, ?, ?)",
+        (operation, user, details, now)
+    )
+
+def get_next_id(table, id_column):
+    """Get the next available ID for a table"""
+    if REGION is not None:
+        # IDs stay unique across shards, so rebalancing never collides
+        from sharding import load_router
+        return load_router().next_id(table, id_column)
+    result = run_query(f"SELECT MAX({id_column}) as max_id FROM {table}")
+    max_id = result.iloc[0]['max_id']
+    return 1 if max_id is None or pd.isna(max_id) else int(max_id) + 1
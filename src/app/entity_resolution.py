@@ -0,0 +1,337 @@
+"""Duplicate detection for providers and receivers.
+
+Contacts and names are normalized with vectorized pandas string operations:
+
+    "+1-555-1234", "5551234" and "555 1234"  ->  phone key "5551234"
+    "The Sunaina Restaurant Pvt. Ltd."       ->  name key "sunaina restaurant"
+
+The keys are stored in entity_keys, indexed by phone and by blocking keys
+(city + phone prefix, city + first word of the name). A new registration is only compared with
+the few rows sharing one of its keys, so checks stay cheap with millions of
+entities. The sync_entity_index job (jobs.py) applies provider/receiver
+changes from the change feed to the index, so keeping it current costs work
+proportional to the changes. Checks only read: rows changed since the last
+sync are keyed in memory from the change log instead of writing the index.
+
+    python src/app/entity_resolution.py rebuild
+    python src/app/entity_resolution.py duplicates --entity providers
+"""
+import argparse
+import re
+import sys
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+import db
+from changefeed import changes_since, current_version
+
+# entity table -> id column
+ENTITIES = {
+    'providers': 'provider_id',
+    'receivers': 'receiver_id',
+}
+# Country calling codes stripped when a number is written in international form
+COUNTRY_CODES = ('91', '1')
+PHONE_PREFIX_DIGITS = 4
+NAME_MATCH_THRESHOLD = 0.85
+MAX_BLOCK_CANDIDATES = 1000
+# find_duplicates compares each row with this many neighbours (by name) in its
+# block, so a very common block costs O(n) comparisons instead of O(n^2)
+DUPLICATE_WINDOW = 50
+NAME_STOPWORDS = ('the', 'pvt', 'private', 'ltd', 'limited', 'inc', 'llc', 'co', 'and')
+REBUILD_CHUNK_SIZE = 100000
+
+def normalize_phone(contacts):
+    """Digits-only national number: country code, trunk zeros and punctuation removed"""
+    raw = contacts.astype('string').str.strip()
+    # Numbers that went through a float column come back as '9999999999.0'
+    raw = raw.str.replace(r'^(\d+)\.0$', r'\1', regex=True)
+    international = raw.str.match(r'^(\+|00)').fillna(False)
+    digits = raw.str.replace(r'\D', '', regex=True).str.replace(r'^00', '', regex=True)
+    for code in COUNTRY_CODES:
+        # Only strip a code the caller marked as international, or one that makes the number too long
+        strip = digits.str.startswith(code).fillna(False) & (international | (digits.str.len() > 10 + len(code) - 1))
+        digits = digits.mask(strip, digits.str.slice(len(code)))
+        international &= ~strip
+    digits = digits.str.lstrip('0')
+    return digits.mask(digits == '')
+
+def normalize_name(names):
+    """Lowercase ASCII words with punctuation and legal-form stopwords removed"""
+    text = (names.astype('string')
+            .str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('ascii')
+            .str.lower().str.replace(r'[^a-z0-9]+', ' ', regex=True))
+    stopwords = r'\b(?:' + '|'.join(NAME_STOPWORDS) + r')\b'
+    text = text.str.replace(stopwords, ' ', regex=True).str.split().str.join(' ')
+    return text.mask(text == '')
+
+def normalize_city(cities):
+    text = cities.astype('string').str.strip().str.lower().str.replace(r'\s+', ' ', regex=True)
+    return text.mask(text == '')
+
+def entity_keys(df):
+    """Normalized key columns for a frame with name, city and contact"""
+    phone = normalize_phone(df['contact'])
+    name = normalize_name(df['name'])
+    return pd.DataFrame({
+        'name_key': name,
+        'name_prefix': name.str.split(' ', n=1).str[0],
+        'city_key': normalize_city(df['city']),
+        'phone_key': phone,
+        'phone_prefix': phone.str.slice(0, PHONE_PREFIX_DIGITS),
+    }, index=df.index)
+
+def name_similarity(a, b):
+    if not a or not b or pd.isna(a) or pd.isna(b):
+        return 0.0
+    if a == b:
+        return 1.0
+    # "Branch 7" and "Branch 47" are different places however close the strings are
+    numbers_a, numbers_b = re.findall(r'\d+', a), re.findall(r'\d+', b)
+    if (numbers_a or numbers_b) and numbers_a != numbers_b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+def ensure_entity_index(conn):
+    """Create the normalized-key index tables, building the index the first time"""
+    _create_index_tables(conn)
+    if conn.execute("SELECT 1 FROM entity_index_state WHERE id = 1").fetchone() is None:
+        rebuild_index(conn)
+
+def _create_index_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS entity_keys (
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            name_key TEXT,
+            name_prefix TEXT,
+            city_key TEXT,
+            phone_key TEXT,
+            phone_prefix TEXT,
+            PRIMARY KEY (entity, entity_id)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_keys_phone ON entity_keys(entity, phone_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_keys_block ON entity_keys(entity, city_key, phone_prefix)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_keys_name ON entity_keys(entity, city_key, name_prefix)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS entity_index_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.commit()
+
+def _insert_keys(conn, entity, frame):
+    if frame.empty:
+        return 0
+    keys = entity_keys(frame)
+    keys.insert(0, 'entity_id', frame[ENTITIES[entity]].astype('int64'))
+    keys.insert(0, 'entity', entity)
+    rows = keys.astype(object).where(keys.notna(), None)
+    conn.executemany('''
+        INSERT OR REPLACE INTO entity_keys(entity, entity_id, name_key, name_prefix, city_key, phone_key, phone_prefix)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows.itertuples(index=False, name=None))
+    return len(keys)
+
+def _set_version(conn, version):
+    conn.execute("INSERT OR REPLACE INTO entity_index_state(id, version) VALUES (1, ?)", (version,))
+
+def rebuild_index(conn=None, chunk_size=REBUILD_CHUNK_SIZE):
+    """Recompute every key from the entity tables; returns rows indexed"""
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        _create_index_tables(conn)
+        version = current_version(conn)
+        conn.execute("DELETE FROM entity_keys")
+        total = 0
+        for entity, id_column in ENTITIES.items():
+            query = f"SELECT {id_column}, name, city, contact FROM {entity}"
+            for chunk in pd.read_sql_query(query, conn, chunksize=chunk_size):
+                total += _insert_keys(conn, entity, chunk)
+        _set_version(conn, version)
+        conn.commit()
+        return total
+    finally:
+        if own:
+            conn.close()
+
+def sync_index(conn=None):
+    """Apply provider/receiver changes logged since the last sync; returns rows re-keyed"""
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        ensure_entity_index(conn)
+        row = conn.execute("SELECT version FROM entity_index_state WHERE id = 1").fetchone()
+        if row is None:
+            return rebuild_index(conn)
+        touched = 0
+        version = row[0]
+        while True:
+            batch = changes_since(version, tables=list(ENTITIES), conn=conn)
+            if batch.reset:
+                return rebuild_index(conn)
+            for entity, id_column in ENTITIES.items():
+                ids = [int(i) for i in batch.changes.loc[batch.changes['table_name'] == entity, 'row_key'].dropna().unique()]
+                for start in range(0, len(ids), 500):
+                    part = ids[start:start + 500]
+                    marks = ', '.join('?' for _ in part)
+                    conn.execute(f"DELETE FROM entity_keys WHERE entity = ? AND entity_id IN ({marks})", (entity, *part))
+                    current = pd.read_sql_query(f"SELECT {id_column}, name, city, contact FROM {entity} WHERE {id_column} IN ({marks})",
+                                                conn, params=part)
+                    _insert_keys(conn, entity, current)
+                touched += len(ids)
+            if batch.version == version:
+                break
+            version = batch.version
+        if version != row[0]:
+            _set_version(conn, version)
+            conn.commit()
+        return touched
+    finally:
+        if own:
+            conn.close()
+
+def _pending_ids(conn, entity):
+    """IDs of `entity` rows changed since the index was last synced, or None when the log can't tell"""
+    row = conn.execute("SELECT version FROM entity_index_state WHERE id = 1").fetchone()
+    if row is None:
+        return None
+    version, ids = row[0], set()
+    while True:
+        batch = changes_since(version, tables=[entity], conn=conn)
+        if batch.reset:
+            return None
+        ids.update(int(i) for i in batch.changes.loc[batch.changes['table_name'] == entity, 'row_key'].dropna())
+        if batch.version == version:
+            return ids
+        version = batch.version
+
+def _pending_candidates(conn, entity, ids, probe):
+    """Rows changed since the last sync that fall into one of the probe's blocks, keyed in memory"""
+    id_column = ENTITIES[entity]
+    ids = sorted(ids)
+    frames = []
+    for start in range(0, len(ids), 500):
+        part = ids[start:start + 500]
+        frames.append(pd.read_sql_query(f"SELECT {id_column}, name, city, contact FROM {entity} WHERE {id_column} IN ({', '.join('?' for _ in part)})",
+                                        conn, params=part))
+    rows = pd.concat(frames, ignore_index=True)
+    if rows.empty:
+        return None
+    keys = entity_keys(rows)
+    same_city = keys['city_key'] == probe['city_key']
+    hit = ((keys['phone_key'] == probe['phone_key'])
+           | (same_city & (keys['phone_prefix'] == probe['phone_prefix']))
+           | (same_city & (keys['name_prefix'] == probe['name_prefix']))).fillna(False)
+    return pd.DataFrame({'entity_id': rows[id_column], 'name_key': keys['name_key'], 'phone_key': keys['phone_key'],
+                         'name': rows['name'], 'city': rows['city'], 'contact': rows['contact']})[hit]
+
+def find_matches(entity, name, city, contact, conn=None):
+    """Existing entities that look like the same person or business
+
+    Returns a DataFrame (entity_id, name, city, contact, reason, score), best first.
+    Candidates come only from the index blocks the new record falls into.
+    Read-only: the index itself is brought up to date by the sync job.
+    """
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        probe = entity_keys(pd.DataFrame({'name': [name], 'city': [city], 'contact': [contact]})).iloc[0]
+        probe = {k: (None if pd.isna(v) else v) for k, v in probe.items()}
+        id_column = ENTITIES[entity]
+        # Exact phone matches are always fetched; a very common block (one chain
+        # with hundreds of branches in a city) is capped rather than scanned whole
+        blocks = ' UNION '.join(f'''
+            SELECT * FROM (SELECT entity_id, name_key, phone_key FROM entity_keys
+                           WHERE entity = :entity AND {where} LIMIT {limit})'''
+            for where, limit in (('phone_key = :phone_key', -1),
+                                 ('city_key = :city_key AND phone_prefix = :phone_prefix', MAX_BLOCK_CANDIDATES),
+                                 ('city_key = :city_key AND name_prefix = :name_prefix', MAX_BLOCK_CANDIDATES)))
+        candidates = pd.read_sql_query(f'''
+            SELECT k.entity_id, k.name_key, k.phone_key, e.name, e.city, e.contact
+            FROM ({blocks}) k JOIN {entity} e ON e.{id_column} = k.entity_id
+        ''', conn, params={'entity': entity, **probe})
+        # Rows written since the last sync: their index keys are stale or missing
+        pending = _pending_ids(conn, entity)
+        if pending:
+            fresh = _pending_candidates(conn, entity, pending, probe)
+            candidates = candidates[~candidates['entity_id'].isin(pending)]
+            if fresh is not None and not fresh.empty:
+                candidates = pd.concat([candidates, fresh], ignore_index=True)
+    finally:
+        if own:
+            conn.close()
+    if candidates.empty:
+        return candidates.assign(reason=pd.Series(dtype=str), score=pd.Series(dtype=float))
+    candidates = candidates.reset_index(drop=True)
+    same_phone = candidates['phone_key'].notna() & (candidates['phone_key'] == probe['phone_key'])
+    scores = candidates['name_key'].map(lambda other: name_similarity(probe['name_key'], other))
+    candidates['score'] = scores.where(~same_phone, 1.0)
+    candidates['reason'] = 'similar name'
+    candidates.loc[same_phone, 'reason'] = 'same phone number'
+    matches = candidates[same_phone | (scores >= NAME_MATCH_THRESHOLD)]
+    return (matches.sort_values('score', ascending=False)
+            [['entity_id', 'name', 'city', 'contact', 'reason', 'score']].reset_index(drop=True))
+
+def find_duplicates(entity, conn=None):
+    """Candidate duplicate pairs within one entity table, compared block by block"""
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        keys = pd.read_sql_query("SELECT entity_id, name_key, name_prefix, city_key, phone_key, phone_prefix FROM entity_keys WHERE entity = ?",
+                                 conn, params=(entity,))
+    finally:
+        if own:
+            conn.close()
+    pairs = []
+    # Same phone anywhere is a duplicate outright
+    phones = keys.dropna(subset=['phone_key'])
+    same_phone = phones.merge(phones, on='phone_key', suffixes=('_a', '_b'))
+    same_phone = same_phone[same_phone['entity_id_a'] < same_phone['entity_id_b']]
+    pairs.append(pd.DataFrame({'id_a': same_phone['entity_id_a'], 'id_b': same_phone['entity_id_b'],
+                               'reason': 'same phone number', 'score': 1.0}))
+    # Similar names only within a (city, phone prefix) or (city, first name word) block.
+    # Rows are sorted by name inside each block and compared with the next
+    # DUPLICATE_WINDOW rows: every pair in a small block, near names in a big one
+    for block in (['city_key', 'phone_prefix'], ['city_key', 'name_prefix']):
+        blocked = keys.dropna(subset=block).sort_values(block + ['name_key'], kind='stable').reset_index(drop=True)
+        group = blocked.groupby(block, sort=False).ngroup()
+        for offset in range(1, DUPLICATE_WINDOW + 1):
+            same_block = (group == group.shift(-offset)).to_numpy()
+            if not same_block.any():
+                break
+            a = blocked[same_block]
+            b = blocked.shift(-offset)[same_block]
+            keep = (a['phone_key'].isna() | (a['phone_key'] != b['phone_key'])).to_numpy()
+            a, b = a[keep], b[keep]
+            scores = pd.Series([name_similarity(x, y) for x, y in zip(a['name_key'], b['name_key'])], dtype=float)
+            similar = (scores >= NAME_MATCH_THRESHOLD).to_numpy()
+            ids_a = a['entity_id'].to_numpy()[similar].astype('int64')
+            ids_b = b['entity_id'].to_numpy()[similar].astype('int64')
+            pairs.append(pd.DataFrame({'id_a': ids_a.clip(max=ids_b), 'id_b': ids_b.clip(min=ids_a),
+                                       'reason': 'similar name', 'score': scores[similar].to_numpy()}))
+    result = pd.concat(pairs, ignore_index=True)
+    return (result.sort_values('score', ascending=False, kind='stable')
+            .drop_duplicates(subset=['id_a', 'id_b']).reset_index(drop=True))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Provider/receiver duplicate detection')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild', help='recompute the normalized-key index')
+    duplicates = sub.add_parser('duplicates', help='list likely duplicate pairs')
+    duplicates.add_argument('--entity', choices=sorted(ENTITIES), default='providers')
+    args = parser.parse_args(argv)
+
+    if args.command == 'rebuild':
+        print(f'Indexed {rebuild_index()} entities')
+    else:
+        pairs = find_duplicates(args.entity)
+        print(pairs.to_string(index=False) if not pairs.empty else 'No duplicates found')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Streaming table exports.
+
+Rows are pulled from a cursor with fetchmany() and written straight into a
+(compressed) spooled temp file, so memory stays bounded by the chunk size
+rather than the table size.
+"""
+import csv
+import gzip
+import io
+import shutil
+import tempfile
+import zipfile
+from importlib.util import find_spec
+
+from db import get_db_connection, get_read_connection
+
+CHUNK_SIZE = 10000
+# Exports smaller than this stay in memory; bigger ones roll over to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    'csv': {'extension': 'csv', 'mime': 'text/csv'},
+    'csv.gz': {'extension': 'csv.gz', 'mime': 'application/gzip'},
+    'csv.zst': {'extension': 'csv.zst', 'mime': 'application/zstd'},
+    'parquet': {'extension': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+# Optional codecs are imported when an export uses them, not at startup
+HAS_ZSTANDARD = find_spec('zstandard') is not None
+HAS_PYARROW = find_spec('pyarrow') is not None
+
+def available_formats():
+    """Export formats usable with the packages installed here"""
+    formats = ['csv', 'csv.gz']
+    if HAS_ZSTANDARD:
+        formats.append('csv.zst')
+    if HAS_PYARROW:
+        formats.append('parquet')
+    return formats
+
+def export_filename(name, fmt):
+    return f"{name}.{EXPORT_FORMATS[fmt]['extension']}"
+
+def export_mime(fmt):
+    return EXPORT_FORMATS[fmt]['mime']
+
+def _iter_chunks(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+def _write_csv(cursor, sink, chunk_size):
+    """Write cursor rows as CSV text into a binary sink"""
+    text = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+    try:
+        writer = csv.writer(text, lineterminator='\n')
+        writer.writerow([col[0] for col in cursor.description])
+        for rows in _iter_chunks(cursor, chunk_size):
+            writer.writerows(tuple(row) for row in rows)
+        text.flush()
+    finally:
+        # Detach so closing the wrapper doesn't close the underlying file
+        text.detach()
+
+def declared_types(conn, table):
+    """Column name -> declared SQLite type for a table"""
+    return {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _arrow_type(declared):
+    """Arrow type for a declared SQLite column type (by affinity), or None to infer from the values"""
+    import pyarrow as pa
+    declared = (declared or '').upper()
+    if 'INT' in declared:
+        return pa.int64()
+    if any(name in declared for name in ('CHAR', 'CLOB', 'TEXT')):
+        return pa.string()
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return None
+
+def _write_parquet(cursor, sink, chunk_size, types=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    columns = [col[0] for col in cursor.description]
+    arrow_types = [_arrow_type((types or {}).get(name)) for name in columns]
+    writer = None
+    try:
+        for rows in _iter_chunks(cursor, chunk_size):
+            arrays = [pa.array(list(values), type=arrow_type) for values, arrow_type in zip(zip(*rows), arrow_types)]
+            batch = pa.RecordBatch.from_arrays(arrays, names=columns)
+            if writer is None:
+                # A column that is all NULL so far has no type to go on: store it as text,
+                # which any later value can be cast to
+                schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                                    for field in batch.schema])
+                writer = pq.ParquetWriter(sink, schema)
+            if batch.schema != writer.schema:
+                batch = batch.cast(writer.schema)
+            writer.write_batch(batch)
+        if writer is None:
+            # Empty result: still emit a valid file, declared types or else string columns
+            schema = pa.schema([(name, arrow_type or pa.string()) for name, arrow_type in zip(columns, arrow_types)])
+            writer = pq.ParquetWriter(sink, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def write_cursor(cursor, sink, fmt='csv.gz', chunk_size=CHUNK_SIZE, types=None):
+    """Stream an executed cursor into a binary file object in the given format
+
+    types maps column names to declared SQLite types; Parquet uses them for
+    the file schema instead of guessing from the first chunk.
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"Export format '{fmt}' is not available (choose from {available_formats()})")
+    if fmt == 'csv':
+        _write_csv(cursor, sink, chunk_size)
+    elif fmt == 'csv.gz':
+        with gzip.GzipFile(fileobj=sink, mode='wb') as gz:
+            _write_csv(cursor, gz, chunk_size)
+    elif fmt == 'csv.zst':
+        import zstandard
+        with zstandard.ZstdCompressor().stream_writer(sink, closefd=False) as zst:
+            _write_csv(cursor, zst, chunk_size)
+    else:
+        _write_parquet(cursor, sink, chunk_size, types)
+
+def export_query(query, params=None, fmt='csv.gz', chunk_size=CHUNK_SIZE, table=None):
+    """Export a query result; returns a spooled file rewound to the start
+
+    Pass table when the query selects that table's columns, so Parquet
+    exports take their schema from its declared types.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    conn = get_read_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params or ())
+        write_cursor(cursor, spool, fmt, chunk_size, declared_types(conn, table) if table else None)
+    except Exception:
+        spool.close()
+        raise
+    finally:
+        conn.close()
+    spool.seek(0)
+    return spool
+
+def export_table(table, fmt='csv.gz', chunk_size=CHUNK_SIZE):
+    return export_query(f"SELECT * FROM {table}", fmt=fmt, chunk_size=chunk_size, table=table)
+
+def export_snapshot(tables, fmt='csv', chunk_size=CHUNK_SIZE):
+    """Export several tables from one read transaction into a zip archive.
+
+    All tables are read inside a single transaction, so the archive is a
+    point-in-time snapshot even while other sessions keep writing.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    # Already-compressed members gain nothing from a second deflate pass
+    compression = zipfile.ZIP_DEFLATED if fmt == 'csv' else zipfile.ZIP_STORED
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        with zipfile.ZipFile(spool, 'w', compression=compression) as archive:
+            for table in tables:
+                types = declared_types(conn, table)
+                cursor.execute(f"SELECT * FROM {table}")
+                with archive.open(export_filename(table, fmt), 'w', force_zip64=True) as member:
+                    if fmt == 'parquet':
+                        # Parquet writers want a seekable target; zip members aren't
+                        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as staged:
+                            write_cursor(cursor, staged, fmt, chunk_size, types)
+                            staged.seek(0)
+                            shutil.copyfileobj(staged, member)
+                    else:
+                        write_cursor(cursor, member, fmt, chunk_size, types)
+        conn.rollback()
+    except Exception:
+        spool.close()
+        raise
+    finally:
+        conn.close()
+    spool.seek(0)
+    return spool
@@ -0,0 +1,101 @@
+"""Versioned cache of rendered Plotly figures.
+
+Charts are cached process-wide as serialized figure JSON, keyed by the
+chart name and spec and stamped with the change-log version of the data
+they were built from. A rerun reuses the cached figure until one of the
+chart's source tables changes (see changefeed.changed_since), so neither
+the query nor Plotly Express runs again; st.plotly_chart() gets the
+decoded dict, which skips rebuilding the figure object.
+
+Long series are downsampled before plotting (bucket_series), so the
+figure sent to the browser stays at most MAX_CHART_POINTS points however
+much history accumulates.
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import db
+from changefeed import current_version, unchanged_between
+
+FIGURE_CACHE_ENTRIES = int(os.environ.get('FOOD_RESCUE_FIGURE_CACHE_ENTRIES', 64))
+# Most points (or bars) one chart sends to the browser
+MAX_CHART_POINTS = int(os.environ.get('FOOD_RESCUE_MAX_CHART_POINTS', 104))
+
+_figures = OrderedDict()
+_figures_lock = threading.Lock()
+figure_stats = {'hits': 0, 'builds': 0, 'uncached': 0}
+
+def figure_metrics():
+    with _figures_lock:
+        return dict(figure_stats, entries=len(_figures),
+                    bytes=sum(len(entry[1]) for entry in _figures.values()))
+
+def _current_version():
+    try:
+        return current_version()
+    except sqlite3.OperationalError:
+        return None
+
+def _is_fresh(cached_version, version, tables):
+    try:
+        return unchanged_between(cached_version, version, tables)
+    except sqlite3.OperationalError:
+        return False
+
+def cached_figure(name, tables, build, spec=None, version=None):
+    """Figure dict for chart `name`; build() runs only when `tables` changed
+
+    build() returns a plotly Figure, or None when there is nothing to plot.
+    `version` is the change-log version the caller's data was read at; by
+    default the current version is used.
+    """
+    key = (str(db.DB_PATH), name, spec)
+    version = _current_version() if version is None else version
+    with _figures_lock:
+        entry = _figures.get(key)
+    if entry is not None and version is not None and _is_fresh(entry[0], version, tables):
+        with _figures_lock:
+            _figures[key] = (version, entry[1])
+            _figures.move_to_end(key)
+            figure_stats['hits'] += 1
+        return json.loads(entry[1]) if entry[1] else None
+    fig = build()
+    serialized = fig.to_json() if fig is not None else ''
+    with _figures_lock:
+        if version is None:
+            # No change log to validate against
+            figure_stats['uncached'] += 1
+        else:
+            _figures[key] = (version, serialized)
+            _figures.move_to_end(key)
+            while len(_figures) > FIGURE_CACHE_ENTRIES:
+                _figures.popitem(last=False)
+            figure_stats['builds'] += 1
+    return json.loads(serialized) if serialized else None
+
+def bucket_series(df, x, y, max_points=MAX_CHART_POINTS):
+    """Sum consecutive rows of a sorted series into at most max_points buckets
+
+    Returns (frame, bucket size); each bucket is labelled with its first x.
+    """
+    if len(df) <= max_points:
+        return df, 1
+    size = math.ceil(len(df) / max_points)
+    groups = pd.RangeIndex(len(df)) // size
+    bucketed = df.groupby(groups).agg({x: 'first', y: 'sum'}).reset_index(drop=True)
+    return bucketed, size
+
+def top_categories(df, x, y, max_points=MAX_CHART_POINTS, other='Other'):
+    """Keep the max_points - 1 largest categories and sum the rest into `other`"""
+    if len(df) <= max_points:
+        return df
+    ranked = df.sort_values(y, ascending=False)
+    head = ranked.iloc[:max_points - 1]
+    rest = pd.DataFrame({x: [other], y: [ranked[y].iloc[max_points - 1:].sum()]})
+    return pd.concat([head.astype({x: object}), rest], ignore_index=True)
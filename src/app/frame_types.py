@@ -0,0 +1,118 @@
+"""Compact dtypes for query results.
+
+run_query() results pass through typed_frame(): known low-cardinality text
+columns (city, status, food_type, ...) become categoricals and date/time
+columns become datetime64, so a 100k-row listings frame stores one small
+integer code per cell instead of one string each.
+
+Categorical dtypes are shared per column name across the process and only
+ever grow by appending categories, so frames from different queries (and
+sessions) use the same codes and can be compared, concatenated or
+filtered with isin() without recoding.
+
+    python src/app/frame_types.py --db /path/to.db   # memory per dashboard frame, default vs typed
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ('city', 'food_type', 'meal_type', 'provider_type', 'status', 'type', 'location')
+DATETIME_COLUMNS = ('expiry_date', 'timestamp', 'ts_utc')
+# Categories fixed by the schema, listed first so their codes never change
+KNOWN_CATEGORIES = {'status': ('Pending', 'Completed', 'Cancelled')}
+TYPED_FRAMES = os.environ.get('FOOD_RESCUE_TYPED_FRAMES', '1') != '0'
+# Smaller frames stay text: the categories would outweigh the codes
+MIN_CATEGORY_ROWS = 100
+# Columns with more distinct values than this share of rows stay text
+MAX_CATEGORY_RATIO = 0.5
+# A shared dtype stops growing here; later frames get their own categories
+MAX_SHARED_CATEGORIES = 10000
+
+_dtypes = {}
+_dtypes_lock = threading.Lock()
+
+def shared_dtype(column, values):
+    """Process-wide CategoricalDtype for `column` that covers `values`"""
+    with _dtypes_lock:
+        dtype = _dtypes.get(column)
+        known = list(dtype.categories) if dtype is not None else list(KNOWN_CATEGORIES.get(column, ()))
+        seen = set(known)
+        new = sorted((v for v in values if v not in seen), key=str)
+        if dtype is not None and not new:
+            return dtype
+        if len(known) + len(new) > MAX_SHARED_CATEGORIES:
+            return pd.CategoricalDtype(sorted(set(values), key=str))
+        dtype = pd.CategoricalDtype(known + new)
+        _dtypes[column] = dtype
+        return dtype
+
+def _is_text(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+def typed_frame(df):
+    """Convert known columns of `df` in place to categorical/datetime64; returns df"""
+    if not TYPED_FRAMES or df.empty or not df.columns.is_unique:
+        return df
+    categorical = df.columns.intersection(CATEGORICAL_COLUMNS) if len(df) >= MIN_CATEGORY_ROWS else []
+    for column in categorical:
+        series = df[column]
+        if not _is_text(series):
+            continue
+        values = series.dropna().unique()
+        if len(values) > len(df) * MAX_CATEGORY_RATIO:
+            continue
+        df[column] = series.astype(shared_dtype(column, values))
+    for column in df.columns.intersection(DATETIME_COLUMNS):
+        if _is_text(df[column]):
+            df[column] = pd.to_datetime(df[column], format='ISO8601', errors='coerce')
+    return df
+
+def frame_memory(df):
+    """Deep memory use of a frame in bytes"""
+    return int(df.memory_usage(deep=True).sum())
+
+def memory_report(frames):
+    """One row per named frame: rows, columns and memory in KB"""
+    return pd.DataFrame([{
+        'frame': name,
+        'rows': len(df),
+        'columns': len(df.columns),
+        'memory_kb': round(frame_memory(df) / 1024, 1),
+    } for name, df in frames.items()])
+
+def main(argv=None):
+    import db
+    from reports import DASHBOARD_LISTINGS_QUERY
+
+    parser = argparse.ArgumentParser(description='Compare default vs typed memory of dashboard frames')
+    parser.add_argument('--db', default=str(db.DB_PATH), help='database to read')
+    args = parser.parse_args(argv)
+
+    queries = {
+        'dashboard listings': DASHBOARD_LISTINGS_QUERY,
+        'claims': 'SELECT * FROM claims',
+        'providers': 'SELECT * FROM providers',
+        'receivers': 'SELECT * FROM receivers',
+    }
+    conn = sqlite3.connect(args.db)
+    try:
+        # object: Python str per cell (pandas < 3); default: what read_sql_query returns here
+        print(f"{'frame':<20} {'rows':>9} {'object KB':>10} {'default KB':>11} {'typed KB':>10} {'ratio':>6}")
+        for name, sql in queries.items():
+            frame = pd.read_sql_query(sql, conn)
+            objects = frame_memory(frame.astype({c: object for c in frame.columns if _is_text(frame[c])}))
+            plain = frame_memory(frame)
+            typed = frame_memory(typed_frame(frame))
+            ratio = objects / typed if typed else 0
+            print(f'{name:<20} {len(frame):>9} {objects / 1024:>10.1f} {plain / 1024:>11.1f} '
+                  f'{typed / 1024:>10.1f} {ratio:>5.1f}x')
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,404 @@
+"""Geocoding against a bundled gazetteer and nearest-listing search.
+
+Providers and receivers get latitude/longitude from assets/gazetteer.csv
+(Indian and US cities with common alternate names), loaded into geo_places.
+A provider is matched on its city, or else on a place named in its address;
+a receiver on its city. Triggers geocode new and edited rows, so every write
+path (forms, bulk import, the partner API) is covered. The gazetteer is
+city-level: providers in one city share its centre point until precise
+coordinates are written to their latitude/longitude columns.
+
+Listings are indexed by their provider's point (or their own location text
+when the provider has none). Points are mostly city centres, so many
+listings share one: geo_points holds each distinct point once, listing_geo
+(an SQLite R*Tree) indexes those points, and listing_points maps each
+listing to its point, indexed by (point_id, expiry_date, food_id). Triggers on
+food_listings and providers keep all three in step. A search reads the
+points inside the radius's bounding box from the R*Tree, orders them by
+distance, and pages each point's listings in expiry order straight off the
+listing_points index, checking availability a batch at a time - so its cost
+follows the results returned, not the listings in the city or the table.
+
+    python src/app/geo.py near --receiver 12 --radius 25
+    python src/app/geo.py near --place Pune
+    python src/app/geo.py status
+"""
+import argparse
+import csv
+import math
+import os
+import re
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+import db
+
+GAZETTEER_PATH = Path(os.environ.get('FOOD_RESCUE_GAZETTEER', Path(__file__).resolve().parent / 'assets' / 'gazetteer.csv'))
+DEFAULT_RADIUS_KM = float(os.environ.get('FOOD_RESCUE_NEAR_RADIUS_KM', 25))
+MAX_RADIUS_KM = 500
+NEAR_LIMIT = 50
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Candidates checked for availability per round trip
+CANDIDATE_BATCH = 200
+# First search radius; doubled until enough listings are found or radius_km is reached
+START_RADIUS_KM = 2.0
+
+GEO_TABLES = ('providers', 'receivers')
+# listing_geo and its listing_geo_* shadow tables only hold derived data: SQL dumps
+# and shard schema clones leave them out and rebuild them with ensure_geo_schema()
+GEO_INDEX_TABLES = "(name = 'listing_geo' OR name LIKE 'listing_geo_%')"
+GEO_INDEX_STATEMENT = re.compile(r'''(CREATE TABLE|INSERT INTO) "listing_geo(_\w+)?"|INSERT INTO sqlite_master\(.*VALUES\('table','listing_geo',''')
+# Gazetteer match on a row's city
+CITY_MATCH = "SELECT latitude, longitude FROM geo_places WHERE place = lower(trim({row}.city))"
+# Fallback: the longest place named as whole words in the address
+ADDRESS_MATCH = '''
+    SELECT latitude, longitude FROM geo_places
+    WHERE instr(' ' || replace(replace(replace(lower({row}.address), ',', ' '), '.', ' '), char(10), ' ') || ' ',
+                ' ' || place || ' ') > 0
+    ORDER BY length(place) DESC
+    LIMIT 1
+'''
+# Listings matching {where} with the point they are indexed at
+LISTING_SOURCE = '''
+    SELECT f.food_id, f.expiry_date, COALESCE(p.latitude, g.latitude) AS latitude,
+           COALESCE(p.longitude, g.longitude) AS longitude
+    FROM food_listings f
+    LEFT JOIN providers p ON p.provider_id = f.provider_id
+    LEFT JOIN geo_places g ON g.place = lower(trim(f.location))
+    WHERE {where} AND COALESCE(p.latitude, g.latitude) IS NOT NULL
+'''
+# Index listings matching {where}: their points first (once each), then the listings.
+# A point left without listings stays in the R*Tree and is skipped by searches.
+# No statement relies on its own conflict clause: in a trigger, an outer INSERT OR REPLACE
+# (bulk import, shard moves) overrides it, and REPLACE would renumber existing points.
+LISTING_POINTS = (
+    f'''INSERT INTO geo_points(latitude, longitude)
+        SELECT DISTINCT s.latitude, s.longitude FROM ({LISTING_SOURCE}) s
+        WHERE NOT EXISTS (SELECT 1 FROM geo_points g WHERE g.latitude = s.latitude AND g.longitude = s.longitude)''',
+    f'''INSERT INTO listing_geo(point_id, min_lat, max_lat, min_lon, max_lon)
+        SELECT DISTINCT g.point_id, g.latitude, g.latitude, g.longitude, g.longitude
+        FROM ({LISTING_SOURCE}) s JOIN geo_points g ON g.latitude = s.latitude AND g.longitude = s.longitude
+        WHERE NOT EXISTS (SELECT 1 FROM listing_geo r WHERE r.point_id = g.point_id)''',
+    f'''INSERT OR REPLACE INTO listing_points(food_id, point_id, expiry_date)
+        SELECT s.food_id, g.point_id, s.expiry_date
+        FROM ({LISTING_SOURCE}) s JOIN geo_points g ON g.latitude = s.latitude AND g.longitude = s.longitude''',
+)
+# Indexed points in the bounding box; the exact distance is computed from geo_points.
+# CROSS JOIN keeps the R*Tree outermost (with ANALYZE stats the planner may scan geo_points instead)
+POINTS_IN_BOX = '''
+    SELECT g.point_id, g.latitude, g.longitude
+    FROM listing_geo r CROSS JOIN geo_points g ON g.point_id = r.point_id
+    WHERE r.min_lat >= :lat_lo AND r.min_lat <= :lat_hi AND r.min_lon >= :lon_lo AND r.min_lon <= :lon_hi
+'''
+# Next page of unexpired listings at some points, soonest expiry first (keyset on expiry_date, food_id)
+POINT_LISTINGS = '''
+    SELECT food_id, expiry_date FROM listing_points
+    WHERE point_id IN ({points}) AND (expiry_date, food_id) > (?, ?)
+    ORDER BY expiry_date, food_id
+    LIMIT ?
+'''
+LISTING_DETAILS = '''
+    SELECT f.food_id, f.food_name, f.quantity, f.expiry_date, f.food_type, f.meal_type, f.location,
+           p.name AS provider_name, p.city, p.contact AS provider_contact,
+           f.quantity - COALESCE((SELECT SUM(c.claimed_quantity) FROM claims c
+                                  WHERE c.food_id = f.food_id AND c.status != 'Cancelled'), 0) AS available_quantity
+    FROM food_listings f
+    LEFT JOIN providers p ON p.provider_id = f.provider_id
+    WHERE f.food_id IN ({ids})
+'''
+
+def _geocode_sql(table, key):
+    """Trigger statements (re)geocoding the NEW row of `table`"""
+    sql = f'UPDATE {table} SET (latitude, longitude) = ({CITY_MATCH.format(row="NEW")}) WHERE {key} = NEW.{key};'
+    if table == 'providers':
+        sql += (f'UPDATE {table} SET (latitude, longitude) = ({ADDRESS_MATCH.format(row="NEW")}) '
+                f'WHERE {key} = NEW.{key} AND latitude IS NULL AND NEW.address IS NOT NULL;')
+    return sql
+
+def _index_sql(where):
+    """Trigger statements indexing the listings matching `where`"""
+    return ''.join(statement.format(where=where) + ';' for statement in LISTING_POINTS)
+
+# name -> (event, body)
+TRIGGERS = {
+    'providers_geo_ai': ('AFTER INSERT ON providers WHEN NEW.latitude IS NULL',
+                         _geocode_sql('providers', 'provider_id')),
+    'providers_geo_au': ('AFTER UPDATE OF city, address ON providers '
+                         'WHEN NEW.city IS NOT OLD.city OR NEW.address IS NOT OLD.address',
+                         _geocode_sql('providers', 'provider_id')),
+    'providers_geo_move': ('AFTER UPDATE OF latitude, longitude ON providers',
+                           'DELETE FROM listing_points WHERE food_id IN '
+                           '(SELECT food_id FROM food_listings WHERE provider_id = NEW.provider_id);'
+                           + _index_sql('f.provider_id = NEW.provider_id')),
+    'providers_geo_ad': ('AFTER DELETE ON providers',
+                         'DELETE FROM listing_points WHERE food_id IN '
+                         '(SELECT food_id FROM food_listings WHERE provider_id = OLD.provider_id);'
+                         + _index_sql('f.provider_id = OLD.provider_id')),
+    'receivers_geo_ai': ('AFTER INSERT ON receivers WHEN NEW.latitude IS NULL',
+                         _geocode_sql('receivers', 'receiver_id')),
+    'receivers_geo_au': ('AFTER UPDATE OF city ON receivers WHEN NEW.city IS NOT OLD.city',
+                         _geocode_sql('receivers', 'receiver_id')),
+    'food_listings_geo_ai': ('AFTER INSERT ON food_listings',
+                             _index_sql('f.food_id = NEW.food_id')),
+    'food_listings_geo_au': ('AFTER UPDATE OF provider_id, expiry_date, location ON food_listings',
+                             'DELETE FROM listing_points WHERE food_id = OLD.food_id;'
+                             + _index_sql('f.food_id = NEW.food_id')),
+    'food_listings_geo_ad': ('AFTER DELETE ON food_listings',
+                             'DELETE FROM listing_points WHERE food_id = OLD.food_id;'),
+}
+
+def normalize_place(text):
+    return ' '.join(str(text).lower().split())
+
+def load_gazetteer(path=None):
+    """[(place key, latitude, longitude)] for every name and alias in the gazetteer CSV"""
+    places = []
+    with open(path or GAZETTEER_PATH, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            lat, lon = float(row['latitude']), float(row['longitude'])
+            for name in [row['place']] + [a for a in row['aliases'].split('|') if a]:
+                places.append((normalize_place(name), lat, lon))
+    return places
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def ensure_geo_schema(conn):
+    """Gazetteer table, lat/lon columns, the listing index tables and the triggers maintaining them"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS geo_places (
+            place TEXT PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('DELETE FROM geo_places')
+    conn.executemany('INSERT OR REPLACE INTO geo_places VALUES (?, ?, ?)', load_gazetteer())
+    if not all(_columns(conn, table) for table in GEO_TABLES + ('food_listings',)):
+        conn.commit()
+        return
+    for table in GEO_TABLES:
+        existing = _columns(conn, table)
+        for column in ('latitude', 'longitude'):
+            if existing and column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} REAL')
+    if 'food_id' in _columns(conn, 'listing_geo'):
+        # Earlier layout: one R*Tree entry per listing
+        conn.execute('DROP TABLE listing_geo')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS geo_points (
+            point_id INTEGER PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            UNIQUE (latitude, longitude)
+        )
+    ''')
+    conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS listing_geo USING rtree(point_id, min_lat, max_lat, min_lon, max_lon)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS listing_points (
+            food_id INTEGER PRIMARY KEY,
+            point_id INTEGER NOT NULL,
+            expiry_date TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_listing_points_expiry ON listing_points(point_id, expiry_date, food_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_food_listings_provider ON food_listings(provider_id)")
+    triggers = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type='trigger'").fetchall())
+    recreated = False
+    for name, (event, body) in TRIGGERS.items():
+        sql = f'CREATE TRIGGER {name} {event} BEGIN {body} END'
+        if triggers.get(name) != sql:
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+            conn.execute(sql)
+            recreated = True
+    conn.commit()
+    if recreated:
+        # Rows written while the triggers were missing (first run, CSV re-import)
+        geocode_missing(conn)
+        rebuild_listing_index(conn)
+
+def geocode_missing(conn):
+    """Geocode providers/receivers without coordinates; returns {table: rows located}"""
+    located = {}
+    for table in GEO_TABLES:
+        matches = [CITY_MATCH] + ([ADDRESS_MATCH] if table == 'providers' else [])
+        located[table] = sum(conn.execute(f'''
+            UPDATE {table} SET (latitude, longitude) = ({match.format(row=table)})
+            WHERE latitude IS NULL AND EXISTS ({match.format(row=table)})
+        ''').rowcount for match in matches)
+    conn.commit()
+    return located
+
+def rebuild_listing_index(conn):
+    """Re-index every listing; returns the number indexed"""
+    for table in ('listing_points', 'listing_geo', 'geo_points'):
+        conn.execute(f'DELETE FROM {table}')
+    count = [conn.execute(statement.format(where='1')).rowcount for statement in LISTING_POINTS][-1]
+    conn.commit()
+    return count
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _distances_km(lat, lon, lats, lons):
+    """haversine_km from one point to arrays of points"""
+    p1, p2 = math.radians(lat), np.radians(lats)
+    a = np.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(np.radians(lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+def place_location(place, conn=None):
+    """(lat, lon) of a gazetteer place name, or None"""
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        row = conn.execute("SELECT latitude, longitude FROM geo_places WHERE place = ?",
+                           (normalize_place(place),)).fetchone()
+    finally:
+        if own:
+            conn.close()
+    return tuple(row) if row else None
+
+def receiver_location(receiver_id, conn=None):
+    """(lat, lon) of a receiver, or None when it could not be geocoded"""
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        row = conn.execute("SELECT latitude, longitude FROM receivers WHERE receiver_id = ?",
+                           (receiver_id,)).fetchone()
+    finally:
+        if own:
+            conn.close()
+    return tuple(row) if row and row[0] is not None else None
+
+def _points_by_distance(conn, lat, lon, radius_km):
+    """Yield (distance_km rounded, [point_id, ...]) for the indexed points within radius_km, nearest first"""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = min(dlat / max(math.cos(math.radians(lat)), 0.01), 180)
+    # The R*Tree stores 32-bit floats rounded outwards: a little slack, the exact distance decides
+    box = {'lat_lo': lat - dlat * 1.01, 'lat_hi': lat + dlat * 1.01, 'lon_lo': lon - dlon * 1.01, 'lon_hi': lon + dlon * 1.01}
+    rows = conn.execute(POINTS_IN_BOX, box).fetchall()
+    if not rows:
+        return
+    point_ids, lats, lons = (np.array(column) for column in zip(*rows))
+    distances = _distances_km(lat, lon, lats, lons)
+    inside = distances <= radius_km
+    distances, point_ids = distances[inside].round(2), point_ids[inside]
+    order = np.lexsort((point_ids, distances))
+    distances, point_ids = distances[order], point_ids[order]
+    # Groups are only split out as the search gets to them
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(distances)) + 1, [len(distances)]))
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        yield float(distances[start]), point_ids[start:end].tolist()
+
+def _search(conn, lat, lon, radius_km, limit):
+    results = []
+    # Points at the same (rounded) distance tie: their listings are merged in expiry order
+    for distance, points in _points_by_distance(conn, lat, lon, radius_km):
+        query = POINT_LISTINGS.format(points=', '.join('?' for _ in points))
+        after = (date.today().isoformat(), -1)
+        while len(results) < limit:
+            page = conn.execute(query, points + [*after, max(CANDIDATE_BATCH, limit)]).fetchall()
+            if not page:
+                break
+            after = page[-1][1], page[-1][0]
+            ids = [food_id for food_id, _ in page]
+            cursor = conn.execute(LISTING_DETAILS.format(ids=', '.join('?' for _ in ids)), ids)
+            columns = [c[0] for c in cursor.description]
+            details = {row[0]: dict(zip(columns, row)) for row in cursor}
+            for food_id in ids:
+                item = details.get(food_id)
+                if item is None or (item['available_quantity'] or 0) <= 0:
+                    continue
+                item['distance_km'] = distance
+                results.append(item)
+                if len(results) == limit:
+                    break
+        if len(results) == limit:
+            break
+    return results
+
+def nearby_listings(lat, lon, radius_km=DEFAULT_RADIUS_KM, limit=NEAR_LIMIT, conn=None):
+    """Available, unexpired listings within radius_km of (lat, lon): nearest first, then soonest expiry
+
+    Returns a list of dicts with distance_km added.
+    """
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        # Widen the circle until it holds `limit` listings: anything outside it is farther
+        # than all of them (by more than the rounding), so scattered points are read only nearby
+        radius = min(START_RADIUS_KM, radius_km)
+        while True:
+            results = _search(conn, lat, lon, radius, limit)
+            if radius >= radius_km or (len(results) >= limit and results[-1]['distance_km'] + 0.01 <= radius):
+                return results
+            radius = min(radius * 2, radius_km)
+    finally:
+        if own:
+            conn.close()
+
+def geo_status(conn=None):
+    """Geocoding coverage and index size"""
+    own = conn is None
+    conn = conn or db.get_db_connection()
+    try:
+        status = {}
+        for table in GEO_TABLES:
+            total, located = conn.execute(f"SELECT COUNT(*), COUNT(latitude) FROM {table}").fetchone()
+            status[f'{table}_geocoded'] = f'{located}/{total}'
+        status['listings_indexed'] = conn.execute("SELECT COUNT(*) FROM listing_points").fetchone()[0]
+        status['points_indexed'] = conn.execute("SELECT COUNT(*) FROM listing_geo").fetchone()[0]
+        status['gazetteer_places'] = conn.execute("SELECT COUNT(*) FROM geo_places").fetchone()[0]
+        return status
+    finally:
+        if own:
+            conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Geocoding and nearest-listing search')
+    sub = parser.add_subparsers(dest='command', required=True)
+    near = sub.add_parser('near', help='available listings near a receiver, place or point')
+    where = near.add_mutually_exclusive_group(required=True)
+    where.add_argument('--receiver', type=int)
+    where.add_argument('--place')
+    where.add_argument('--point', nargs=2, type=float, metavar=('LAT', 'LON'))
+    near.add_argument('--radius', type=float, default=DEFAULT_RADIUS_KM, help='km')
+    near.add_argument('--limit', type=int, default=20)
+    sub.add_parser('status', help='geocoding coverage')
+    sub.add_parser('rebuild', help='re-geocode missing rows and rebuild the listing index')
+    args = parser.parse_args(argv)
+
+    conn = db.get_db_connection()
+    try:
+        ensure_geo_schema(conn)
+        if args.command == 'status':
+            print(geo_status(conn))
+        elif args.command == 'rebuild':
+            print(geocode_missing(conn), {'listings_indexed': rebuild_listing_index(conn)})
+        else:
+            if args.receiver is not None:
+                point = receiver_location(args.receiver, conn)
+            elif args.place:
+                point = place_location(args.place, conn)
+            else:
+                point = tuple(args.point)
+            if point is None:
+                print('Location not found in the gazetteer')
+                return 1
+            for item in nearby_listings(*point, radius_km=args.radius, limit=args.limit, conn=conn):
+                print(f"{item['distance_km']:>8.2f} km  {item['expiry_date']}  #{item['food_id']} {item['food_name']} "
+                      f"({item['available_quantity']} left, {item['provider_name']}, {item['city']})")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
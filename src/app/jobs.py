@@ -0,0 +1,310 @@
+"""Background maintenance jobs.
+
+A scheduler thread in every app process (or a sidecar: `python jobs.py run`)
+wakes up, finds jobs whose next_run_at has passed in the scheduled_jobs table
+and runs them. Before running, a process takes the job's lease with one
+conditional UPDATE, so with several processes each run happens exactly once.
+Run times get random jitter so processes started together don't all hit the
+database at once.
+
+Built-in jobs:
+    cancel_stale_claims  cancel Pending claims on food expired for over a grace period
+    archive_expired      move long-expired listings and old cancelled claims to the archive
+    optimize             PRAGMA optimize (refreshes planner statistics where needed)
+    checkpoint           WAL checkpoint, truncating the file when it grew past the limit
+    prune_change_log     keep the change feed bounded
+    publish_snapshot     re-render the static dashboard snapshot when the data changed
+    sync_entity_index    apply provider/receiver changes to the duplicate-detection index
+    vacuum               rebuild the file (off by default: it blocks writers while it runs)
+
+Intervals are set with FOOD_RESCUE_JOB_<NAME>_INTERVAL (seconds, 0 = off);
+FOOD_RESCUE_JOBS=0 turns the in-app scheduler off.
+
+    python src/app/jobs.py status
+    python src/app/jobs.py once cancel_stale_claims
+    python src/app/jobs.py run
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+
+import db
+from archive import ARCHIVE_AFTER_DAYS, archive_cold_rows
+from changefeed import prune_changes
+from coordination import checkpoint, maybe_checkpoint, retry_on_busy
+from entity_resolution import sync_index
+from snapshot import publish_snapshot
+
+JOBS_ENABLED = os.environ.get('FOOD_RESCUE_JOBS', '1') != '0'
+# Fraction of the interval added or removed at random from each next run
+JOB_JITTER = float(os.environ.get('FOOD_RESCUE_JOB_JITTER', 0.1))
+# A lease older than this is assumed to belong to a crashed process
+JOB_LEASE_SECONDS = float(os.environ.get('FOOD_RESCUE_JOB_LEASE', 600))
+SCHEDULER_TICK = 30
+STALE_CLAIM_GRACE_DAYS = int(os.environ.get('FOOD_RESCUE_STALE_CLAIM_GRACE_DAYS', 1))
+CANCEL_BATCH_SIZE = 1000
+CHANGE_LOG_KEEP = int(os.environ.get('FOOD_RESCUE_CHANGE_LOG_KEEP', 100000))
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def cancel_stale_claims(conn):
+    """Cancel Pending claims whose food expired more than the grace period ago"""
+    cutoff = f'-{STALE_CLAIM_GRACE_DAYS} day'
+    cancelled = 0
+    while True:
+        retry_on_busy(conn.execute, 'BEGIN IMMEDIATE')
+        count = conn.execute('''
+            UPDATE claims SET status = 'Cancelled'
+            WHERE claim_id IN (
+                SELECT c.claim_id FROM claims c JOIN food_listings f ON f.food_id = c.food_id
+                WHERE c.status = 'Pending' AND f.expiry_date < date('now', ?)
+                LIMIT ?)
+        ''', (cutoff, CANCEL_BATCH_SIZE)).rowcount
+        conn.commit()
+        cancelled += count
+        if count < CANCEL_BATCH_SIZE:
+            break
+    if cancelled:
+        db.log_audit('auto_cancel_claims', f'cancelled={cancelled}')
+    return {'cancelled': cancelled}
+
+def archive_expired(conn):
+    return archive_cold_rows(days=ARCHIVE_AFTER_DAYS, conn=conn)
+
+def optimize(conn):
+    conn.execute('PRAGMA optimize')
+    return {}
+
+def checkpoint_wal(conn):
+    truncated = maybe_checkpoint(conn, db.DB_PATH)
+    busy, wal_pages, done = truncated or checkpoint(conn, 'PASSIVE')
+    return {'busy': busy, 'wal_pages': wal_pages, 'checkpointed': done, 'truncated': truncated is not None}
+
+def prune_change_log(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_log'").fetchone():
+        return {'deleted': 0}
+    return {'deleted': prune_changes(CHANGE_LOG_KEEP, conn=conn)}
+
+def publish_dashboard_snapshot(conn):
+    # Cheap when nothing changed: one change-log version check
+    return publish_snapshot()
+
+def sync_entity_index(conn):
+    return {'rekeyed': sync_index(conn)}
+
+def vacuum(conn):
+    conn.execute('VACUUM')
+    return {}
+
+# name -> (function, default interval in seconds)
+JOBS = {
+    'cancel_stale_claims': (cancel_stale_claims, 15 * 60),
+    'archive_expired': (archive_expired, 6 * 3600),
+    'optimize': (optimize, 24 * 3600),
+    'checkpoint': (checkpoint_wal, 5 * 60),
+    'prune_change_log': (prune_change_log, 3600),
+    'publish_snapshot': (publish_dashboard_snapshot, 60),
+    'sync_entity_index': (sync_entity_index, 60),
+    'vacuum': (vacuum, 0),
+}
+
+def job_interval(name):
+    return int(os.environ.get(f'FOOD_RESCUE_JOB_{name.upper()}_INTERVAL', JOBS[name][1]))
+
+def _jittered(interval):
+    return interval * (1 + random.uniform(-JOB_JITTER, JOB_JITTER))
+
+def ensure_job_table(conn):
+    """Create scheduled_jobs and register every enabled built-in job
+
+    Runs at migration time (and once when the sidecar starts), not per run
+    or status read.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name TEXT PRIMARY KEY,
+            interval_s INTEGER NOT NULL,
+            next_run_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            last_started_at REAL,
+            last_finished_at REAL,
+            last_status TEXT,
+            last_result TEXT,
+            run_count INTEGER NOT NULL DEFAULT 0,
+            failure_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    now = time.time()
+    for name in JOBS:
+        interval = job_interval(name)
+        # First runs are spread over one interval instead of all firing at startup
+        conn.execute('''
+            INSERT INTO scheduled_jobs(name, interval_s, next_run_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET interval_s = excluded.interval_s
+        ''', (name, interval, now + random.uniform(0, interval)))
+    conn.commit()
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+def acquire_lease(conn, name, force=False):
+    """Take the job's lease if it is due (or forced) and not held; True on success"""
+    now = time.time()
+    due = '' if force else 'AND next_run_at <= :now'
+    cursor = retry_on_busy(conn.execute, f'''
+        UPDATE scheduled_jobs
+        SET lease_owner = :owner, lease_expires_at = :expires, last_started_at = :now
+        WHERE name = :name {due}
+          AND (lease_expires_at IS NULL OR lease_expires_at < :now)
+    ''', {'owner': _owner(), 'expires': now + JOB_LEASE_SECONDS, 'now': now, 'name': name})
+    conn.commit()
+    return cursor.rowcount == 1
+
+def _finish(conn, name, status, result):
+    interval = job_interval(name)
+    now = time.time()
+    next_run = now + _jittered(interval) if interval > 0 else now + 365 * 86400
+    retry_on_busy(conn.execute, '''
+        UPDATE scheduled_jobs
+        SET lease_owner = NULL, lease_expires_at = NULL, last_finished_at = ?, last_status = ?,
+            last_result = ?, next_run_at = ?, run_count = run_count + 1,
+            failure_count = failure_count + (? != 'ok')
+        WHERE name = ?
+    ''', (now, status, json.dumps(result, default=str), next_run, status, name))
+    conn.commit()
+
+def run_job(name, force=False):
+    """Run one job under its lease; returns its result, or None if another process has it"""
+    conn = db.get_db_connection()
+    try:
+        if not acquire_lease(conn, name, force=force):
+            return None
+        try:
+            result = JOBS[name][0](conn)
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            _finish(conn, name, 'error', {'error': str(e)})
+            raise
+        _finish(conn, name, 'ok', result)
+        return result
+    finally:
+        conn.close()
+
+def run_due_jobs():
+    """Run every enabled job that is due; returns {name: result}"""
+    conn = db.get_db_connection()
+    try:
+        now = time.time()
+        due = [row[0] for row in conn.execute(
+            "SELECT name FROM scheduled_jobs WHERE interval_s > 0 AND next_run_at <= ? ORDER BY next_run_at", (now,))]
+    finally:
+        conn.close()
+    results = {}
+    for name in due:
+        if name not in JOBS:
+            continue
+        try:
+            results[name] = run_job(name)
+        except Exception as e:
+            results[name] = {'error': str(e)}
+    return results
+
+def job_status():
+    """Rows of scheduled_jobs with readable times"""
+    conn = db.get_db_connection()
+    try:
+        rows = conn.execute('''
+            SELECT name, interval_s, next_run_at, last_finished_at, last_status, last_result,
+                   run_count, failure_count, lease_owner
+            FROM scheduled_jobs ORDER BY name
+        ''').fetchall()
+    finally:
+        conn.close()
+    stamp = lambda t: datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S') if t else None
+    return [{
+        'job': row['name'],
+        'interval_s': row['interval_s'],
+        'next_run': stamp(row['next_run_at']) if row['interval_s'] > 0 else 'off',
+        'last_finished': stamp(row['last_finished_at']),
+        'last_status': row['last_status'],
+        'last_result': row['last_result'],
+        'runs': row['run_count'],
+        'failures': row['failure_count'],
+        'running_on': row['lease_owner'],
+    } for row in rows]
+
+class JobScheduler(threading.Thread):
+    """Daemon thread polling for due jobs every `tick` seconds"""
+
+    def __init__(self, tick=SCHEDULER_TICK):
+        super().__init__(name='food-rescue-jobs', daemon=True)
+        self.tick = tick
+        self.stop_event = threading.Event()
+        self.last_error = None
+
+    def run(self):
+        # Jittered first tick so processes started together spread out
+        while not self.stop_event.wait(_jittered(self.tick)):
+            try:
+                run_due_jobs()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+
+    def stop(self):
+        self.stop_event.set()
+
+def start_job_scheduler():
+    """Start the per-process job scheduler once; no-op when FOOD_RESCUE_JOBS=0"""
+    global _scheduler
+    if not JOBS_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = JobScheduler()
+            _scheduler.start()
+        return _scheduler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Food rescue maintenance jobs')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='show job state')
+    once = sub.add_parser('once', help='run one job now')
+    once.add_argument('job', choices=sorted(JOBS))
+    run = sub.add_parser('run', help='run the scheduler in the foreground (sidecar mode)')
+    run.add_argument('--tick', type=float, default=SCHEDULER_TICK)
+    args = parser.parse_args(argv)
+
+    # The sidecar may start before any app process has migrated this database
+    conn = db.get_db_connection()
+    try:
+        ensure_job_table(conn)
+    finally:
+        conn.close()
+    if args.command == 'status':
+        for row in job_status():
+            print(row)
+    elif args.command == 'once':
+        result = run_job(args.job, force=True)
+        print(result if result is not None else f'{args.job} is running in another process')
+    else:
+        try:
+            while True:
+                for name, result in run_due_jobs().items():
+                    print(f"{datetime.now():%Y-%m-%d %H:%M:%S} {name}: {result}", flush=True)
+                time.sleep(_jittered(args.tick))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Lazily loaded, memoized page data.
+
+Pages declare the queries they need as LazyFrame objects and call load()
+only inside the tab, expander or widget that shows the result. Tabs and
+expanders are created with state tracking (lazy_tabs / lazy_expander) so
+their `.open` flag tells the page whether that content is on screen; closed
+sections never touch the database.
+
+Loaded frames are memoized in the session across reruns. Each entry is
+stamped with the change-log version it was read at; on the next load it is
+reused unless a table the frame depends on changed since (see
+changefeed.changed_since), so a rerun after an unrelated write costs one
+indexed range lookup instead of re-running the query.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+import db
+from changefeed import changed_since, current_version
+
+# Memoized frames kept per session (least recently used are dropped first)
+LAZY_MEMO_ENTRIES = int(os.environ.get('FOOD_RESCUE_LAZY_MEMO_ENTRIES', 32))
+_MEMO_KEY = '_lazy_data_memo'
+
+lazy_stats = {'hits': 0, 'misses': 0, 'uncached': 0}
+_stats_lock = threading.Lock()
+
+def _count(stat):
+    with _stats_lock:
+        lazy_stats[stat] += 1
+
+def lazy_metrics():
+    with _stats_lock:
+        return dict(lazy_stats)
+
+def _versions(tables, since):
+    """(current version, changed) in one connection; (None, True) without a change log"""
+    conn = db.get_db_connection()
+    try:
+        version = current_version(conn)
+        changed = since is None or version < since or (version > since and changed_since(since, tables, conn))
+        return version, changed
+    except sqlite3.OperationalError:
+        return None, True
+    finally:
+        conn.close()
+
+class LazyFrame:
+    """A query whose result is fetched on first load() and reused while its tables are unchanged"""
+
+    def __init__(self, sql, tables, params=None):
+        self.sql = sql
+        self.tables = tuple(tables)
+        self.params = params
+
+    def load(self, params=None):
+        """Result DataFrame; shared with later reruns, so callers must not modify it in place"""
+        params = self.params if params is None else params
+        key = (self.sql, tuple(params or ()))
+        memo = st.session_state.setdefault(_MEMO_KEY, OrderedDict())
+        entry = memo.get(key)
+        version, changed = _versions(self.tables, entry[0] if entry else None)
+        if entry is not None and not changed:
+            memo[key] = (version, entry[1])
+            memo.move_to_end(key)
+            _count('hits')
+            return entry[1]
+        frame = db.run_query(self.sql, params)
+        if version is None:
+            # No change log to validate against: never serve a stale copy
+            memo.pop(key, None)
+            _count('uncached')
+            return frame
+        memo[key] = (version, frame)
+        memo.move_to_end(key)
+        while len(memo) > LAZY_MEMO_ENTRIES:
+            memo.popitem(last=False)
+        _count('misses')
+        return frame
+
+def memoized_frames():
+    """This session's memoized frames keyed by the first line of their query"""
+    memo = st.session_state.get(_MEMO_KEY, {})
+    return {' '.join(sql.split())[:60] + (f' {params}' if params else ''): entry[1]
+            for (sql, params), entry in memo.items()}
+
+def lazy_expander(label, key, expanded=False):
+    """Expander whose `.open` is True only while it is expanded"""
+    return st.expander(label, expanded=expanded, key=key, on_change='rerun')
+
+def lazy_tabs(labels, key):
+    """Tabs whose `.open` is True only for the selected tab"""
+    return st.tabs(labels, key=key, on_change='rerun')
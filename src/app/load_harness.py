@@ -0,0 +1,332 @@
+"""Headless concurrent load harness for the app's write paths.
+
+Drives the same helpers the Streamlit pages use (run_query, get_next_id,
+execute_query, log_audit) from N threads or processes against one scratch
+copy of the database, then prints a correctness and throughput report.
+
+    python src/app/load_harness.py --workers 8 --ops 200 --mode process
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import db
+
+# Same availability aggregate page_manage_claims uses to build its food picker
+AVAILABLE_FOODS_QUERY = """
+    SELECT f.food_id, f.food_name, f.quantity, f.provider_id,
+           COALESCE(SUM(c.claimed_quantity), 0) as total_claimed,
+           (f.quantity - COALESCE(SUM(c.claimed_quantity), 0)) as available_quantity
+    FROM food_listings f
+    LEFT JOIN claims c ON f.food_id = c.food_id AND c.status != 'Cancelled'
+    GROUP BY f.food_id
+    HAVING available_quantity > 0
+"""
+
+OVER_CLAIM_QUERY = """
+    SELECT f.food_id, f.quantity, SUM(c.claimed_quantity) AS claimed
+    FROM food_listings f
+    JOIN claims c ON c.food_id = f.food_id AND c.status != 'Cancelled'
+    GROUP BY f.food_id
+    HAVING claimed > f.quantity
+"""
+
+OPERATIONS = ('claim', 'register', 'crud')
+
+def prepare_database(source, seed_listings, seed_quantity):
+    """Copy the source database to a scratch file and seed contended listings"""
+    work_dir = Path(tempfile.mkdtemp(prefix='food_rescue_load_'))
+    target = work_dir / 'load.db'
+    if source and Path(source).exists():
+        src = sqlite3.connect(str(source))
+        dst = sqlite3.connect(str(target))
+        src.backup(dst)
+        src.close()
+    else:
+        dst = sqlite3.connect(str(target))
+
+    cursor = dst.cursor()
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS providers (
+            provider_id INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT,
+            address TEXT, city TEXT, contact TEXT);
+        CREATE TABLE IF NOT EXISTS receivers (
+            receiver_id INTEGER PRIMARY KEY, name TEXT, type TEXT, city TEXT, contact TEXT);
+        CREATE TABLE IF NOT EXISTS food_listings (
+            food_id INTEGER PRIMARY KEY, food_name TEXT, quantity INTEGER, expiry_date DATE,
+            provider_id INTEGER, provider_type TEXT, location TEXT, food_type TEXT, meal_type TEXT);
+        CREATE TABLE IF NOT EXISTS claims (
+            claim_id INTEGER PRIMARY KEY, food_id INTEGER, receiver_id INTEGER,
+            claimed_quantity INTEGER DEFAULT 0,
+            status TEXT CHECK (status IN ('Pending','Completed','Cancelled')), timestamp DATETIME);
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, operation TEXT NOT NULL,
+            user TEXT DEFAULT 'streamlit', details TEXT, ts_utc DATETIME NOT NULL);
+    ''')
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(claims)")]
+    if 'claimed_quantity' not in columns:
+        cursor.execute("ALTER TABLE claims ADD COLUMN claimed_quantity INTEGER DEFAULT 0")
+
+    # A few small listings every worker fights over, so over-claims can surface
+    provider_id = cursor.execute("SELECT COALESCE(MAX(provider_id), 0) + 1 FROM providers").fetchone()[0]
+    cursor.execute(
+        "INSERT INTO providers(provider_id, name, type, address, city, contact) VALUES (?, ?, ?, ?, ?, ?)",
+        (provider_id, 'Load Test Provider', 'Restaurant', 'Harness St', 'Loadville', '+1-555-0000'),
+    )
+    receiver_id = cursor.execute("SELECT COALESCE(MAX(receiver_id), 0) + 1 FROM receivers").fetchone()[0]
+    cursor.execute(
+        "INSERT INTO receivers(receiver_id, name, type, city, contact) VALUES (?, ?, ?, ?, ?)",
+        (receiver_id, 'Load Test Receiver', 'Food Bank', 'Loadville', '+1-555-0001'),
+    )
+    next_food = cursor.execute("SELECT COALESCE(MAX(food_id), 0) + 1 FROM food_listings").fetchone()[0]
+    for i in range(seed_listings):
+        cursor.execute('''
+            INSERT INTO food_listings(food_id, food_name, quantity, expiry_date, provider_id,
+                                      provider_type, location, food_type, meal_type)
+            VALUES (?, ?, ?, date('now', '+7 day'), ?, 'Restaurant', 'Harness St', 'Grain', 'Lunch')
+        ''', (next_food + i, f'Load Item {i + 1}', seed_quantity, provider_id))
+    dst.commit()
+    dst.close()
+    return target
+
+def classify_error(exc):
+    """Bucket a write-path failure into the categories the report tracks"""
+    message = str(exc)
+    if 'database is locked' in message or 'database is busy' in message:
+        return 'locked'
+    if 'UNIQUE constraint failed' in message:
+        return 'id_collision'
+    return 'other'
+
+def op_claim(rng):
+    """page_manage_claims: read availability, take next claim_id, insert, audit"""
+    foods = db.run_query(AVAILABLE_FOODS_QUERY)
+    receivers = db.run_query("SELECT receiver_id, name FROM receivers")
+    if foods.empty or receivers.empty:
+        return False
+    food = foods.iloc[rng.randrange(len(foods))]
+    max_quantity = int(food['available_quantity'])
+    claimed_quantity = rng.randint(1, min(max_quantity, 3))
+    receiver_id = int(receivers.iloc[rng.randrange(len(receivers))]['receiver_id'])
+    claim_id = db.get_next_id('claims', 'claim_id')
+    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    db.execute_query('''
+        INSERT INTO claims(claim_id, food_id, receiver_id, claimed_quantity, status, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (claim_id, int(food['food_id']), receiver_id, claimed_quantity, 'Pending', ts))
+    db.log_audit('create_claim', f'claim_id={claim_id}, food_id={int(food["food_id"])}, receiver_id={receiver_id}, quantity={claimed_quantity}')
+    return True
+
+def op_register(rng):
+    """page_user_registration: next id, insert provider or receiver, audit (CSV append skipped)"""
+    suffix = rng.randrange(10**6)
+    if rng.random() < 0.5:
+        next_id = db.get_next_id('providers', 'provider_id')
+        db.execute_query('''
+            INSERT INTO providers(provider_id, name, type, address, city, contact)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (next_id, f'Load Provider {suffix}', 'Restaurant', 'Harness St', 'Loadville', f'+1-555-{suffix:06d}'))
+        db.log_audit('register_provider', f'provider_id={next_id}, name=Load Provider {suffix}')
+    else:
+        next_id = db.get_next_id('receivers', 'receiver_id')
+        db.execute_query('''
+            INSERT INTO receivers(receiver_id, name, type, city, contact)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (next_id, f'Load Receiver {suffix}', 'Food Bank', 'Loadville', f'+1-555-{suffix:06d}'))
+        db.log_audit('register_receiver', f'receiver_id={next_id}, name=Load Receiver {suffix}')
+    return True
+
+def op_crud(rng):
+    """page_providers_receivers: add a provider, edit it, then delete it"""
+    provider_id = db.get_next_id('providers', 'provider_id')
+    db.execute_query('''
+        INSERT INTO providers(provider_id,name,type,address,city,contact)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (provider_id, 'Load CRUD Provider', 'Cafe', 'Harness St', 'Loadville', '+1-555-9999'))
+    db.log_audit('create_provider', f'provider_id={provider_id}')
+    db.execute_query('''
+        UPDATE providers SET name=?, type=?, address=?, city=?, contact=?
+        WHERE provider_id=?
+    ''', ('Load CRUD Provider (edited)', 'Cafe', 'Harness St', 'Loadville', '+1-555-9999', provider_id))
+    db.log_audit('update_provider', f'provider_id={provider_id}')
+    db.execute_query('DELETE FROM providers WHERE provider_id=?', (provider_id,))
+    db.log_audit('delete_provider', f'provider_id={provider_id}')
+    return True
+
+OP_FUNCS = {'claim': op_claim, 'register': op_register, 'crud': op_crud}
+
+def run_worker(worker_id, db_path, ops, mix, seed):
+    """Run `ops` random operations from `mix`; returns per-worker stats"""
+    # Process workers re-import db, so point it at the scratch file explicitly
+    db.DB_PATH = Path(db_path)
+    rng = random.Random(seed + worker_id)
+    stats = {op: {'ok': 0, 'locked': 0, 'id_collision': 0, 'other': 0, 'skipped': 0} for op in OPERATIONS}
+    latencies = []
+    errors = []
+    for _ in range(ops):
+        op = rng.choice(mix)
+        started = time.perf_counter()
+        try:
+            if OP_FUNCS[op](rng):
+                stats[op]['ok'] += 1
+                latencies.append(time.perf_counter() - started)
+            else:
+                stats[op]['skipped'] += 1
+        except Exception as e:
+            kind = classify_error(e)
+            stats[op][kind] += 1
+            if kind == 'other' and len(errors) < 5:
+                errors.append(f'{op}: {e}')
+    return {'stats': stats, 'latencies': latencies, 'errors': errors, 'write_queue': db.write_queue_metrics()}
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def check_over_claims(db_path):
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return conn.execute(OVER_CLAIM_QUERY).fetchall()
+    finally:
+        conn.close()
+
+def run_load(workers=4, ops=100, mode='thread', mix=OPERATIONS, source=None,
+             seed_listings=3, seed_quantity=20, seed=0):
+    """Run the load test and return a report dict"""
+    db_path = prepare_database(source, seed_listings, seed_quantity)
+    # Over-claims already present in the source data are not the harness's doing
+    baseline = {food_id: claimed for food_id, _, claimed in check_over_claims(db_path)}
+    os.environ['FOOD_RESCUE_DB'] = str(db_path)
+    db.DB_PATH = db_path
+
+    executor_cls = ProcessPoolExecutor if mode == 'process' else ThreadPoolExecutor
+    started = time.perf_counter()
+    with executor_cls(max_workers=workers) as pool:
+        futures = [pool.submit(run_worker, w, str(db_path), ops, list(mix), seed) for w in range(workers)]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    totals = {op: {'ok': 0, 'locked': 0, 'id_collision': 0, 'other': 0, 'skipped': 0} for op in OPERATIONS}
+    latencies = []
+    errors = []
+    for result in results:
+        latencies.extend(result['latencies'])
+        errors.extend(result['errors'])
+        for op, counts in result['stats'].items():
+            for key, value in counts.items():
+                totals[op][key] += value
+
+    if mode == 'process':
+        # Each worker process has its own writer thread; add their counters up
+        queues = [r['write_queue'] for r in results if r['write_queue']]
+        write_queue = {
+            'batches': sum(q['batches'] for q in queues),
+            'committed': sum(q['committed'] for q in queues),
+            'failed': sum(q['failed'] for q in queues),
+            'max_queue_depth': max((q['max_queue_depth'] for q in queues), default=0),
+        } if queues else None
+    else:
+        write_queue = db.write_queue_metrics()
+    if write_queue:
+        done = write_queue['committed'] + write_queue['failed']
+        write_queue['avg_batch_size'] = done / write_queue['batches'] if write_queue['batches'] else 0.0
+
+    over_claims = [row for row in check_over_claims(db_path)
+                   if row[0] not in baseline or row[2] > baseline[row[0]]]
+    ok = sum(t['ok'] for t in totals.values())
+    locked = sum(t['locked'] for t in totals.values())
+    collisions = sum(t['id_collision'] for t in totals.values())
+    other = sum(t['other'] for t in totals.values())
+    return {
+        'db_path': str(db_path),
+        'mode': mode,
+        'workers': workers,
+        'ops_per_worker': ops,
+        'elapsed_s': elapsed,
+        'totals': totals,
+        'ok': ok,
+        'locked': locked,
+        'id_collisions': collisions,
+        'other_errors': other,
+        'error_samples': errors[:10],
+        'over_claims': over_claims,
+        'preexisting_over_claims': len(baseline),
+        'throughput_ops_s': ok / elapsed if elapsed > 0 else 0.0,
+        'latency_p50_ms': percentile(latencies, 50) * 1000,
+        'latency_p95_ms': percentile(latencies, 95) * 1000,
+        'latency_p99_ms': percentile(latencies, 99) * 1000,
+        'write_queue': write_queue,
+        'passed': locked == 0 and collisions == 0 and other == 0 and not over_claims,
+    }
+
+def print_report(report):
+    print('=' * 64)
+    print(f"Load harness: {report['workers']} {report['mode']} workers x {report['ops_per_worker']} ops")
+    print(f"Database: {report['db_path']}")
+    print('-' * 64)
+    print(f"{'operation':<10}{'ok':>8}{'locked':>9}{'id dup':>9}{'other':>8}{'skipped':>9}")
+    for op, counts in report['totals'].items():
+        print(f"{op:<10}{counts['ok']:>8}{counts['locked']:>9}{counts['id_collision']:>9}{counts['other']:>8}{counts['skipped']:>9}")
+    print('-' * 64)
+    print(f"Elapsed:            {report['elapsed_s']:.2f} s")
+    print(f"Throughput:         {report['throughput_ops_s']:.1f} successful ops/s")
+    print(f"Latency p50/p95/p99: {report['latency_p50_ms']:.1f} / {report['latency_p95_ms']:.1f} / {report['latency_p99_ms']:.1f} ms")
+    print(f"'database is locked': {report['locked']}")
+    print(f"ID collisions:        {report['id_collisions']}")
+    print(f"Over-claimed foods:   {len(report['over_claims'])} (ignoring {report['preexisting_over_claims']} already in source data)")
+    for food_id, quantity, claimed in report['over_claims'][:10]:
+        print(f"    food_id={food_id} quantity={quantity} claimed={claimed}")
+    if report['write_queue']:
+        wq = report['write_queue']
+        print(f"Write queue:          {wq['committed']} committed, {wq['failed']} failed in {wq['batches']} group commits "
+              f"(avg batch {wq['avg_batch_size']:.1f}, max depth {wq['max_queue_depth']})")
+    else:
+        print('Write queue:          disabled')
+    if report['error_samples']:
+        print('Other errors (sample):')
+        for message in report['error_samples']:
+            print(f'    {message}')
+    print('-' * 64)
+    print('RESULT: PASS' if report['passed'] else 'RESULT: FAIL')
+    print('=' * 64)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent write-path load harness')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--ops', type=int, default=100, help='operations per worker')
+    parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--mix', default=','.join(OPERATIONS),
+                        help='comma-separated operations: claim,register,crud')
+    parser.add_argument('--source', default=str(db.DB_PATH),
+                        help='database to copy as the starting state')
+    parser.add_argument('--seed-listings', type=int, default=3)
+    parser.add_argument('--seed-quantity', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database')
+    args = parser.parse_args(argv)
+
+    mix = [op.strip() for op in args.mix.split(',') if op.strip()]
+    unknown = [op for op in mix if op not in OP_FUNCS]
+    if unknown:
+        parser.error(f'unknown operations: {unknown}')
+
+    report = run_load(args.workers, args.ops, args.mode, mix, args.source,
+                      args.seed_listings, args.seed_quantity, args.seed)
+    print_report(report)
+    if not args.keep:
+        shutil.rmtree(Path(report['db_path']).parent, ignore_errors=True)
+    return 0 if report['passed'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
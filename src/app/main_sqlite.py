@@ -1,11 +1,35 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from datetime import datetime, timedelta
-import sqlite3
 import os
+import time
 from pathlib import Path
 
+from db import ROOT, DB_PATH, REGION, get_city_connection, get_db_connection, region_for_city, run_query, execute_query, log_audit, get_next_id, init_lock, replica_status, schema_version, write_queue_metrics
+from coordination import coordination_metrics
+from replica import analytics_reads
+from validation import IMPORT_SCHEMAS, PRIMARY_KEYS, bulk_import, import_table
+from entity_resolution import ensure_entity_index, find_matches
+from changefeed import LIVE_REFRESH_SECONDS, TRACKED_TABLES, ensure_change_log, get_dashboard_stats, get_notifier
+from sharding import load_router, shard_status
+from archive import archive_cold_rows, archive_counts, drop_archive, ensure_archive_schema
+from time_dimension import ensure_time_columns
+from reports import DASHBOARD_LISTINGS_QUERY, REPORT_PARAMS, REPORT_QUERIES
+from analytics_engine import ENGINE as ANALYTICS_ENGINE, available_engines, run_report
+from backup import create_backup, export_sql_dump, list_backups, prune_backups, restore_backup, restore_sql_dump, start_backup_scheduler
+from exporter import available_formats, export_filename, export_mime, export_query, export_snapshot, export_table
+from jobs import JOBS, ensure_job_table, job_status, run_job, start_job_scheduler
+from lazy_data import LazyFrame, lazy_expander, lazy_metrics, lazy_tabs, memoized_frames
+from frame_types import memory_report
+from figure_cache import MAX_CHART_POINTS, cached_figure, figure_metrics, top_categories
+from dashboard import listings_table, near_expiry, status_pie, weekly_area
+from metrics import CLAIM_SECONDS, CLAIMS_CREATED, RERUN_SECONDS, metrics_status, start_metrics_exporter
+from snapshot import DATA_FILE, SNAPSHOT_DIR, SNAPSHOT_REFRESH, publish_snapshot, read_snapshot
+from startup import run_when_changed, startup_timings, stylesheet
+from geo import DEFAULT_RADIUS_KM, MAX_RADIUS_KM, ensure_geo_schema, geo_status, nearby_listings, place_location, receiver_location
+from api_server import api_status, ensure_api_indexes, start_api_server
+from sql_console import CONSOLE_PAGE_ROWS, CONSOLE_TIMEOUT, ConsoleQuery, QueryHistory, console_metrics
+
 # Page configuration
 st.set_page_config(
     page_title="Food Rescue Platform",
@@ -14,192 +38,29 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better UI
-st.markdown("""
-    <style>
-    /* Main theme colors */
-    :root {
-        --primary-color: #FF6B6B;
-        --secondary-color: #4ECDC4;
-        --success-color: #95E1D3;
-        --warning-color: #FFE66D;
-    }
-    
-    /* Sidebar styling */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #667eea 0%, #764ba2 100%);
-    }
-    
-    [data-testid="stSidebar"] .css-1d391kg {
-        color: white;
-    }
-    
-    /* Main content area */
-    .main .block-container {
-        padding-top: 2rem;
-        padding-bottom: 2rem;
-    }
-    
-    /* Headers */
-    h1 {
-        color: #667eea;
-        font-weight: 700;
-        padding-bottom: 1rem;
-        border-bottom: 3px solid #667eea;
-    }
-    
-    h2 {
-        color: #764ba2;
-        font-weight: 600;
-        margin-top: 1.5rem;
-    }
-    
-    h3 {
-        color: #4ECDC4;
-        font-weight: 600;
-    }
-    
-    /* Metric cards */
-    [data-testid="stMetricValue"] {
-        font-size: 2rem;
-        font-weight: 700;
-        color: #667eea;
-    }
-    
-    [data-testid="stMetricLabel"] {
-        font-size: 1rem;
-        font-weight: 600;
-        color: #666;
-    }
-    
-    /* Buttons */
-    .stButton > button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.5rem 2rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 12px rgba(0,0,0,0.15);
-    }
-    
-    /* Form inputs */
-    .stTextInput > div > div > input,
-    .stNumberInput > div > div > input,
-    .stSelectbox > div > div > select,
-    .stTextArea > div > div > textarea {
-        border-radius: 8px;
-        border: 2px solid #e0e0e0;
-        padding: 0.5rem;
-        transition: border-color 0.3s ease;
-    }
-    
-    .stTextInput > div > div > input:focus,
-    .stNumberInput > div > div > input:focus,
-    .stSelectbox > div > div > select:focus,
-    .stTextArea > div > div > textarea:focus {
-        border-color: #667eea;
-        box-shadow: 0 0 0 2px rgba(102, 126, 234, 0.1);
-    }
-    
-    /* Dataframe styling */
-    .dataframe {
-        border-radius: 8px;
-        overflow: hidden;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-    }
-    
-    /* Expander */
-    .streamlit-expanderHeader {
-        background-color: #f8f9fa;
-        border-radius: 8px;
-        font-weight: 600;
-        color: #667eea;
-    }
-    
-    /* Success/Error/Warning messages */
-    .stSuccess {
-        background-color: #d4edda;
-        border-left: 4px solid #28a745;
-        border-radius: 4px;
-        padding: 1rem;
-    }
-    
-    .stError {
-        background-color: #f8d7da;
-        border-left: 4px solid #dc3545;
-        border-radius: 4px;
-        padding: 1rem;
-    }
-    
-    .stWarning {
-        background-color: #fff3cd;
-        border-left: 4px solid #ffc107;
-        border-radius: 4px;
-        padding: 1rem;
-    }
-    
-    .stInfo {
-        background-color: #d1ecf1;
-        border-left: 4px solid #17a2b8;
-        border-radius: 4px;
-        padding: 1rem;
-    }
-    
-    /* Cards */
-    .css-1r6slb0 {
-        background-color: white;
-        border-radius: 12px;
-        padding: 1.5rem;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-    }
-    
-    /* Radio buttons */
-    .stRadio > label {
-        font-weight: 600;
-        color: #667eea;
-    }
-    
-    /* Download button */
-    .stDownloadButton > button {
-        background: linear-gradient(135deg, #4ECDC4 0%, #44A08D 100%);
-        color: white;
-        border-radius: 8px;
-        font-weight: 600;
-    }
-    
-    /* Tabs */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        border-radius: 8px 8px 0 0;
-        padding: 10px 20px;
-        font-weight: 600;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background-color: #667eea;
-        color: white;
-    }
-    </style>
-""", unsafe_allow_html=True)
-
-ROOT = Path(__file__).resolve().parents[2]
-DB_PATH = ROOT / 'food_rescue.db'
+# Custom CSS for better UI (minified once per process)
+st.markdown(stylesheet('style.css'), unsafe_allow_html=True)
 
-def get_db_connection():
-    """Create SQLite database connection"""
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row  # This allows accessing columns by name
-    return conn
+# Page data: each section loads only what it shows, memoized across reruns
+PROVIDERS = LazyFrame("SELECT * FROM providers", ['providers'])
+RECEIVERS = LazyFrame("SELECT * FROM receivers", ['receivers'])
+PROVIDER_NAMES = LazyFrame("SELECT provider_id, name FROM providers ORDER BY name", ['providers'])
+RECEIVER_NAMES = LazyFrame("SELECT receiver_id, name FROM receivers", ['receivers'])
+LISTINGS = LazyFrame("SELECT * FROM food_listings", ['food_listings'])
+CLAIMS = LazyFrame("SELECT * FROM claims", ['claims'])
+# Unexpired food listings with available quantities; load with today's date
+# (as date('now') gives it), which also keeps a memoized copy from outliving the day
+AVAILABLE_FOODS = LazyFrame("""
+    SELECT f.food_id, f.food_name, f.quantity, f.provider_id,
+           COALESCE(SUM(c.claimed_quantity), 0) as total_claimed,
+           (f.quantity - COALESCE(SUM(c.claimed_quantity), 0)) as available_quantity
+    FROM food_listings f
+    LEFT JOIN claims c ON f.food_id = c.food_id AND c.status != 'Cancelled'
+    WHERE f.expiry_date >= ?
+    GROUP BY f.food_id
+    HAVING available_quantity > 0
+""", ['food_listings', 'claims'])
+REPORT_PARAM_FRAMES = {label: LazyFrame(sql, list(TRACKED_TABLES)) for label, sql in REPORT_PARAMS.items()}
 
 def migrate_database():
     """Migrate existing database to add new columns if needed"""
@@ -217,6 +78,27 @@ def migrate_database():
                 cursor.execute("ALTER TABLE claims ADD COLUMN claimed_quantity INTEGER DEFAULT 0")
                 conn.commit()
                 st.info("✅ Database migrated: Added 'claimed_quantity' column to claims table")
+            
+            # Integer time columns + calendar for indexable time-series queries
+            ensure_time_columns(conn)
+            
+            # Archive tables and the *_all union views used by historical reports
+            ensure_archive_schema(conn)
+            
+            # Change log + capture triggers feeding the live dashboard
+            ensure_change_log(conn)
+            
+            # Normalized name/phone keys for duplicate checks on registration
+            ensure_entity_index(conn)
+            
+            # Persisted state for the background maintenance jobs
+            ensure_job_table(conn)
+            
+            # Indexes behind the partner API's availability checks
+            ensure_api_indexes(conn)
+            
+            # Gazetteer coordinates + R*Tree index for nearest-listing search
+            ensure_geo_schema(conn)
         except Exception as e:
             st.warning(f"Migration check: {str(e)}")
         finally:
@@ -242,6 +124,7 @@ def import_csv_data():
     cursor = conn.cursor()
     
     # Drop existing tables if they exist
+    drop_archive(conn)
     cursor.execute("DROP TABLE IF EXISTS claims")
     cursor.execute("DROP TABLE IF EXISTS food_listings")
     cursor.execute("DROP TABLE IF EXISTS receivers")
@@ -314,63 +197,20 @@ def import_csv_data():
         csv_file = DATA_DIR / f"{table}_data.csv"
         if csv_file.exists():
             try:
-                df = pd.read_csv(csv_file)
-                st.write(f"Importing {table}: {len(df)} rows")
-                
-                # Clean the data
-                df = df.copy()
-                
-                # Normalize column names to lowercase with underscores
-                df.columns = df.columns.str.lower().str.replace(' ', '_')
-                
-                # Handle expiry_date - convert to ISO format, drop invalid
-                if 'expiry_date' in df.columns:
-                    # Try multiple date formats
-                    df['expiry_date'] = pd.to_datetime(df['expiry_date'], format='%m/%d/%Y', errors='coerce')
-                    if df['expiry_date'].isna().all():
-                        df['expiry_date'] = pd.to_datetime(df['expiry_date'], errors='coerce')
-                    df = df.dropna(subset=['expiry_date'])
-                    df['expiry_date'] = df['expiry_date'].dt.strftime('%Y-%m-%d')
-                
-                # Handle timestamp - convert to ISO format
-                if 'timestamp' in df.columns:
-                    # Try multiple timestamp formats
-                    df['timestamp'] = pd.to_datetime(df['timestamp'], format='%m/%d/%Y %H:%M', errors='coerce')
-                    if df['timestamp'].isna().all():
-                        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-                    df = df.dropna(subset=['timestamp'])
-                    df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Handle quantity - convert to integer, NULL for negative/missing
-                if 'quantity' in df.columns:
-                    df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce')
-                    df.loc[df['quantity'] < 0, 'quantity'] = None
-                
-                # Handle contact - normalize phone numbers
-                if 'contact' in df.columns:
-                    df['contact'] = df['contact'].astype(str).str.strip()
-                
-                # Deduplicate by contact for providers and receivers
-                if table in ['providers', 'receivers'] and 'contact' in df.columns:
-                    df = df.drop_duplicates(subset=['contact'], keep='first')
-                
-                st.write(f"After cleaning: {len(df)} rows")
-                
-                # Insert data
-                if not df.empty:
-                    placeholders = ', '.join(['?' for _ in df.columns])
-                    columns = ', '.join(df.columns)
-                    query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-                    
-                    for _, row in df.iterrows():
-                        cursor.execute(query, tuple(row))
-                    
-                    st.success(f"✅ {table}: {len(df)} rows imported")
+                # Rule-based validation: bad rows go to a reject file, the rest are loaded
+                summary = import_table(conn, table, csv_file)
+                st.write(f"Importing {table}: {summary['rows']} rows")
+                if summary['loaded']:
+                    st.success(f"✅ {table}: {summary['loaded']} rows imported")
                 else:
-                    st.warning(f"⚠️ {table}: No data after cleaning")
-                    
+                    st.warning(f"⚠️ {table}: No valid rows to import")
+                if summary['rejected']:
+                    reasons = ', '.join(f'{reason} ({count})' for reason, count in summary['reasons'].items())
+                    st.warning(f"⚠️ {table}: {summary['rejected']} rows rejected: {reasons}. See {summary['reject_file']}")
             except Exception as e:
                 st.error(f"❌ Error importing {table}: {str(e)}")
+                conn.rollback()
+                conn.close()
                 return False
         else:
             st.warning(f"⚠️ {csv_file} not found, skipping {table}")
@@ -503,46 +343,6 @@ def init_database():
         conn.close()
         st.success('✅ Database initialized with sample data!')
 
-def run_query(query, params=None):
-    """Run a SQL query and return results as DataFrame"""
-    conn = get_db_connection()
-    try:
-        if params:
-            df = pd.read_sql_query(query, conn, params=params)
-        else:
-            df = pd.read_sql_query(query, conn)
-        return df
-    finally:
-        conn.close()
-
-def execute_query(query, params=None):
-    """Execute a SQL query (INSERT, UPDATE, DELETE)"""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        conn.commit()
-        return cursor.rowcount
-    finally:
-        conn.close()
-
-def log_audit(operation, details=''):
-    """Log an operation to audit log"""
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    execute_query(
-        "INSERT INTO audit_log(operation, user, details, ts_utc) VALUES (?, 'streamlit', ?, ?)",
-        (operation, details, now)
-    )
-
-def get_next_id(table, id_column):
-    """Get the next available ID for a table"""
-    result = run_query(f"SELECT MAX({id_column}) as max_id FROM {table}")
-    max_id = result.iloc[0]['max_id']
-    return 1 if max_id is None or pd.isna(max_id) else int(max_id) + 1
-
 def append_to_csv(table_name, data_dict):
     """Append data to CSV file"""
     DATA_DIR = ROOT / 'data'
@@ -567,94 +367,86 @@ def append_to_csv(table_name, data_dict):
         st.error(f"Error saving to CSV: {str(e)}")
         return False
 
-def page_home():
-    # Hero section
-    st.markdown("""
-        <div style='text-align: center; padding: 2rem 0; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                    border-radius: 12px; margin-bottom: 2rem; color: white;'>
-            <h1 style='color: white; border: none; font-size: 3rem; margin: 0;'>🍽️ Food Rescue Platform</h1>
-            <p style='font-size: 1.2rem; margin-top: 1rem; opacity: 0.9;'>
-                Connect surplus-food providers to receivers • Reduce waste • Fight hunger
-            </p>
-        </div>
-    """, unsafe_allow_html=True)
-    
-    # Get KPIs from database
-    providers_count = run_query("SELECT COUNT(*) as count FROM providers").iloc[0]['count']
-    receivers_count = run_query("SELECT COUNT(*) as count FROM receivers").iloc[0]['count']
-    listings_count = run_query("SELECT COUNT(*) as count FROM food_listings").iloc[0]['count']
-    claims_count = run_query("SELECT COUNT(*) as count FROM claims").iloc[0]['count']
-    completed_count = run_query("SELECT COUNT(*) as count FROM claims WHERE status='Completed'").iloc[0]['count']
-    
-    pct_completed = (completed_count / claims_count * 100) if claims_count > 0 else 0
+# Serve only the published dashboard snapshot (see snapshot.py)
+VIEWER_MODE = os.environ.get('FOOD_RESCUE_VIEWER', '0') == '1'
+
+CLAIM_TABLES = ('claims', 'claims_archive')
+LISTING_TABLES = ('food_listings', 'providers')
+
+def report_bar(report, x, y):
+    df = run_report(report)
+    if df.empty:
+        return None
+    import plotly.express as px
+    return px.bar(top_categories(df, x, y), x=x, y=y, title=report)
+
+def render_home_stats():
+    stats = get_dashboard_stats()
+    # The notifier polls the log head once per process; skip the refresh when nothing changed
+    if stats.version is None or get_notifier().version != stats.version:
+        stats.refresh()
+    snapshot = stats.snapshot()
+    counts = snapshot['counts']
     
     # KPI Cards with icons
     st.markdown("### 📊 Platform Statistics")
     k1, k2, k3, k4, k5 = st.columns(5)
-    k1.metric('🏪 Providers', providers_count)
-    k2.metric('🏥 Receivers', receivers_count)
-    k3.metric('🍕 Listings', listings_count)
-    k4.metric('📋 Claims', claims_count)
-    k5.metric('✅ Completed', f"{pct_completed:.1f}%")
+    k1.metric('🏪 Providers', counts['providers'])
+    k2.metric('🏥 Receivers', counts['receivers'])
+    k3.metric('🍕 Listings', counts['listings'])
+    k4.metric('📋 Claims', counts['claims'])
+    k5.metric('✅ Completed', f"{snapshot['pct_completed']:.1f}%")
     
     st.markdown("---")
     
     # Charts in columns
     col1, col2 = st.columns(2)
     
+    version = snapshot['version']
+    
     with col1:
         st.markdown("### 📈 Claims Status Distribution")
-        claims_data = run_query("SELECT status, COUNT(*) as count FROM claims GROUP BY status")
-        if not claims_data.empty:
-            fig1 = px.pie(claims_data, names='status', values='count', 
-                         color_discrete_sequence=['#667eea', '#4ECDC4', '#FF6B6B'],
-                         hole=0.4)
-            fig1.update_layout(
-                showlegend=True,
-                height=350,
-                margin=dict(t=30, b=0, l=0, r=0)
-            )
+        fig1 = cached_figure('home_status_pie', CLAIM_TABLES, lambda: status_pie(snapshot['status']), version=version)
+        if fig1 is not None:
             st.plotly_chart(fig1, use_container_width=True)
         else:
             st.info("No claims data available yet")
     
     with col2:
         st.markdown("### 📊 Weekly Claims Trend")
-        weekly_data = run_query("""
-            SELECT strftime('%Y-W%W', timestamp) as week, COUNT(*) as claims 
-            FROM claims 
-            GROUP BY week 
-            ORDER BY week
-        """)
-        if not weekly_data.empty:
-            fig2 = px.area(weekly_data, x='week', y='claims',
-                          color_discrete_sequence=['#667eea'])
-            fig2.update_layout(
-                showlegend=False,
-                height=350,
-                margin=dict(t=30, b=0, l=0, r=0),
-                xaxis_title="Week",
-                yaxis_title="Claims"
-            )
+        fig2 = cached_figure('home_weekly_area', CLAIM_TABLES, lambda: weekly_area(snapshot['weekly']),
+                             spec=MAX_CHART_POINTS, version=version)
+        if fig2 is not None:
             st.plotly_chart(fig2, use_container_width=True)
         else:
             st.info("No weekly data available yet")
+
+def page_home():
+    # Hero section
+    st.markdown("""
+        <div style='text-align: center; padding: 2rem 0; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+                    border-radius: 12px; margin-bottom: 2rem; color: white;'>
+            <h1 style='color: white; border: none; font-size: 3rem; margin: 0;'>🍽️ Food Rescue Platform</h1>
+            <p style='font-size: 1.2rem; margin-top: 1rem; opacity: 0.9;'>
+                Connect surplus-food providers to receivers • Reduce waste • Fight hunger
+            </p>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    # KPIs and charts are kept current from the change feed: each rerun only
+    # applies the rows logged since the last one instead of re-aggregating
+    live = st.toggle('🔴 Live updates', key='home_live', help='Refresh statistics as new listings and claims arrive')
+    if live:
+        st.fragment(render_home_stats, run_every=LIVE_REFRESH_SECONDS)()
+    else:
+        render_home_stats()
     
     # Listings table with filters
     st.markdown("---")
     st.markdown("### 🍕 Available Food Listings")
     
-    listings_query = """
-        SELECT f.*, p.city, p.name AS provider_name, p.contact AS provider_contact,
-               COALESCE(SUM(c.claimed_quantity), 0) as total_claimed,
-               (f.quantity - COALESCE(SUM(c.claimed_quantity), 0)) as available_quantity
-        FROM food_listings f 
-        JOIN providers p ON p.provider_id = f.provider_id
-        LEFT JOIN claims c ON f.food_id = c.food_id AND c.status != 'Cancelled'
-        GROUP BY f.food_id
-        HAVING available_quantity > 0
-    """
-    listings = run_query(listings_query)
+    # city/food_type/meal_type come back categorical, expiry_date as datetime64
+    listings = run_query(DASHBOARD_LISTINGS_QUERY)
     
     if not listings.empty:
         cities = sorted(listings['city'].dropna().unique())
@@ -670,226 +462,354 @@ def page_home():
         with c3:
             f_meal = st.multiselect('🍽️ Meal Type', meal_types, key='home_meal')
         
-        # Filter data
-        df = listings.copy()
+        # Filter with one combined mask (isin on categoricals compares codes)
+        mask = pd.Series(True, index=listings.index)
         if f_city:
-            df = df[df['city'].isin(f_city)]
+            mask &= listings['city'].isin(f_city)
         if f_food:
-            df = df[df['food_type'].isin(f_food)]
+            mask &= listings['food_type'].isin(f_food)
         if f_meal:
-            df = df[df['meal_type'].isin(f_meal)]
-        
-        # Replace the original quantity column with available quantity for display
-        df['Original_Quantity'] = df['quantity']
-        df['quantity'] = df['available_quantity'].astype(int)
+            mask &= listings['meal_type'].isin(f_meal)
         
-        # Select and reorder columns for better display
-        display_columns = ['food_id', 'food_name', 'quantity', 'expiry_date', 
-                          'provider_name', 'city', 'food_type', 'meal_type', 
-                          'location', 'provider_contact']
-        
-        # Only include columns that exist
-        display_columns = [col for col in display_columns if col in df.columns]
-        df_display = df[display_columns].copy()
+        # Reordered display columns, showing the available quantity in place of the original
+        df_display = listings_table(listings, mask)
         
         # Highlight near expiry
-        df_display['expiry_date'] = pd.to_datetime(df_display['expiry_date'])
-        today = pd.Timestamp.now().normalize()
+        expiring = near_expiry(df_display)
         
         def highlight(row):
-            if row['expiry_date'] <= today + pd.Timedelta(days=3):
-                return 'background-color: #ffd6d6'
-            return ''
+            return ['background-color: #ffd6d6' if expiring[row.name] else ''] * len(row)
         
         st.info("ℹ️ **Quantity shown is the AVAILABLE quantity** (Original quantity - Claimed quantity)")
-        st.dataframe(df_display.style.apply(lambda r: [highlight(r)] * len(r), axis=1), use_container_width=True)
+        st.dataframe(df_display.style.apply(highlight, axis=1), use_container_width=True)
     else:
         st.info('No food listings found')
+    
+    nearby = lazy_expander('📍 Listings near a receiver', key='home_nearby_expander')
+    with nearby:
+        if nearby.open:
+            render_nearby_listings()
 
-def page_manage_listings():
-    st.header('Manage Listings (CRUD)')
+def render_nearby_listings():
+    """Available listings within a radius of a receiver (or any gazetteer place), nearest first"""
+    receivers = RECEIVER_NAMES.load()
+    options = {'🔎 Another city / place': None}
+    options.update({f"{row['receiver_id']} - {row['name']}": row['receiver_id'] for _, row in receivers.iterrows()})
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        choice = st.selectbox('Near', list(options.keys()), index=min(1, len(options) - 1), key='nearby_origin')
+    with c2:
+        radius = st.slider('Within (km)', 1, int(MAX_RADIUS_KM), int(DEFAULT_RADIUS_KM), key='nearby_radius')
+    receiver_id = options[choice]
+    if receiver_id is None:
+        place = st.text_input('City or place', key='nearby_place')
+        if not place:
+            return
+        point = place_location(place)
+        if point is None:
+            st.warning(f'⚠️ "{place}" is not in the bundled gazetteer')
+            return
+    else:
+        point = receiver_location(int(receiver_id))
+        if point is None:
+            st.warning("⚠️ This receiver's city is not in the bundled gazetteer, so it has no location")
+            return
+    items = nearby_listings(*point, radius_km=radius)
+    if items:
+        st.caption(f'{len(items)} nearest available listings within {radius} km, then soonest expiry first')
+        table = pd.DataFrame(items)
+        table.insert(0, 'distance_km', table.pop('distance_km'))
+        st.dataframe(table, use_container_width=True, hide_index=True)
+    else:
+        st.info(f'No available listings within {radius} km')
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_published_snapshot(mtime):
+    # Keyed by file mtime: every session shares one parsed copy until the next publish
+    return read_snapshot()
+
+def render_snapshot_view():
+    try:
+        mtime = (SNAPSHOT_DIR / DATA_FILE).stat().st_mtime
+    except OSError:
+        st.info('No dashboard snapshot has been published yet')
+        return
+    data = load_published_snapshot(mtime)
+    if data is None:
+        st.info('No dashboard snapshot has been published yet')
+        return
+    counts = data['counts']
+    st.markdown("### 📊 Platform Statistics")
+    k1, k2, k3, k4, k5 = st.columns(5)
+    k1.metric('🏪 Providers', counts.get('providers', 0))
+    k2.metric('🏥 Receivers', counts.get('receivers', 0))
+    k3.metric('🍕 Listings', counts.get('listings', 0))
+    k4.metric('📋 Claims', counts.get('claims', 0))
+    k5.metric('✅ Completed', f"{data['pct_completed']:.1f}%")
     
-    providers = run_query("SELECT provider_id, name FROM providers ORDER BY name")
-    listings = run_query("SELECT * FROM food_listings")
+    st.markdown("---")
+    col1, col2 = st.columns(2)
+    for col, name, title in ((col1, 'status', '### 📈 Claims Status Distribution'),
+                             (col2, 'weekly', '### 📊 Weekly Claims Trend')):
+        with col:
+            st.markdown(title)
+            if data['figures'].get(name):
+                st.plotly_chart(data['figures'][name], use_container_width=True)
+            else:
+                st.info("No claims data available yet")
     
-    with st.expander('Add Listing', expanded=False):
-        if providers.empty:
-            st.warning('⚠️ No providers found. Please add providers first in the "Providers & Receivers" page.')
-        else:
-            next_id = get_next_id('food_listings', 'food_id')
-            with st.form('add_listing_form'):
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    food_id = st.number_input('Food_ID', step=1, min_value=1, value=next_id)
-                with col2:
-                    st.info(f'Next: {next_id}')
-                food_name = st.text_input('Food_Name')
-                quantity = st.number_input('Quantity', step=1, min_value=0)
-                expiry_date = st.date_input('Expiry_Date')
-                provider_choice = st.selectbox('Provider', providers['name'].tolist())
-                provider_id = int(providers.loc[providers['name'] == provider_choice, 'provider_id'].iloc[0])
-                provider_type = st.text_input('Provider_Type')
-                location = st.text_input('Location')
-                food_type = st.text_input('Food_Type')
-                meal_type = st.text_input('Meal_Type')
-                submitted = st.form_submit_button('Create')
-                if submitted:
-                    # Validation
-                    if not food_name or not food_name.strip():
-                        st.error('❌ Food name is required!')
-                    elif not provider_type or not provider_type.strip():
-                        st.error('❌ Provider type is required!')
-                    elif not location or not location.strip():
-                        st.error('❌ Location is required!')
-                    elif not food_type or not food_type.strip():
-                        st.error('❌ Food type is required!')
-                    elif not meal_type or not meal_type.strip():
-                        st.error('❌ Meal type is required!')
-                    else:
-                        try:
-                            execute_query('''
-                                INSERT INTO food_listings(food_id, food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            ''', (food_id, food_name.strip(), quantity, str(expiry_date), provider_id, provider_type.strip(), location.strip(), food_type.strip(), meal_type.strip()))
-                            log_audit('create_listing', f'food_id={food_id}')
-                            st.success('✅ Listing created successfully!')
-                            st.rerun()
-                        except Exception as e:
-                            if 'UNIQUE constraint failed' in str(e):
-                                st.error(f'❌ Food ID {food_id} already exists! Please use a different ID.')
-                            else:
-                                st.error(f'❌ Error creating listing: {str(e)}')
-    
-    with st.expander('Edit Listing'):
-        if not listings.empty:
-            picked_id = st.selectbox('Select Food_ID', listings['food_id'].tolist())
-            row = listings[listings['food_id'] == picked_id].iloc[0]
-            with st.form('edit_listing_form'):
-                food_name = st.text_input('Food_Name', row['food_name'])
-                quantity = st.number_input('Quantity', step=1, min_value=0, value=int(row['quantity']) if not pd.isna(row['quantity']) else 0)
-                expiry_date = st.date_input('Expiry_Date', pd.to_datetime(row['expiry_date']).date())
-                provider_id = st.number_input('Provider_ID', step=1, value=int(row['provider_id']))
-                provider_type = st.text_input('Provider_Type', row['provider_type'] or '')
-                location = st.text_input('Location', row['location'] or '')
-                food_type = st.text_input('Food_Type', row['food_type'] or '')
-                meal_type = st.text_input('Meal_Type', row['meal_type'] or '')
-                submitted = st.form_submit_button('Update')
-                if submitted:
-                    # Validation
-                    if not food_name or not food_name.strip():
-                        st.error('❌ Food name is required!')
-                    elif not provider_type or not provider_type.strip():
-                        st.error('❌ Provider type is required!')
-                    elif not location or not location.strip():
-                        st.error('❌ Location is required!')
-                    elif not food_type or not food_type.strip():
-                        st.error('❌ Food type is required!')
-                    elif not meal_type or not meal_type.strip():
-                        st.error('❌ Meal type is required!')
-                    else:
-                        try:
-                            execute_query('''
-                                UPDATE food_listings SET food_name=?, quantity=?, expiry_date=?, provider_id=?, provider_type=?, location=?, food_type=?, meal_type=? 
-                                WHERE food_id=?
-                            ''', (food_name.strip(), quantity, str(expiry_date), provider_id, provider_type.strip(), location.strip(), food_type.strip(), meal_type.strip(), picked_id))
-                            log_audit('update_listing', f'food_id={picked_id}')
-                            st.success('✅ Listing updated successfully!')
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f'❌ Error updating listing: {str(e)}')
-        else:
-            st.info('No listings to edit')
+    st.markdown("---")
+    st.markdown("### 🍕 Available Food Listings")
+    if data['listings']:
+        table = pd.DataFrame(data['listings'])
+        expiring = table.pop('near_expiry')
+        
+        def highlight(row):
+            return ['background-color: #ffd6d6' if expiring[row.name] else ''] * len(row)
+        
+        st.info(f"ℹ️ **Quantity shown is the AVAILABLE quantity.** Showing {len(table):,} of {data['listings_total']:,} listings, soonest expiry first.")
+        st.dataframe(table.style.apply(highlight, axis=1), use_container_width=True, hide_index=True)
+    else:
+        st.info('No food listings found')
+    st.caption(f"Snapshot generated {data['generated_at']} (data version {data['version']})")
+
+def page_snapshot():
+    """Public read-only dashboard drawn from the published snapshot; never opens the database"""
+    st.markdown("""
+        <div style='text-align: center; padding: 2rem 0; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+                    border-radius: 12px; margin-bottom: 2rem; color: white;'>
+            <h1 style='color: white; border: none; font-size: 3rem; margin: 0;'>🍽️ Food Rescue Platform</h1>
+            <p style='font-size: 1.2rem; margin-top: 1rem; opacity: 0.9;'>
+                Connect surplus-food providers to receivers • Reduce waste • Fight hunger
+            </p>
+        </div>
+    """, unsafe_allow_html=True)
+    st.fragment(render_snapshot_view, run_every=SNAPSHOT_REFRESH)()
+
+def on_demand(export, *args, **kwargs):
+    """download_button data that runs the export only when clicked and closes its spool"""
+    def data():
+        with export(*args, **kwargs) as spool:
+            return spool.read()
+    return data
+
+def bulk_upload_section(table, label):
+    """CSV upload for many rows at once: validated, ID-assigned and inserted in batches"""
+    with st.expander(f'📤 Bulk upload {label} (CSV)'):
+        columns = ', '.join(IMPORT_SCHEMAS[table])
+        st.caption(f'Columns: {columns}. Leave {PRIMARY_KEYS[table]} blank to have IDs assigned.')
+        uploaded = st.file_uploader('CSV file', type=['csv'], key=f'bulk_file_{table}')
+        if uploaded is not None and st.button(f'Import {label}', key=f'bulk_import_{table}', type='primary'):
+            total = max(1, uploaded.getvalue().count(b'\n') - 1)
+            bar = st.progress(0.0, text='Validating...')
+            try:
+                summary = bulk_import(table, uploaded, progress=lambda rows: bar.progress(min(rows / total, 1.0), text=f'{rows:,} / {total:,} rows processed'))
+            except Exception as e:
+                st.error(f'❌ Bulk upload failed: {str(e)}')
+                return
+            log_audit('bulk_upload', f"table={table}, loaded={summary['loaded']}, rejected={summary['rejected']}")
+            if summary['loaded']:
+                st.success(f"✅ {summary['loaded']:,} {label} imported (IDs {summary['first_id']}–{summary['last_id']})")
+            if summary['rejected']:
+                st.warning(f"⚠️ {summary['rejected']:,} rows rejected")
+                st.dataframe(pd.DataFrame(sorted(summary['reasons'].items(), key=lambda item: -item[1]), columns=['reason', 'rows']), use_container_width=True)
+                with open(summary['reject_file'], 'rb') as f:
+                    st.download_button('📥 Download rejected rows', data=f.read(), file_name=Path(summary['reject_file']).name, mime='text/csv', key=f'bulk_rejects_{table}')
+
+def text_value(value):
+    """Form default for a cell: NULLs (None, or NaN in typed frames) become an empty string"""
+    return '' if pd.isna(value) else str(value)
+
+def page_manage_listings():
+    st.header('Manage Listings (CRUD)')
     
-    with st.expander('Delete Listing'):
-        if not listings.empty:
-            del_id = st.selectbox('Select Food_ID to delete', listings['food_id'].tolist(), key='delete_listing_select')
-            st.warning('⚠️ This action cannot be undone!')
-            if st.button('Confirm Delete', type='primary'):
-                try:
-                    execute_query('DELETE FROM food_listings WHERE food_id=?', (del_id,))
-                    log_audit('delete_listing', f'food_id={del_id}')
-                    st.success('✅ Listing deleted successfully!')
-                    st.rerun()
-                except Exception as e:
-                    st.error(f'❌ Error deleting listing: {str(e)}')
-        else:
-            st.info('No listings to delete')
+    add_listing = lazy_expander('Add Listing', key='add_listing_expander')
+    with add_listing:
+        if add_listing.open:
+            providers = PROVIDER_NAMES.load()
+            if providers.empty:
+                st.warning('⚠️ No providers found. Please add providers first in the "Providers & Receivers" page.')
+            else:
+                next_id = get_next_id('food_listings', 'food_id')
+                with st.form('add_listing_form'):
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        food_id = st.number_input('Food_ID', step=1, min_value=1, value=next_id)
+                    with col2:
+                        st.info(f'Next: {next_id}')
+                    food_name = st.text_input('Food_Name')
+                    quantity = st.number_input('Quantity', step=1, min_value=0)
+                    expiry_date = st.date_input('Expiry_Date')
+                    provider_choice = st.selectbox('Provider', providers['name'].tolist())
+                    provider_id = int(providers.loc[providers['name'] == provider_choice, 'provider_id'].iloc[0])
+                    provider_type = st.text_input('Provider_Type')
+                    location = st.text_input('Location')
+                    food_type = st.text_input('Food_Type')
+                    meal_type = st.text_input('Meal_Type')
+                    submitted = st.form_submit_button('Create')
+                    if submitted:
+                        # Validation
+                        if not food_name or not food_name.strip():
+                            st.error('❌ Food name is required!')
+                        elif not provider_type or not provider_type.strip():
+                            st.error('❌ Provider type is required!')
+                        elif not location or not location.strip():
+                            st.error('❌ Location is required!')
+                        elif not food_type or not food_type.strip():
+                            st.error('❌ Food type is required!')
+                        elif not meal_type or not meal_type.strip():
+                            st.error('❌ Meal type is required!')
+                        else:
+                            try:
+                                execute_query('''
+                                    INSERT INTO food_listings(food_id, food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                ''', (food_id, food_name.strip(), quantity, str(expiry_date), provider_id, provider_type.strip(), location.strip(), food_type.strip(), meal_type.strip()))
+                                log_audit('create_listing', f'food_id={food_id}')
+                                st.success('✅ Listing created successfully!')
+                                st.rerun()
+                            except Exception as e:
+                                if 'UNIQUE constraint failed' in str(e):
+                                    st.error(f'❌ Food ID {food_id} already exists! Please use a different ID.')
+                                else:
+                                    st.error(f'❌ Error creating listing: {str(e)}')
+    
+    bulk_upload_section('food_listings', 'listings')
+    
+    edit_listing = lazy_expander('Edit Listing', key='edit_listing_expander')
+    with edit_listing:
+        if edit_listing.open:
+            listings = LISTINGS.load()
+            if not listings.empty:
+                picked_id = st.selectbox('Select Food_ID', listings['food_id'].tolist())
+                row = listings[listings['food_id'] == picked_id].iloc[0]
+                with st.form('edit_listing_form'):
+                    food_name = st.text_input('Food_Name', text_value(row['food_name']))
+                    quantity = st.number_input('Quantity', step=1, min_value=0, value=int(row['quantity']) if not pd.isna(row['quantity']) else 0)
+                    expiry_date = st.date_input('Expiry_Date', pd.to_datetime(row['expiry_date']).date())
+                    provider_id = st.number_input('Provider_ID', step=1, value=int(row['provider_id']))
+                    provider_type = st.text_input('Provider_Type', text_value(row['provider_type']))
+                    location = st.text_input('Location', text_value(row['location']))
+                    food_type = st.text_input('Food_Type', text_value(row['food_type']))
+                    meal_type = st.text_input('Meal_Type', text_value(row['meal_type']))
+                    submitted = st.form_submit_button('Update')
+                    if submitted:
+                        # Validation
+                        if not food_name or not food_name.strip():
+                            st.error('❌ Food name is required!')
+                        elif not provider_type or not provider_type.strip():
+                            st.error('❌ Provider type is required!')
+                        elif not location or not location.strip():
+                            st.error('❌ Location is required!')
+                        elif not food_type or not food_type.strip():
+                            st.error('❌ Food type is required!')
+                        elif not meal_type or not meal_type.strip():
+                            st.error('❌ Meal type is required!')
+                        else:
+                            try:
+                                execute_query('''
+                                    UPDATE food_listings SET food_name=?, quantity=?, expiry_date=?, provider_id=?, provider_type=?, location=?, food_type=?, meal_type=? 
+                                    WHERE food_id=?
+                                ''', (food_name.strip(), quantity, str(expiry_date), provider_id, provider_type.strip(), location.strip(), food_type.strip(), meal_type.strip(), picked_id))
+                                log_audit('update_listing', f'food_id={picked_id}')
+                                st.success('✅ Listing updated successfully!')
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f'❌ Error updating listing: {str(e)}')
+            else:
+                st.info('No listings to edit')
+    
+    delete_listing = lazy_expander('Delete Listing', key='delete_listing_expander')
+    with delete_listing:
+        if delete_listing.open:
+            listings = LISTINGS.load()
+            if not listings.empty:
+                del_id = st.selectbox('Select Food_ID to delete', listings['food_id'].tolist(), key='delete_listing_select')
+                st.warning('⚠️ This action cannot be undone!')
+                if st.button('Confirm Delete', type='primary'):
+                    try:
+                        execute_query('DELETE FROM food_listings WHERE food_id=?', (del_id,))
+                        log_audit('delete_listing', f'food_id={del_id}')
+                        st.success('✅ Listing deleted successfully!')
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f'❌ Error deleting listing: {str(e)}')
+            else:
+                st.info('No listings to delete')
 
 def page_manage_claims():
     st.header('Manage Claims (CRUD)')
     
-    # Get food listings with available quantities
-    foods = run_query("""
-        SELECT f.food_id, f.food_name, f.quantity, f.provider_id,
-               COALESCE(SUM(c.claimed_quantity), 0) as total_claimed,
-               (f.quantity - COALESCE(SUM(c.claimed_quantity), 0)) as available_quantity
-        FROM food_listings f
-        LEFT JOIN claims c ON f.food_id = c.food_id AND c.status != 'Cancelled'
-        GROUP BY f.food_id
-        HAVING available_quantity > 0
-    """)
-    receivers = run_query("SELECT receiver_id, name FROM receivers")
-    claims = run_query("SELECT * FROM claims")
-    
-    with st.expander('Add Claim'):
-        if foods.empty:
-            st.warning('⚠️ No food listings found. Please add food listings first in the "Manage Listings" page.')
-        elif receivers.empty:
-            st.warning('⚠️ No receivers found. Please add receivers first in the "Providers & Receivers" page.')
-        else:
-            next_id = get_next_id('claims', 'claim_id')
+    # Shown in the table below on every render
+    claims = CLAIMS.load()
+    
+    add_claim = lazy_expander('Add Claim', key='add_claim_expander')
+    with add_claim:
+        if add_claim.open:
+            foods = AVAILABLE_FOODS.load((time.strftime('%Y-%m-%d', time.gmtime()),))
+            receivers = RECEIVER_NAMES.load()
+            if foods.empty:
+                st.warning('⚠️ No food listings found. Please add food listings first in the "Manage Listings" page.')
+            elif receivers.empty:
+                st.warning('⚠️ No receivers found. Please add receivers first in the "Providers & Receivers" page.')
+            else:
+                next_id = get_next_id('claims', 'claim_id')
             
-            # Create food options with IDs and available quantities
-            food_options_dict = {f"{row['food_id']} - {row['food_name']} (Available: {int(row['available_quantity'])})": {
-                'food_id': row['food_id'],
-                'available_quantity': int(row['available_quantity'])
-            } for _, row in foods.iterrows()}
+                # Create food options with IDs and available quantities
+                food_options_dict = {f"{row['food_id']} - {row['food_name']} (Available: {int(row['available_quantity'])})": {
+                    'food_id': row['food_id'],
+                    'available_quantity': int(row['available_quantity'])
+                } for _, row in foods.iterrows()}
             
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                claim_id = st.number_input('Claim_ID', step=1, min_value=1, value=next_id, key='claim_id_input')
-            with col2:
-                st.info(f'Next: {next_id}')
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    claim_id = st.number_input('Claim_ID', step=1, min_value=1, value=next_id, key='claim_id_input')
+                with col2:
+                    st.info(f'Next: {next_id}')
             
-            food_choice = st.selectbox('Food ID - Food Name (Available Quantity)', list(food_options_dict.keys()), key='food_select')
-            selected_food_data = food_options_dict[food_choice]
-            selected_food_id = selected_food_data['food_id']
-            max_quantity = selected_food_data['available_quantity']
+                food_choice = st.selectbox('Food ID - Food Name (Available Quantity)', list(food_options_dict.keys()), key='food_select')
+                selected_food_data = food_options_dict[food_choice]
+                selected_food_id = selected_food_data['food_id']
+                max_quantity = selected_food_data['available_quantity']
             
-            # Quantity selector with dynamic max based on selection
-            claimed_quantity = st.number_input(
-                f'Quantity to Claim (Max: {max_quantity})', 
-                min_value=1, 
-                max_value=max_quantity, 
-                value=1,
-                step=1,
-                key='quantity_input'
-            )
+                # Quantity selector with dynamic max based on selection
+                claimed_quantity = st.number_input(
+                    f'Quantity to Claim (Max: {max_quantity})', 
+                    min_value=1, 
+                    max_value=max_quantity, 
+                    value=1,
+                    step=1,
+                    key='quantity_input'
+                )
             
-            # Create receiver options with IDs
-            receiver_options = {f"{row['receiver_id']} - {row['name']}": row['receiver_id'] for _, row in receivers.iterrows()}
-            recv_choice = st.selectbox('Receiver', list(receiver_options.keys()), key='receiver_select')
-            selected_receiver_id = receiver_options[recv_choice]
+                # Create receiver options with IDs
+                receiver_options = {f"{row['receiver_id']} - {row['name']}": row['receiver_id'] for _, row in receivers.iterrows()}
+                recv_choice = st.selectbox('Receiver', list(receiver_options.keys()), key='receiver_select')
+                selected_receiver_id = receiver_options[recv_choice]
             
-            status = st.selectbox('Status', ['Pending', 'Completed', 'Cancelled'], index=0, key='status_select')
+                status = st.selectbox('Status', ['Pending', 'Completed', 'Cancelled'], index=0, key='status_select')
             
-            if st.button('Create Claim', type='primary'):
-                try:
-                    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    execute_query('''
-                        INSERT INTO claims(claim_id, food_id, receiver_id, claimed_quantity, status, timestamp)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (claim_id, selected_food_id, selected_receiver_id, claimed_quantity, status, ts))
-                    log_audit('create_claim', f'claim_id={claim_id}, food_id={selected_food_id}, receiver_id={selected_receiver_id}, quantity={claimed_quantity}')
-                    st.success(f'✅ Claim created successfully! Food ID: {selected_food_id}, Receiver ID: {selected_receiver_id}, Quantity: {claimed_quantity}')
-                    st.rerun()
-                except Exception as e:
-                    if 'UNIQUE constraint failed' in str(e):
-                        st.error(f'❌ Claim ID {claim_id} already exists! Please use a different ID.')
-                    elif 'FOREIGN KEY constraint failed' in str(e):
-                        st.error(f'❌ Invalid Food ID ({selected_food_id}) or Receiver ID ({selected_receiver_id}). Please check your selection.')
-                    else:
-                        st.error(f'❌ Error creating claim: {str(e)}')
+                if st.button('Create Claim', type='primary'):
+                    try:
+                        ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                        with CLAIM_SECONDS.time(source='app'):
+                            execute_query('''
+                                INSERT INTO claims(claim_id, food_id, receiver_id, claimed_quantity, status, timestamp)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                            ''', (claim_id, selected_food_id, selected_receiver_id, claimed_quantity, status, ts))
+                        CLAIMS_CREATED.inc(source='app')
+                        log_audit('create_claim', f'claim_id={claim_id}, food_id={selected_food_id}, receiver_id={selected_receiver_id}, quantity={claimed_quantity}')
+                        st.success(f'✅ Claim created successfully! Food ID: {selected_food_id}, Receiver ID: {selected_receiver_id}, Quantity: {claimed_quantity}')
+                        st.rerun()
+                    except Exception as e:
+                        if 'UNIQUE constraint failed' in str(e):
+                            st.error(f'❌ Claim ID {claim_id} already exists! Please use a different ID.')
+                        elif 'FOREIGN KEY constraint failed' in str(e):
+                            st.error(f'❌ Invalid Food ID ({selected_food_id}) or Receiver ID ({selected_receiver_id}). Please check your selection.')
+                        else:
+                            st.error(f'❌ Error creating claim: {str(e)}')
+    
+    bulk_upload_section('claims', 'claims')
     
     with st.expander('Update Claim Status'):
         if not claims.empty:
@@ -910,271 +830,306 @@ def page_manage_claims():
     st.subheader('View Claims')
     st.dataframe(claims, use_container_width=True)
 
+def other_region(city):
+    """True when the database is split and `city` is owned by a region this process doesn't serve"""
+    return REGION is not None and bool(city and city.strip()) and region_for_city(city.strip()) != REGION
+
 def page_providers_receivers():
     st.header('Providers & Receivers')
-    tab1, tab2 = st.tabs(['Providers', 'Receivers'])
-    
-    providers = run_query("SELECT * FROM providers")
-    receivers = run_query("SELECT * FROM receivers")
+    tab1, tab2 = lazy_tabs(['Providers', 'Receivers'], key='providers_receivers_tab')
     
     with tab1:
-        st.dataframe(providers, use_container_width=True)
+        if tab1.open:
+            providers = PROVIDERS.load()
+            st.dataframe(providers, use_container_width=True)
         
-        if not providers.empty:
-            st.download_button('Export provider contact CSV', data=providers[['name','city','contact']].to_csv(index=False), file_name='providers_contacts.csv', mime='text/csv')
+            if not providers.empty:
+                st.download_button('Export provider contact CSV', data=on_demand(export_query, "SELECT name, city, contact FROM providers", fmt='csv'), file_name='providers_contacts.csv', mime='text/csv', on_click='ignore')
         
-        with st.expander('Add / Edit / Delete Provider'):
-            next_provider_id = get_next_id('providers', 'provider_id')
-            with st.form('provider_form'):
-                mode = st.selectbox('Action', ['Add','Edit','Delete'])
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    provider_id = st.number_input('Provider_ID', step=1, value=next_provider_id if mode == 'Add' else 1)
-                with col2:
-                    if mode == 'Add':
-                        st.info(f'Next: {next_provider_id}')
-                name = st.text_input('Name')
-                type_ = st.text_input('Type')
-                address = st.text_input('Address')
-                city = st.text_input('City')
-                contact = st.text_input('Contact')
-                submitted = st.form_submit_button('Submit')
-                if submitted:
-                    try:
-                        if mode == 'Add':
-                            if not name or not name.strip():
-                                st.error('❌ Provider name is required!')
-                            elif not contact or not contact.strip():
-                                st.error('❌ Contact is required!')
-                            else:
-                                try:
-                                    execute_query('''
-                                        INSERT INTO providers(provider_id,name,type,address,city,contact)
-                                        VALUES (?, ?, ?, ?, ?, ?)
-                                    ''', (provider_id, name.strip(), type_.strip() if type_ else '', address.strip() if address else '', city.strip() if city else '', contact.strip()))
-                                    log_audit('create_provider', f'provider_id={provider_id}')
-                                    st.success('✅ Provider added successfully!')
-                                    st.rerun()
-                                except Exception as add_error:
-                                    if 'UNIQUE constraint failed' in str(add_error):
-                                        st.error(f'❌ Provider ID {provider_id} already exists! Please use a different ID.')
+            provider_editor = lazy_expander('Add / Edit / Delete Provider', key='provider_editor_expander')
+            with provider_editor:
+                if provider_editor.open:
+                    next_provider_id = get_next_id('providers', 'provider_id')
+                    with st.form('provider_form'):
+                        mode = st.selectbox('Action', ['Add','Edit','Delete'])
+                        col1, col2 = st.columns([3, 1])
+                        with col1:
+                            provider_id = st.number_input('Provider_ID', step=1, value=next_provider_id if mode == 'Add' else 1)
+                        with col2:
+                            if mode == 'Add':
+                                st.info(f'Next: {next_provider_id}')
+                        name = st.text_input('Name')
+                        type_ = st.text_input('Type')
+                        address = st.text_input('Address')
+                        city = st.text_input('City')
+                        contact = st.text_input('Contact')
+                        submitted = st.form_submit_button('Submit')
+                        if submitted:
+                            try:
+                                if mode == 'Add':
+                                    if not name or not name.strip():
+                                        st.error('❌ Provider name is required!')
+                                    elif not contact or not contact.strip():
+                                        st.error('❌ Contact is required!')
                                     else:
-                                        raise add_error
-                        elif mode == 'Edit':
-                            if not name or not name.strip():
-                                st.error('❌ Provider name is required!')
-                            elif not contact or not contact.strip():
-                                st.error('❌ Contact is required!')
-                            else:
-                                execute_query('''
-                                    UPDATE providers SET name=?, type=?, address=?, city=?, contact=?
-                                    WHERE provider_id=?
-                                ''', (name.strip(), type_.strip() if type_ else '', address.strip() if address else '', city.strip() if city else '', contact.strip(), provider_id))
-                                log_audit('update_provider', f'provider_id={provider_id}')
-                                st.success('✅ Provider updated successfully!')
-                                st.rerun()
-                        else:
-                            execute_query('DELETE FROM providers WHERE provider_id=?', (provider_id,))
-                            log_audit('delete_provider', f'provider_id={provider_id}')
-                            st.success('✅ Provider deleted successfully!')
-                            st.rerun()
-                    except Exception as e:
-                        st.error(f'❌ Error: {str(e)}')
+                                        try:
+                                            execute_query('''
+                                                INSERT INTO providers(provider_id,name,type,address,city,contact)
+                                                VALUES (?, ?, ?, ?, ?, ?)
+                                            ''', (provider_id, name.strip(), type_.strip() if type_ else '', address.strip() if address else '', city.strip() if city else '', contact.strip()), city=city.strip() if city else None)
+                                            log_audit('create_provider', f'provider_id={provider_id}')
+                                            st.success('✅ Provider added successfully!')
+                                            st.rerun()
+                                        except Exception as add_error:
+                                            if 'UNIQUE constraint failed' in str(add_error):
+                                                st.error(f'❌ Provider ID {provider_id} already exists! Please use a different ID.')
+                                            else:
+                                                raise add_error
+                                elif mode == 'Edit':
+                                    if not name or not name.strip():
+                                        st.error('❌ Provider name is required!')
+                                    elif not contact or not contact.strip():
+                                        st.error('❌ Contact is required!')
+                                    elif other_region(city):
+                                        st.error(f'❌ {city.strip()} belongs to region {region_for_city(city.strip())}; move the city with sharding.py rebalance instead')
+                                    else:
+                                        execute_query('''
+                                            UPDATE providers SET name=?, type=?, address=?, city=?, contact=?
+                                            WHERE provider_id=?
+                                        ''', (name.strip(), type_.strip() if type_ else '', address.strip() if address else '', city.strip() if city else '', contact.strip(), provider_id))
+                                        log_audit('update_provider', f'provider_id={provider_id}')
+                                        st.success('✅ Provider updated successfully!')
+                                        st.rerun()
+                                else:
+                                    execute_query('DELETE FROM providers WHERE provider_id=?', (provider_id,))
+                                    log_audit('delete_provider', f'provider_id={provider_id}')
+                                    st.success('✅ Provider deleted successfully!')
+                                    st.rerun()
+                            except Exception as e:
+                                st.error(f'❌ Error: {str(e)}')
+    
+            bulk_upload_section('providers', 'providers')
     
     with tab2:
-        st.dataframe(receivers, use_container_width=True)
-        with st.expander('Add / Edit / Delete Receiver'):
-            next_receiver_id = get_next_id('receivers', 'receiver_id')
-            with st.form('receiver_form'):
-                mode = st.selectbox('Action', ['Add','Edit','Delete'])
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    receiver_id = st.number_input('Receiver_ID', step=1, value=next_receiver_id if mode == 'Add' else 1)
-                with col2:
-                    if mode == 'Add':
-                        st.info(f'Next: {next_receiver_id}')
-                name = st.text_input('Name', key='r_name')
-                type_ = st.text_input('Type', key='r_type')
-                city = st.text_input('City', key='r_city')
-                contact = st.text_input('Contact', key='r_contact')
-                submitted = st.form_submit_button('Submit', type='primary')
-                if submitted:
-                    try:
-                        if mode == 'Add':
-                            if not name or not name.strip():
-                                st.error('❌ Receiver name is required!')
-                            elif not contact or not contact.strip():
-                                st.error('❌ Contact is required!')
-                            else:
-                                try:
-                                    execute_query('''
-                                        INSERT INTO receivers(receiver_id,name,type,city,contact)
-                                        VALUES (?, ?, ?, ?, ?)
-                                    ''', (receiver_id, name.strip(), type_.strip() if type_ else '', city.strip() if city else '', contact.strip()))
-                                    log_audit('create_receiver', f'receiver_id={receiver_id}')
-                                    st.success('✅ Receiver added successfully!')
-                                    st.rerun()
-                                except Exception as add_error:
-                                    if 'UNIQUE constraint failed' in str(add_error):
-                                        st.error(f'❌ Receiver ID {receiver_id} already exists! Please use a different ID.')
+        if tab2.open:
+            receivers = RECEIVERS.load()
+            st.dataframe(receivers, use_container_width=True)
+            receiver_editor = lazy_expander('Add / Edit / Delete Receiver', key='receiver_editor_expander')
+            with receiver_editor:
+                if receiver_editor.open:
+                    next_receiver_id = get_next_id('receivers', 'receiver_id')
+                    with st.form('receiver_form'):
+                        mode = st.selectbox('Action', ['Add','Edit','Delete'])
+                        col1, col2 = st.columns([3, 1])
+                        with col1:
+                            receiver_id = st.number_input('Receiver_ID', step=1, value=next_receiver_id if mode == 'Add' else 1)
+                        with col2:
+                            if mode == 'Add':
+                                st.info(f'Next: {next_receiver_id}')
+                        name = st.text_input('Name', key='r_name')
+                        type_ = st.text_input('Type', key='r_type')
+                        city = st.text_input('City', key='r_city')
+                        contact = st.text_input('Contact', key='r_contact')
+                        submitted = st.form_submit_button('Submit', type='primary')
+                        if submitted:
+                            try:
+                                if mode == 'Add':
+                                    if not name or not name.strip():
+                                        st.error('❌ Receiver name is required!')
+                                    elif not contact or not contact.strip():
+                                        st.error('❌ Contact is required!')
                                     else:
-                                        raise add_error
-                        elif mode == 'Edit':
-                            if not name or not name.strip():
-                                st.error('❌ Receiver name is required!')
-                            elif not contact or not contact.strip():
-                                st.error('❌ Contact is required!')
-                            else:
-                                execute_query('''
-                                    UPDATE receivers SET name=?, type=?, city=?, contact=?
-                                    WHERE receiver_id=?
-                                ''', (name.strip(), type_.strip() if type_ else '', city.strip() if city else '', contact.strip(), receiver_id))
-                                log_audit('update_receiver', f'receiver_id={receiver_id}')
-                                st.success('✅ Receiver updated successfully!')
-                                st.rerun()
-                        else:
-                            execute_query('DELETE FROM receivers WHERE receiver_id=?', (receiver_id,))
-                            log_audit('delete_receiver', f'receiver_id={receiver_id}')
-                            st.success('✅ Receiver deleted successfully!')
-                            st.rerun()
-                    except Exception as e:
-                        st.error(f'❌ Error: {str(e)}')
+                                        try:
+                                            execute_query('''
+                                                INSERT INTO receivers(receiver_id,name,type,city,contact)
+                                                VALUES (?, ?, ?, ?, ?)
+                                            ''', (receiver_id, name.strip(), type_.strip() if type_ else '', city.strip() if city else '', contact.strip()), city=city.strip() if city else None)
+                                            log_audit('create_receiver', f'receiver_id={receiver_id}')
+                                            st.success('✅ Receiver added successfully!')
+                                            st.rerun()
+                                        except Exception as add_error:
+                                            if 'UNIQUE constraint failed' in str(add_error):
+                                                st.error(f'❌ Receiver ID {receiver_id} already exists! Please use a different ID.')
+                                            else:
+                                                raise add_error
+                                elif mode == 'Edit':
+                                    if not name or not name.strip():
+                                        st.error('❌ Receiver name is required!')
+                                    elif not contact or not contact.strip():
+                                        st.error('❌ Contact is required!')
+                                    elif other_region(city):
+                                        st.error(f'❌ {city.strip()} belongs to region {region_for_city(city.strip())}; move the city with sharding.py rebalance instead')
+                                    else:
+                                        execute_query('''
+                                            UPDATE receivers SET name=?, type=?, city=?, contact=?
+                                            WHERE receiver_id=?
+                                        ''', (name.strip(), type_.strip() if type_ else '', city.strip() if city else '', contact.strip(), receiver_id))
+                                        log_audit('update_receiver', f'receiver_id={receiver_id}')
+                                        st.success('✅ Receiver updated successfully!')
+                                        st.rerun()
+                                else:
+                                    execute_query('DELETE FROM receivers WHERE receiver_id=?', (receiver_id,))
+                                    log_audit('delete_receiver', f'receiver_id={receiver_id}')
+                                    st.success('✅ Receiver deleted successfully!')
+                                    st.rerun()
+                            except Exception as e:
+                                st.error(f'❌ Error: {str(e)}')
+        
+            bulk_upload_section('receivers', 'receivers')
 
 def page_sql_queries():
     st.header('SQL Queries & Analysis (Required)')
     
-    queries = {
-        'Providers and receivers per city': '''
-            SELECT city, 
-                   SUM(CASE WHEN src='provider' THEN cnt ELSE 0 END) AS providers,
-                   SUM(CASE WHEN src='receiver' THEN cnt ELSE 0 END) AS receivers
-            FROM (
-                SELECT city, COUNT(*) AS cnt, 'provider' AS src FROM providers GROUP BY city
-                UNION ALL
-                SELECT city, COUNT(*) AS cnt, 'receiver' AS src FROM receivers GROUP BY city
-            ) t
-            GROUP BY city
-            ORDER BY city
-        ''',
-        'Top provider type': '''
-            SELECT provider_type, COUNT(*) AS listings_count
-            FROM food_listings
-            GROUP BY provider_type
-            ORDER BY listings_count DESC
-            LIMIT 1
-        ''',
-        'Provider contacts in city': '''
-            SELECT name, contact FROM providers WHERE city = ?
-            ORDER BY name
-        ''',
-        'Top receivers by claims': '''
-            SELECT r.receiver_id, r.name, COUNT(*) AS claims_count
-            FROM claims c
-            JOIN receivers r ON r.receiver_id = c.receiver_id
-            GROUP BY r.receiver_id, r.name
-            ORDER BY claims_count DESC
-        ''',
-        'Total quantity available': '''
-            SELECT SUM(quantity) AS total_quantity FROM food_listings
-        ''',
-        'City with most listings': '''
-            SELECT p.city, COUNT(*) AS listings_count
-            FROM food_listings f
-            JOIN providers p ON p.provider_id = f.provider_id
-            GROUP BY p.city
-            ORDER BY listings_count DESC
-            LIMIT 1
-        ''',
-        'Most common food types': '''
-            SELECT food_type, COUNT(*) AS cnt
-            FROM food_listings
-            GROUP BY food_type
-            ORDER BY cnt DESC
-            LIMIT 5
-        ''',
-        'Claims per food item': '''
-            SELECT f.food_id, f.food_name, COUNT(c.claim_id) AS claims_count
-            FROM food_listings f
-            LEFT JOIN claims c ON c.food_id = f.food_id
-            GROUP BY f.food_id, f.food_name
-            ORDER BY claims_count DESC
-        ''',
-        'Claims status distribution': '''
-            SELECT status, COUNT(*) AS cnt,
-                   ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM claims), 2) AS pct
-            FROM claims
-            GROUP BY status
-        ''',
-        'Food listings near expiry (<=3 days)': '''
-            SELECT *
-            FROM food_listings
-            WHERE expiry_date <= date('now','+3 day')
-            ORDER BY expiry_date ASC
-        ''',
-        'Claims per week (time-series)': '''
-            SELECT strftime('%Y-W%W', timestamp) AS iso_week, COUNT(*) AS claims
-            FROM claims
-            GROUP BY iso_week
-            ORDER BY iso_week
-        '''
-    }
-    
-    for label, sql in queries.items():
+    engines = available_engines()
+    engine = ANALYTICS_ENGINE if ANALYTICS_ENGINE in engines else 'sqlite'
+    if len(engines) > 1:
+        engine = st.radio('Analytics engine', engines, index=engines.index(engine), horizontal=True, key='analytics_engine')
+    
+    for label, sql in REPORT_QUERIES.items():
         st.subheader(label)
         with st.expander('SQL', expanded=False):
             st.code(sql, language='sql')
         
         params = {}
-        if label == 'Provider contacts in city':
-            cities = run_query("SELECT DISTINCT city FROM providers WHERE city IS NOT NULL")['city'].dropna().tolist()
+        if label in REPORT_PARAMS:
+            cities = REPORT_PARAM_FRAMES[label].load()['city'].dropna().tolist()
             if cities:
                 city = st.selectbox('City', cities, key=f'city_{label}')
                 params = (city,)
         
         if st.button(f'Run: {label}'):
             try:
-                df = run_query(sql, params)
+                df = run_report(label, params, engine=engine)
                 st.dataframe(df, use_container_width=True)
-                st.download_button('Export result CSV', data=df.to_csv(index=False), file_name=f'{label.replace(" ","_")}.csv', mime='text/csv')
+                st.download_button('Export result CSV', data=on_demand(export_query, sql, params, fmt='csv'), file_name=f'{label.replace(" ","_")}.csv', mime='text/csv', on_click='ignore')
             except Exception as e:
                 st.error(f'Error running query: {str(e)}')
+    
+    st.markdown("---")
+    render_sql_console()
+
+def console_run(sql, key, after=None):
+    st.session_state['console_request'] = (sql, key)
+    st.session_state['console_pages'] = [after]
+
+def console_page(after):
+    pages = st.session_state.setdefault('console_pages', [None])
+    if after is None:
+        if len(pages) > 1:
+            pages.pop()
+    else:
+        pages.append(after)
+
+def console_cancel():
+    st.session_state.pop('console_request', None)
+
+def console_show(history, index):
+    query = list(history.entries.values())[index]
+    st.session_state['console_sql'] = query.sql
+    st.session_state['console_key'] = query.key or ''
+    console_run(query.sql, query.key, query.after)
+
+def render_sql_console():
+    st.subheader('🧪 Ad-hoc SQL Console')
+    st.caption(f'Read-only SELECT queries, stopped after {CONSOLE_TIMEOUT:g}s, {CONSOLE_PAGE_ROWS} rows per page. '
+               'Name a unique column (e.g. claim_id) to page through larger results.')
+    history = st.session_state.setdefault('console_history', QueryHistory())
+    sql = st.text_area('SQL', key='console_sql', height=120,
+                       placeholder='SELECT city, COUNT(*) AS providers FROM providers GROUP BY city')
+    key = st.text_input('Page by column', key='console_key').strip() or None
+    c1, c2 = st.columns(2)
+    c1.button('▶️ Run query', key='console_run', on_click=console_run, args=(sql, key))
+    # Any rerun stops the running query; this one also forgets it
+    c2.button('⏹️ Cancel', key='console_cancel', on_click=console_cancel)
+    
+    request = st.session_state.get('console_request')
+    if request:
+        sql, key = request
+        pages = st.session_state.setdefault('console_pages', [None])
+        query = history.get(sql, key, pages[-1])
+        if query is None:
+            query = ConsoleQuery(sql, key, pages[-1])
+            if query.start():
+                progress = st.empty()
+                try:
+                    while not query.wait(0.2):
+                        progress.caption(f'⏳ Running for {time.monotonic() - query.started:.1f}s...')
+                finally:
+                    query.cancel()
+                progress.empty()
+                history.add(query)
+            if query.status != 'ok':
+                # Show the failure once instead of retrying it on every rerun
+                st.session_state.pop('console_request', None)
+        if query.status == 'ok':
+            st.caption(f'Page {len(pages)} · {len(query.frame)} rows · {query.elapsed:.3f}s')
+            st.dataframe(query.frame, use_container_width=True)
+            p1, p2 = st.columns(2)
+            p1.button('◀️ Previous page', key='console_prev', on_click=console_page, args=(None,),
+                      disabled=len(pages) == 1)
+            p2.button('Next page ▶️', key='console_next', on_click=console_page, args=(query.next_after,),
+                      disabled=query.next_after is None)
+            if query.has_more and query.key is None:
+                st.info(f'Showing the first {CONSOLE_PAGE_ROWS} rows; set a page-by column to see more.')
+        elif query.status == 'cancelled':
+            st.info('⏹️ Query cancelled')
+        else:
+            st.error(f'❌ {query.error}')
+    
+    if history.entries:
+        with lazy_expander('🕘 Query history', key='console_history_expander') as expander:
+            if expander.open:
+                st.dataframe(pd.DataFrame(history.rows()), use_container_width=True)
+                index = st.selectbox('Query', range(len(history.entries)), key='console_history_pick',
+                                     format_func=lambda i: history.rows()[i]['sql'][:80])
+                st.button('↩️ Show result', key='console_history_show', on_click=console_show, args=(history, index))
 
 def page_eda():
     st.header('EDA / Insights')
     
     # City trends
-    city_counts = run_query('''
-        SELECT p.city, COUNT(*) as listings
-        FROM food_listings f 
-        JOIN providers p ON p.provider_id = f.provider_id
-        GROUP BY p.city
-    ''')
-    if not city_counts.empty:
-        st.plotly_chart(px.bar(city_counts, x='city', y='listings', title='Listings by City'), use_container_width=True)
+    city_fig = cached_figure('eda_city_bar', LISTING_TABLES, lambda: report_bar('Listings by City', 'city', 'listings'),
+                             spec=(ANALYTICS_ENGINE, MAX_CHART_POINTS))
+    if city_fig is not None:
+        st.plotly_chart(city_fig, use_container_width=True)
     
     # Meal type demand
-    meal_counts = run_query('''
-        SELECT meal_type, COUNT(*) as count
-        FROM food_listings 
-        GROUP BY meal_type 
-        ORDER BY count DESC
-    ''')
-    if not meal_counts.empty:
-        st.plotly_chart(px.bar(meal_counts, x='meal_type', y='count', title='Listings by Meal Type'), use_container_width=True)
+    meal_fig = cached_figure('eda_meal_bar', LISTING_TABLES, lambda: report_bar('Listings by Meal Type', 'meal_type', 'count'),
+                             spec=(ANALYTICS_ENGINE, MAX_CHART_POINTS))
+    if meal_fig is not None:
+        st.plotly_chart(meal_fig, use_container_width=True)
     
     # Expiry risk
-    near = run_query('''
-        SELECT *
-        FROM food_listings
-        WHERE expiry_date <= date('now','+3 day')
-        ORDER BY expiry_date ASC
-    ''')
+    near = run_report('Listings near expiry')
     st.write('Listings near expiry (<=3 days):')
     if not near.empty:
         st.dataframe(near, use_container_width=True)
     else:
         st.info('No listings near expiry')
 
+def duplicate_check(entity, name, city, contact, register_anyway):
+    """Show likely existing registrations; returns True if registration may proceed"""
+    # Compare against the shard that will hold the registration
+    conn = get_city_connection(city)
+    try:
+        matches = find_matches(entity, name, city, contact, conn=conn)
+    finally:
+        conn.close()
+    if matches.empty:
+        return True
+    label = 'Provider' if entity == 'providers' else 'Receiver'
+    same_phone = matches[matches['reason'] == 'same phone number']
+    if not same_phone.empty:
+        ids = ', '.join(str(i) for i in same_phone['entity_id'])
+        st.error(f'❌ This contact number is already registered ({label} ID {ids}).')
+        return False
+    st.warning(f'⚠️ Similar {label.lower()}s are already registered in this city:')
+    st.dataframe(matches[['entity_id', 'name', 'city', 'contact']], use_container_width=True)
+    if not register_anyway:
+        st.error('❌ Tick "Register anyway" if this is a different organization.')
+        return False
+    return True
+
 def page_user_registration():
     # Hero section
     st.markdown("""
@@ -1223,6 +1178,7 @@ def page_user_registration():
             contact = st.text_input('Contact Number *', placeholder='e.g., +1-555-1234')
             
             st.markdown('**Required fields are marked with** *')
+            register_anyway = st.checkbox('Register anyway if a similar provider exists', key='provider_register_anyway')
             submitted = st.form_submit_button('✅ Register as Provider', type='primary')
             
             if submitted:
@@ -1235,6 +1191,8 @@ def page_user_registration():
                     st.error('❌ City is required!')
                 elif not contact or not contact.strip():
                     st.error('❌ Contact number is required!')
+                elif not duplicate_check('providers', name.strip(), city.strip(), contact.strip(), register_anyway):
+                    pass
                 else:
                     try:
                         # Prepare data
@@ -1251,7 +1209,7 @@ def page_user_registration():
                         execute_query('''
                             INSERT INTO providers(provider_id, name, type, address, city, contact)
                             VALUES (?, ?, ?, ?, ?, ?)
-                        ''', (next_id, name.strip(), type_, address.strip(), city.strip(), contact.strip()))
+                        ''', (next_id, name.strip(), type_, address.strip(), city.strip(), contact.strip()), city=city.strip())
                         
                         # Append to CSV
                         if append_to_csv('providers', provider_data):
@@ -1295,6 +1253,7 @@ def page_user_registration():
             contact = st.text_input('Contact Number *', placeholder='e.g., +1-555-1234')
             
             st.markdown('**Required fields are marked with** *')
+            register_anyway = st.checkbox('Register anyway if a similar receiver exists', key='receiver_register_anyway')
             submitted = st.form_submit_button('✅ Register as Receiver', type='primary')
             
             if submitted:
@@ -1305,6 +1264,8 @@ def page_user_registration():
                     st.error('❌ City is required!')
                 elif not contact or not contact.strip():
                     st.error('❌ Contact number is required!')
+                elif not duplicate_check('receivers', name.strip(), city.strip(), contact.strip(), register_anyway):
+                    pass
                 else:
                     try:
                         # Prepare data
@@ -1320,7 +1281,7 @@ def page_user_registration():
                         execute_query('''
                             INSERT INTO receivers(receiver_id, name, type, city, contact)
                             VALUES (?, ?, ?, ?, ?)
-                        ''', (next_id, name.strip(), type_, city.strip(), contact.strip()))
+                        ''', (next_id, name.strip(), type_, city.strip(), contact.strip()), city=city.strip())
                         
                         # Append to CSV
                         if append_to_csv('receivers', receiver_data):
@@ -1355,31 +1316,159 @@ def page_admin():
     
     st.write('📊 Row counts:', counts)
     
-    if st.button('💾 Backup DB to CSV (tables)'):
-        for table in ['providers', 'receivers', 'food_listings', 'claims']:
-            df = run_query(f"SELECT * FROM {table}")
-            if not df.empty:
-                st.download_button(f'📥 Download {table}.csv', data=df.to_csv(index=False), file_name=f'{table}.csv', mime='text/csv')
+    queue_metrics = write_queue_metrics()
+    if queue_metrics:
+        st.write('✍️ Write queue:', queue_metrics)
+    st.write('🔒 Busy retries / checkpoints:', coordination_metrics())
+    st.write('💤 Lazy page data (hits / misses):', lazy_metrics())
+    st.write('📉 Chart cache (hits / builds):', figure_metrics())
+    st.write('🧪 SQL console:', console_metrics())
+    st.write('📍 Geocoding:', geo_status())
+    api = api_status()
+    if api:
+        st.write('🔌 Partner API:', api)
+    exporter = metrics_status()
+    if exporter:
+        st.write('📡 Metrics export:', exporter)
+    st.write('🚀 Startup steps (seconds, this process):', startup_timings)
+    frames = memoized_frames()
+    if frames:
+        st.write('🧠 Page data memoized in this session:')
+        st.dataframe(memory_report(frames), use_container_width=True)
+    
+    status = replica_status()
+    if status:
+        st.write('🪞 Read replica:', status)
+    
+    router = load_router()
+    if router is not None:
+        st.write(f'🗺️ Region shards (this process serves: {REGION or "none, not split yet"}):')
+        st.dataframe(pd.DataFrame(shard_status(router)), use_container_width=True)
+    
+    backup_tables = ['providers', 'receivers', 'food_listings', 'claims']
+    export_format = st.selectbox('Export format', available_formats(), index=available_formats().index('csv.gz'), key='export_format')
+    
+    # Exports run when a button is clicked, not on every render of this page
+    st.write('💾 Backup DB to CSV (tables):')
+    table_columns = st.columns(len(backup_tables))
+    for column, table in zip(table_columns, backup_tables):
+        with column:
+            st.download_button(f'📥 {export_filename(table, export_format)}', data=on_demand(export_table, table, export_format), file_name=export_filename(table, export_format), mime=export_mime(export_format), key=f'download_{table}', on_click='ignore', disabled=counts[table] == 0)
+    
+    snapshot_name = f"food_rescue_snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    st.download_button('🗂️ Export consistent snapshot (all tables)', data=on_demand(export_snapshot, backup_tables, fmt=export_format), file_name=snapshot_name, mime='application/zip', on_click='ignore')
+    
+    # Full dump: schema plus every row, restorable below
+    st.download_button('📄 Export SQL dump', data=on_demand(export_sql_dump), file_name='food_rescue.sql', mime='text/plain', on_click='ignore')
+    
+    st.subheader('🛟 Online Backups')
+    if st.button('📦 Create backup now'):
+        try:
+            path = create_backup()
+            removed = prune_backups()
+            st.success(f'✅ Backup written and verified: {path.name}' + (f' (pruned {len(removed)} old)' if removed else ''))
+        except Exception as e:
+            st.error(f'❌ Backup failed: {str(e)}')
+    
+    backups = list_backups()
+    if backups:
+        st.write(f'{len(backups)} backup(s) kept in `{backups[0].parent}` (newest first):')
+        st.dataframe(pd.DataFrame({
+            'file': [p.name for p in backups],
+            'size_kb': [round(p.stat().st_size / 1024, 1) for p in backups],
+        }), use_container_width=True)
+        restore_pick = st.selectbox('Backup to restore', [p.name for p in backups], key='restore_pick')
+        confirm_restore = st.checkbox('I understand this overwrites the live database', key='confirm_restore')
+        if st.button('♻️ Restore selected backup', disabled=not confirm_restore):
+            try:
+                restore_backup(backups[[p.name for p in backups].index(restore_pick)])
+                log_audit('restore_backup', restore_pick)
+                st.success(f'✅ Restored {restore_pick}')
+            except Exception as e:
+                st.error(f'❌ Restore failed: {str(e)}')
+    else:
+        st.info('No backups yet')
+    
+    dump_file = st.file_uploader('Restore from SQL dump', type=['sql'], key='restore_dump')
+    if dump_file is not None:
+        confirm_dump = st.checkbox('I understand this overwrites the live database', key='confirm_dump_restore')
+        if st.button('♻️ Restore from dump', disabled=not confirm_dump):
+            try:
+                restore_sql_dump(dump_file.getvalue().decode('utf-8'))
+                log_audit('restore_dump', dump_file.name)
+                st.success(f'✅ Restored from {dump_file.name}')
+            except Exception as e:
+                st.error(f'❌ Restore failed: {str(e)}')
     
-    if st.button('📄 Export SQL dump'):
-        # Get schema
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table'")
-        schema = cursor.fetchall()
-        conn.close()
-        
-        schema_text = '\n'.join([row[0] for row in schema if row[0]])
-        st.download_button('📥 Download schema.sql', data=schema_text, file_name='schema.sql', mime='text/plain')
+    st.subheader('🧊 Archive Cold Data')
+    st.write('Archived rows:', archive_counts())
+    archive_days = st.number_input('Archive listings expired / claims cancelled more than N days ago', min_value=0, value=30, step=1)
+    if st.button('🧊 Archive now'):
+        try:
+            moved = archive_cold_rows(days=archive_days)
+            log_audit('archive', f"listings={moved['food_listings']}, claims={moved['claims']}")
+            st.success(f"✅ Archived {moved['food_listings']} listings and {moved['claims']} claims")
+        except Exception as e:
+            st.error(f'❌ Archive failed: {str(e)}')
+    
+    st.subheader('📸 Public Dashboard Snapshot')
+    st.caption(f'Static copy of the home dashboard in `{SNAPSHOT_DIR}`, for kiosks and public viewers (?view=snapshot)')
+    if st.button('📸 Publish dashboard snapshot'):
+        try:
+            result = publish_snapshot(force=True)
+            log_audit('publish_snapshot', f"version={result['version']}, listings={result['listings']}")
+            st.success(f"✅ Snapshot published: {result['listings']:,} listings, {result['html_bytes'] / 1024:.0f} KB page")
+        except Exception as e:
+            st.error(f'❌ Snapshot failed: {str(e)}')
+    
+    st.subheader('⏱️ Scheduled Jobs')
+    st.dataframe(pd.DataFrame(job_status()), use_container_width=True)
+    job_pick = st.selectbox('Job', sorted(JOBS), key='job_pick')
+    if st.button('▶️ Run job now'):
+        try:
+            result = run_job(job_pick, force=True)
+            if result is None:
+                st.warning(f'⚠️ {job_pick} is already running in another process')
+            else:
+                log_audit('run_job', f'{job_pick}: {result}')
+                st.success(f'✅ {job_pick} finished: {result}')
+        except Exception as e:
+            st.error(f'❌ {job_pick} failed: {str(e)}')
     
     st.success('✅ SQLite database is working! All operations are real and persistent.')
 
+def prepare_database():
+    # Several server processes may start together; only one may create or
+    # migrate the database at a time, the rest wait and then see it ready
+    with init_lock():
+        # Initialize database on first run
+        init_database()
+        
+        # Migrate database if needed (add new columns to existing database)
+        migrate_database()
+
 def main():
-    # Initialize database on first run
-    init_database()
+    # Public viewers (FOOD_RESCUE_VIEWER=1, or ?view=snapshot) get the published
+    # snapshot and nothing else: no migrations, schedulers or database reads
+    if VIEWER_MODE or st.query_params.get('view') == 'snapshot':
+        page_snapshot()
+        return
+    
+    # Once per process, and again whenever the schema changed underneath us
+    # (CSV re-import, restore, another process migrating) - not on every rerun
+    run_when_changed('database', schema_version, prepare_database)
     
-    # Migrate database if needed (add new columns to existing database)
-    migrate_database()
+    # Scheduled online backups (enabled with FOOD_RESCUE_BACKUP_INTERVAL)
+    start_backup_scheduler()
+    
+    # Expiry sweeps, archiving, statistics and checkpoints (off with FOOD_RESCUE_JOBS=0)
+    start_job_scheduler()
+    
+    # Partner JSON API next to the UI (enabled with FOOD_RESCUE_API_PORT)
+    start_api_server()
+    
+    # Prometheus metrics (FOOD_RESCUE_METRICS_PORT and/or FOOD_RESCUE_METRICS_FILE)
+    start_metrics_exporter()
     
     # Sidebar with logo and navigation
     st.sidebar.markdown("""
@@ -1400,7 +1489,7 @@ def main():
         '📊 SQL Queries & Analysis',
         '📈 EDA / Insights',
         '⚙️ Admin / Deploy'
-    ], label_visibility='visible')
+    ], label_visibility='visible', key='nav_page')
     
     if '🆕' in page or 'User Registration' in page:
         page_user_registration()
@@ -1413,9 +1502,11 @@ def main():
     elif '👥' in page or 'Providers' in page or 'Receivers' in page:
         page_providers_receivers()
     elif '📊' in page or 'SQL Queries' in page:
-        page_sql_queries()
+        with analytics_reads():
+            page_sql_queries()
     elif '📈' in page or 'EDA' in page or 'Insights' in page:
-        page_eda()
+        with analytics_reads():
+            page_eda()
     else:
         page_admin()
     
@@ -1428,5 +1519,15 @@ def main():
         </div>
     """, unsafe_allow_html=True)
 
+def page_label():
+    if VIEWER_MODE or st.query_params.get('view') == 'snapshot':
+        return 'Snapshot'
+    return st.session_state.get('nav_page', '🆕 User Registration').split(' ', 1)[-1]
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    started = time.perf_counter()
+    try:
+        main()
+    finally:
+        # Whole script, including st.rerun()/st.stop() exits
+        RERUN_SECONDS.observe(time.perf_counter() - started, page=page_label())
\ No newline at end of file
@@ -0,0 +1,347 @@
+"""Operational metrics in Prometheus text format.
+
+Hot paths update in-process counters and histograms (one lock and a few
+additions per call):
+
+    food_rescue_claims_created_total{source}     claims written by the app / API
+    food_rescue_claim_conflicts_total            API claims refused (not enough left)
+    food_rescue_claim_write_seconds{source}      claim INSERT latency, including the group commit
+    food_rescue_db_lock_wait_seconds             writer waiting for the database write lock
+    food_rescue_rerun_seconds{page}              Streamlit script reruns per page
+
+Everything else is read at scrape time: the stats the modules already keep
+(busy retries, write queue, figure / page-data / API response caches,
+reported as lookups by result plus a hit ratio) and business gauges from
+one grouped query - available quantity and listings by city and listings
+near expiry - recomputed at most every METRICS_DB_TTL seconds. Claims per
+second is rate(food_rescue_claims_created_total[1m]).
+
+Metrics are per process. FOOD_RESCUE_METRICS_PORT serves /metrics from a
+background thread (give each app process its own port), and/or
+FOOD_RESCUE_METRICS_FILE is rewritten every METRICS_FILE_INTERVAL seconds
+for node_exporter's textfile collector ({pid} in the name is replaced by
+the process id).
+
+    python src/app/metrics.py              # print the current metrics
+    python src/app/metrics.py --port 9464  # serve them
+"""
+import argparse
+import bisect
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+METRICS_HOST = os.environ.get('FOOD_RESCUE_METRICS_HOST', '127.0.0.1')
+# Port for /metrics alongside the app; 0 leaves it off
+METRICS_PORT = int(os.environ.get('FOOD_RESCUE_METRICS_PORT', 0))
+METRICS_FILE = os.environ.get('FOOD_RESCUE_METRICS_FILE', '')
+METRICS_FILE_INTERVAL = float(os.environ.get('FOOD_RESCUE_METRICS_FILE_INTERVAL', 15))
+# Business gauges are re-queried at most this often (seconds)
+METRICS_DB_TTL = float(os.environ.get('FOOD_RESCUE_METRICS_DB_TTL', 30))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Counter or gauge, one value per combination of label values"""
+
+    def __init__(self, kind, name, help, labelnames=()):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def lines(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}' for key, value in values]
+
+class Histogram(Metric):
+    """Bucketed observations with _bucket / _sum / _count series"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__('histogram', name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def lines(self):
+        with self.lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+def counter(name, help, labelnames=()):
+    return Metric('counter', name, help, labelnames)
+
+def gauge(name, help, labelnames=()):
+    return Metric('gauge', name, help, labelnames)
+
+CLAIMS_CREATED = counter('food_rescue_claims_created_total', 'Claims created', ['source'])
+CLAIM_CONFLICTS = counter('food_rescue_claim_conflicts_total', 'API claims refused because too little was left')
+CLAIM_SECONDS = Histogram('food_rescue_claim_write_seconds', 'Claim insert latency including the commit', ['source'])
+DB_LOCK_WAIT = Histogram('food_rescue_db_lock_wait_seconds', 'Time the writer waited to get the database write lock',
+                         buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+RERUN_SECONDS = Histogram('food_rescue_rerun_seconds', 'Streamlit script rerun duration', ['page'])
+
+def register_collector(collect):
+    """collect() -> [(name, kind, help, [(labels dict, value), ...])], called on every scrape"""
+    _collectors.append(collect)
+    return collect
+
+def _ratio(hits, misses):
+    return hits / (hits + misses) if hits + misses else 0.0
+
+@register_collector
+def _module_stats():
+    """Stats dicts the modules already keep; modules not loaded in this process are skipped"""
+    families = []
+    coordination = sys.modules.get('coordination')
+    if coordination is not None:
+        busy = coordination.coordination_metrics()
+        families += [
+            ('food_rescue_db_busy_retries_total', 'counter', 'Busy/locked errors retried with backoff', [({}, busy['retries'])]),
+            ('food_rescue_db_busy_gave_up_total', 'counter', 'Busy/locked errors that ran out of retries', [({}, busy['gave_up'])]),
+            ('food_rescue_db_busy_backoff_seconds_total', 'counter', 'Time slept backing off busy errors', [({}, busy['wait_s'])]),
+        ]
+    db = sys.modules.get('db')
+    queue = db.write_queue_metrics() if db is not None else None
+    if queue:
+        families += [
+            ('food_rescue_write_queue_depth', 'gauge', 'Writes waiting for the writer thread', [({}, queue['queue_depth'])]),
+            ('food_rescue_writes_total', 'counter', 'Writes through the write queue',
+             [({'result': 'committed'}, queue['committed']), ({'result': 'failed'}, queue['failed'])]),
+            ('food_rescue_write_queue_wait_seconds_total', 'counter', 'Time writes spent queued', [({}, queue['queue_wait_s'])]),
+        ]
+    caches = []
+    if 'figure_cache' in sys.modules:
+        stats = sys.modules['figure_cache'].figure_metrics()
+        caches.append(('figure', stats['hits'], stats['builds'] + stats['uncached']))
+    if 'lazy_data' in sys.modules:
+        stats = sys.modules['lazy_data'].lazy_metrics()
+        caches.append(('page_data', stats['hits'], stats['misses'] + stats['uncached']))
+    if 'api_server' in sys.modules:
+        stats = sys.modules['api_server'].api_metrics()
+        caches.append(('api_response', stats['cache_hits'], stats['cache_misses']))
+        families.append(('food_rescue_api_requests_total', 'counter', 'Partner API requests', [({}, stats['requests'])]))
+    if caches:
+        families += [
+            ('food_rescue_cache_lookups_total', 'counter', 'Cache lookups by result',
+             [({'cache': name, 'result': result}, n) for name, hits, misses in caches
+              for result, n in (('hit', hits), ('miss', misses))]),
+            ('food_rescue_cache_hit_ratio', 'gauge', 'Cache hits / lookups since the process started',
+             [({'cache': name}, _ratio(hits, misses)) for name, hits, misses in caches]),
+        ]
+    return families
+
+# Available (unclaimed, unexpired) listings per city
+CITY_QUERY = '''
+    SELECT COALESCE(p.city, '') AS city, COUNT(*) AS listings, SUM(a.available) AS available,
+           SUM(a.expiry_date <= date('now', 'localtime', ?)) AS near_expiry
+    FROM (SELECT f.provider_id, f.expiry_date,
+                 f.quantity - COALESCE((SELECT SUM(c.claimed_quantity) FROM claims c
+                                        WHERE c.food_id = f.food_id AND c.status != 'Cancelled'), 0) AS available
+          FROM food_listings f
+          WHERE f.expiry_date >= date('now', 'localtime')) a
+    JOIN providers p ON p.provider_id = a.provider_id
+    WHERE a.available > 0
+    GROUP BY 1
+'''
+_business = {'at': None, 'path': None, 'rows': []}
+_business_lock = threading.Lock()
+
+@register_collector
+def _business_gauges():
+    import db
+    from dashboard import NEAR_EXPIRY_DAYS
+    with _business_lock:
+        if _business['at'] is None or _business['path'] != db.DB_PATH or time.monotonic() - _business['at'] > METRICS_DB_TTL:
+            conn = db.get_db_connection()
+            try:
+                rows = conn.execute(CITY_QUERY, (f'+{NEAR_EXPIRY_DAYS} day',)).fetchall()
+            except sqlite3.OperationalError:
+                rows = []
+            finally:
+                conn.close()
+            _business.update(at=time.monotonic(), path=db.DB_PATH, rows=[tuple(row) for row in rows])
+        rows = _business['rows']
+    return [
+        ('food_rescue_available_quantity', 'gauge', 'Unclaimed quantity on unexpired listings',
+         [({'city': city}, available) for city, _, available, _ in rows]),
+        ('food_rescue_available_listings', 'gauge', 'Unexpired listings with quantity left',
+         [({'city': city}, listings) for city, listings, _, _ in rows]),
+        ('food_rescue_near_expiry_listings', 'gauge', f'Available listings expiring within {NEAR_EXPIRY_DAYS} days',
+         [({}, sum(row[3] or 0 for row in rows))]),
+    ]
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines += [f'# HELP {metric.name} {metric.help}', f'# TYPE {metric.name} {metric.kind}']
+        lines += metric.lines()
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(labels, labels.values())} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+def write_textfile(path):
+    """Write render() to `path` atomically (the textfile collector must never see half a file)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(render())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_exporter = {'server': None, 'file_thread': None, 'last_error': None, 'file_writes': 0}
+_exporter_lock = threading.Lock()
+
+def _write_file_forever(path):
+    while True:
+        try:
+            write_textfile(path)
+            _exporter['file_writes'] += 1
+        except Exception as e:
+            _exporter['last_error'] = str(e)
+        time.sleep(METRICS_FILE_INTERVAL)
+
+def start_metrics_exporter():
+    """Start the /metrics endpoint and/or textfile writer once per process, as configured"""
+    with _exporter_lock:
+        if METRICS_PORT and _exporter['server'] is None and _exporter['last_error'] is None:
+            try:
+                server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), MetricsHandler)
+            except OSError as e:
+                # Typically another app process on this host already has the port
+                _exporter['last_error'] = str(e)
+            else:
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, name='food-rescue-metrics', daemon=True).start()
+                _exporter['server'] = server
+        if METRICS_FILE and _exporter['file_thread'] is None:
+            path = METRICS_FILE.replace('{pid}', str(os.getpid()))
+            thread = threading.Thread(target=_write_file_forever, args=(path,), name='food-rescue-metrics-file', daemon=True)
+            thread.start()
+            _exporter['file_thread'] = thread
+
+def metrics_status():
+    """Where this process exports its metrics, or None when exporting is off"""
+    if not METRICS_PORT and not METRICS_FILE:
+        return None
+    server = _exporter['server']
+    return {'endpoint': f'http://{METRICS_HOST}:{server.server_address[1]}/metrics' if server is not None else None,
+            'file': METRICS_FILE.replace('{pid}', str(os.getpid())) if METRICS_FILE else None,
+            'file_writes': _exporter['file_writes'], 'last_error': _exporter['last_error']}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print or serve food rescue metrics')
+    parser.add_argument('--host', default=METRICS_HOST)
+    parser.add_argument('--port', type=int, default=0, help='serve /metrics on this port instead of printing')
+    args = parser.parse_args(argv)
+
+    if not args.port:
+        sys.stdout.write(render())
+        return 0
+    server = ThreadingHTTPServer((args.host, args.port), MetricsHandler)
+    print(f'Serving metrics on http://{args.host}:{args.port}/metrics')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
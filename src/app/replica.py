@@ -0,0 +1,143 @@
+"""Read-only snapshot replica for analytical reads.
+
+A copy of the primary database is refreshed with the backup API whenever it
+is older than the staleness bound. Queries run inside `analytics_reads()`
+are routed to it by db.run_query, so heavy dashboard aggregates never hold
+read locks on the file that claims are being written to.
+
+Enable with FOOD_RESCUE_READ_REPLICA=1; FOOD_RESCUE_REPLICA_MAX_STALENESS
+(seconds) bounds how old an analytical read may be.
+"""
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from coordination import connect, file_lock, lock_path
+
+REPLICA_ENABLED = os.environ.get('FOOD_RESCUE_READ_REPLICA', '0') == '1'
+REPLICA_MAX_STALENESS = float(os.environ.get('FOOD_RESCUE_REPLICA_MAX_STALENESS', 30))
+REPLICA_PAGES_PER_STEP = 1024
+
+_analytics = contextvars.ContextVar('food_rescue_analytics_reads', default=False)
+_replicas = {}
+_replicas_lock = threading.Lock()
+
+@contextmanager
+def analytics_reads():
+    """Route run_query calls made inside this block to the read replica"""
+    token = _analytics.set(True)
+    try:
+        yield
+    finally:
+        _analytics.reset(token)
+
+def in_analytics_reads():
+    return _analytics.get()
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+class ReadReplica:
+    """Periodically refreshed read-only copy of one primary database file"""
+
+    def __init__(self, primary_path, replica_path=None, max_staleness=REPLICA_MAX_STALENESS):
+        self.primary_path = Path(primary_path)
+        self.replica_path = Path(replica_path or self.primary_path.with_name(f'{self.primary_path.stem}.replica.db'))
+        self.max_staleness = max_staleness
+        self.refresh_lock = threading.Lock()
+        self.refreshes = 0
+        self.last_error = None
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def age(self):
+        """Seconds since the replica was last known to match the primary"""
+        mtime = _mtime(self.replica_path)
+        return float('inf') if not mtime else max(0.0, time.time() - mtime)
+
+    def _primary_changed_since_refresh(self):
+        replica_mtime = _mtime(self.replica_path)
+        primary_mtime = max(_mtime(self.primary_path), _mtime(f'{self.primary_path}-wal'))
+        return not replica_mtime or primary_mtime >= replica_mtime
+
+    def refresh(self):
+        """Copy the primary into a temp file and atomically swap it in"""
+        # Only one thread (and, via the file lock, one process) copies at a time
+        with self.refresh_lock, file_lock(lock_path(self.replica_path, 'refresh'), timeout=60):
+            if self.age() < self.max_staleness / 2:
+                return False  # another process just refreshed it
+            if not self._primary_changed_since_refresh():
+                # Nothing written since the last copy: just mark it fresh
+                os.utime(self.replica_path)
+                return False
+            staged = self.replica_path.with_name(f'{self.replica_path.name}.{os.getpid()}.tmp')
+            src = connect(self.primary_path)
+            dst = sqlite3.connect(str(staged))
+            try:
+                src.backup(dst, pages=REPLICA_PAGES_PER_STEP)
+                # Read-only opens of a WAL file need a writable -shm; keep the copy in rollback mode
+                dst.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                dst.close()
+                src.close()
+            os.replace(staged, self.replica_path)
+            self.refreshes += 1
+            return True
+
+    def ensure_fresh(self):
+        if self.age() > self.max_staleness:
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                if not self.replica_path.exists():
+                    raise
+
+    def connect(self):
+        """Read-only connection to a replica no older than max_staleness"""
+        self.ensure_fresh()
+        return sqlite3.connect(f'file:{self.replica_path}?mode=ro', uri=True)
+
+    def start(self):
+        """Refresh in the background so readers rarely wait for a copy"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name='food-rescue-replica', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        interval = max(1.0, self.max_staleness / 2)
+        while not self.stop_event.wait(interval):
+            self.ensure_fresh()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def status(self):
+        return {
+            'replica_path': str(self.replica_path),
+            'age_s': round(self.age(), 1),
+            'max_staleness_s': self.max_staleness,
+            'refreshes': self.refreshes,
+            'last_error': self.last_error,
+        }
+
+def get_replica(primary_path):
+    """Started replica for primary_path, or None when replica mode is off"""
+    if not REPLICA_ENABLED:
+        return None
+    key = str(primary_path)
+    with _replicas_lock:
+        replica = _replicas.get(key)
+        if replica is None:
+            replica = _replicas[key] = ReadReplica(primary_path)
+            replica.start()
+        return replica
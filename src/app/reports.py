@@ -0,0 +1,129 @@
+"""SQL for the SQL Queries & Analysis and EDA pages.
+
+Kept in one place so both analytics engines (SQLite and the optional DuckDB
+columnar engine) and the benchmark run exactly the same reports. Reports
+whose SQLite dialect DuckDB doesn't accept have an entry in DUCKDB_SQL.
+"""
+from time_dimension import claims_time_series_query
+
+REPORT_QUERIES = {
+    'Providers and receivers per city': '''
+        SELECT city, 
+               SUM(CASE WHEN src='provider' THEN cnt ELSE 0 END) AS providers,
+               SUM(CASE WHEN src='receiver' THEN cnt ELSE 0 END) AS receivers
+        FROM (
+            SELECT city, COUNT(*) AS cnt, 'provider' AS src FROM providers GROUP BY city
+            UNION ALL
+            SELECT city, COUNT(*) AS cnt, 'receiver' AS src FROM receivers GROUP BY city
+        ) t
+        GROUP BY city
+        ORDER BY city
+    ''',
+    'Top provider type': '''
+        SELECT provider_type, COUNT(*) AS listings_count
+        FROM food_listings_all
+        GROUP BY provider_type
+        ORDER BY listings_count DESC
+        LIMIT 1
+    ''',
+    'Provider contacts in city': '''
+        SELECT name, contact FROM providers WHERE city = ?
+        ORDER BY name
+    ''',
+    'Top receivers by claims': '''
+        SELECT r.receiver_id, r.name, COUNT(*) AS claims_count
+        FROM claims_all c
+        JOIN receivers r ON r.receiver_id = c.receiver_id
+        GROUP BY r.receiver_id, r.name
+        ORDER BY claims_count DESC
+    ''',
+    'Total quantity available': '''
+        SELECT SUM(quantity) AS total_quantity FROM food_listings
+    ''',
+    'City with most listings': '''
+        SELECT p.city, COUNT(*) AS listings_count
+        FROM food_listings_all f
+        JOIN providers p ON p.provider_id = f.provider_id
+        GROUP BY p.city
+        ORDER BY listings_count DESC
+        LIMIT 1
+    ''',
+    'Most common food types': '''
+        SELECT food_type, COUNT(*) AS cnt
+        FROM food_listings_all
+        GROUP BY food_type
+        ORDER BY cnt DESC
+        LIMIT 5
+    ''',
+    'Claims per food item': '''
+        SELECT f.food_id, f.food_name, COUNT(c.claim_id) AS claims_count
+        FROM food_listings_all f
+        LEFT JOIN claims_all c ON c.food_id = f.food_id
+        GROUP BY f.food_id, f.food_name
+        ORDER BY claims_count DESC
+    ''',
+    'Claims status distribution': '''
+        SELECT status, COUNT(*) AS cnt,
+               ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM claims_all), 2) AS pct
+        FROM claims_all
+        GROUP BY status
+    ''',
+    'Food listings near expiry (<=3 days)': '''
+        SELECT *
+        FROM food_listings
+        WHERE expiry_date <= date('now','+3 day')
+        ORDER BY expiry_date ASC
+    ''',
+    'Claims per week (time-series)': claims_time_series_query('week', label='iso_week')[0]
+}
+
+# Reports with a parameter, and where the UI gets its choices from
+REPORT_PARAMS = {
+    'Provider contacts in city': "SELECT DISTINCT city FROM providers WHERE city IS NOT NULL",
+}
+
+EDA_QUERIES = {
+    'Listings by City': '''
+        SELECT p.city, COUNT(*) as listings
+        FROM food_listings f 
+        JOIN providers p ON p.provider_id = f.provider_id
+        GROUP BY p.city
+    ''',
+    'Listings by Meal Type': '''
+        SELECT meal_type, COUNT(*) as count
+        FROM food_listings 
+        GROUP BY meal_type 
+        ORDER BY count DESC
+    ''',
+    'Listings near expiry': '''
+        SELECT *
+        FROM food_listings
+        WHERE expiry_date <= date('now','+3 day')
+        ORDER BY expiry_date ASC
+    ''',
+}
+
+_NEAR_EXPIRY_DUCKDB = '''
+    SELECT *
+    FROM food_listings
+    WHERE expiry_date <= current_date + INTERVAL 3 DAY
+    ORDER BY expiry_date ASC
+'''
+
+DUCKDB_SQL = {
+    'Food listings near expiry (<=3 days)': _NEAR_EXPIRY_DUCKDB,
+    'Listings near expiry': _NEAR_EXPIRY_DUCKDB,
+}
+
+# Available (unexpired, not fully claimed) listings table on the home page
+DASHBOARD_LISTINGS_QUERY = '''
+    SELECT f.*, p.city, p.name AS provider_name, p.contact AS provider_contact,
+           COALESCE(SUM(c.claimed_quantity), 0) as total_claimed,
+           (f.quantity - COALESCE(SUM(c.claimed_quantity), 0)) as available_quantity
+    FROM food_listings f 
+    JOIN providers p ON p.provider_id = f.provider_id
+    LEFT JOIN claims c ON f.food_id = c.food_id AND c.status != 'Cancelled'
+    WHERE f.expiry_date >= date('now')
+    GROUP BY f.food_id
+    HAVING available_quantity > 0
+'''
@@ -0,0 +1,375 @@
+"""Region-sharded storage: one SQLite file per region, routed by city.
+
+A shard map (JSON, path in FOOD_RESCUE_SHARDS) assigns cities to regions:
+
+    {"default": "central",
+     "regions": {"south": ["Mysore", "Bangalore", "Chennai"],
+                 "north": ["Delhi"]}}
+
+Providers and receivers live in the shard of their own city; a listing and
+its claims live with the listing's provider. Each shard has its own write
+lock, page cache and writer thread, and can be placed on its own volume.
+
+After `split` the shards are the live databases and food_rescue.db is no
+longer used: each app process serves one region's shard (FOOD_RESCUE_REGION,
+default: the map's default region; see db.py), so regions can run on
+separate nodes. Registrations and provider/receiver writes for a city owned
+by another region are routed to that region's shard (execute_query(city=)),
+IDs are allocated across all shards, and the 'sharded' report engine
+scatter-gathers the cross-city reports over every shard.
+
+    python src/app/sharding.py split                  # partition food_rescue.db
+    python src/app/sharding.py rebalance --city Pune --to west
+    python src/app/sharding.py status
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+import db
+from coordination import connect, retry_on_busy
+from geo import GEO_INDEX_TABLES, ensure_geo_schema
+from typed_fetch import fetch_frame
+from write_queue import WriteQueue
+
+SHARD_CONFIG = str(db.SHARD_CONFIG)
+SHARD_DIR = db.SHARD_DIR
+
+_router = None
+_router_mtime = None
+_router_lock = threading.Lock()
+
+def normalize_city(city):
+    return str(city).strip().lower() if city is not None else ''
+
+class ShardRouter:
+    """Maps cities to region shards and runs queries against them"""
+
+    def __init__(self, config, shard_dir=SHARD_DIR):
+        self.config = config
+        self.shard_dir = Path(shard_dir)
+        self.default_region = config.get('default', 'default')
+        self.city_regions = {}
+        for region, cities in config.get('regions', {}).items():
+            for city in cities:
+                self.city_regions[normalize_city(city)] = region
+        self.queues = {}
+        self.queues_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=SHARD_CONFIG, shard_dir=SHARD_DIR):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), shard_dir)
+
+    def save(self, path=SHARD_CONFIG):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.config, f, indent=2)
+
+    @property
+    def regions(self):
+        return sorted(set(self.config.get('regions', {})) | {self.default_region})
+
+    def region_for_city(self, city):
+        return self.city_regions.get(normalize_city(city), self.default_region)
+
+    def shard_path(self, region):
+        return self.shard_dir / f'{region}.db'
+
+    def connect(self, region):
+        conn = connect(self.shard_path(region))
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def query(self, city, sql, params=None, region=None):
+        """Run a read on the shard owning `city`"""
+        region = region or self.region_for_city(city)
+        conn = self.connect(region)
+        try:
+            return retry_on_busy(fetch_frame, conn, sql, params)
+        finally:
+            conn.close()
+
+    def write_queue(self, region):
+        with self.queues_lock:
+            queue = self.queues.get(region)
+            if queue is None:
+                queue = self.queues[region] = WriteQueue(lambda: self.connect(region))
+            return queue
+
+    def execute(self, city, sql, params=None, region=None):
+        """Run a write on the shard owning `city` through that shard's writer"""
+        return self.write_queue(region or self.region_for_city(city)).execute(sql, params)
+
+    def scatter(self, sql, params=None):
+        """Run a read on every shard in parallel; returns {region: DataFrame}"""
+        regions = [r for r in self.regions if self.shard_path(r).exists()]
+        with ThreadPoolExecutor(max_workers=max(1, len(regions))) as pool:
+            frames = pool.map(lambda r: self.query(None, sql, params, region=r), regions)
+            return dict(zip(regions, frames))
+
+    def gather(self, sql, params=None):
+        """Scatter a read and concatenate the per-shard results"""
+        frames = [df for df in self.scatter(sql, params).values() if not df.empty]
+        if not frames:
+            return self.query(None, sql, params, region=self.regions[0])
+        return pd.concat(frames, ignore_index=True)
+
+    def next_id(self, table, id_column):
+        """Next ID unique across all shards (same semantics as db.get_next_id)"""
+        df = self.gather(f"SELECT MAX({id_column}) AS max_id FROM {table}")
+        max_id = pd.to_numeric(df['max_id'], errors='coerce').max()
+        return 1 if pd.isna(max_id) else int(max_id) + 1
+
+def load_router():
+    """Process-wide router when a shard map exists, else None"""
+    global _router, _router_mtime
+    try:
+        mtime = os.stat(SHARD_CONFIG).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _router_lock:
+        # Reload after a rebalance (possibly by another process) rewrote the map
+        if _router is None or mtime != _router_mtime:
+            if _router is not None:
+                for queue in _router.queues.values():
+                    queue.stop()
+            _router, _router_mtime = ShardRouter.load(), mtime
+        return _router
+
+def regroup(df, by, sums, sort=None, ascending=False, limit=None):
+    """Re-aggregate partial per-shard results"""
+    if df.empty:
+        return df
+    out = df.groupby(by, as_index=False, dropna=False)[sums].sum()
+    if sort:
+        out = out.sort_values(sort, ascending=ascending, kind='stable')
+    if limit:
+        out = out.head(limit)
+    return out.reset_index(drop=True)
+
+def _sorted(df, column, ascending=True, limit=None):
+    if df.empty:
+        return df
+    out = df.sort_values(column, ascending=ascending, kind='stable')
+    return (out.head(limit) if limit else out).reset_index(drop=True)
+
+def _top_receivers(router, params):
+    counts = regroup(router.gather("SELECT receiver_id, COUNT(*) AS claims_count FROM claims_all GROUP BY receiver_id"),
+                     ['receiver_id'], ['claims_count'])
+    names = router.gather("SELECT receiver_id, name FROM receivers")
+    if counts.empty:
+        return pd.DataFrame(columns=['receiver_id', 'name', 'claims_count'])
+    merged = counts.merge(names, on='receiver_id', how='inner')[['receiver_id', 'name', 'claims_count']]
+    return _sorted(merged, 'claims_count', ascending=False)
+
+def _status_distribution(router, params):
+    df = regroup(router.gather("SELECT status, COUNT(*) AS cnt FROM claims_all GROUP BY status"), ['status'], ['cnt'])
+    if not df.empty:
+        df['pct'] = (100.0 * df['cnt'] / df['cnt'].sum()).round(2)
+    return df
+
+def _per_city(router, params):
+    providers = regroup(router.gather("SELECT city, COUNT(*) AS providers FROM providers GROUP BY city"), ['city'], ['providers'])
+    receivers = regroup(router.gather("SELECT city, COUNT(*) AS receivers FROM receivers GROUP BY city"), ['city'], ['receivers'])
+    merged = providers.merge(receivers, on='city', how='outer') if not providers.empty or not receivers.empty else providers
+    return _sorted(merged.fillna(0), 'city') if not merged.empty else merged
+
+# Cross-shard versions of the reports in reports.py: label -> fn(router, params)
+SCATTER_REPORTS = {
+    'Providers and receivers per city': _per_city,
+    'Top provider type': lambda r, p: regroup(
+        r.gather("SELECT provider_type, COUNT(*) AS listings_count FROM food_listings_all GROUP BY provider_type"),
+        ['provider_type'], ['listings_count'], sort='listings_count', limit=1),
+    'Provider contacts in city': lambda r, p: r.query(
+        p[0], "SELECT name, contact FROM providers WHERE city = ? ORDER BY name", p),
+    'Top receivers by claims': _top_receivers,
+    'Total quantity available': lambda r, p: pd.DataFrame(
+        {'total_quantity': [r.gather("SELECT SUM(quantity) AS total_quantity FROM food_listings")['total_quantity'].sum()]}),
+    'City with most listings': lambda r, p: regroup(r.gather('''
+        SELECT p.city, COUNT(*) AS listings_count
+        FROM food_listings_all f JOIN providers p ON p.provider_id = f.provider_id
+        GROUP BY p.city'''), ['city'], ['listings_count'], sort='listings_count', limit=1),
+    'Most common food types': lambda r, p: regroup(
+        r.gather("SELECT food_type, COUNT(*) AS cnt FROM food_listings_all GROUP BY food_type"),
+        ['food_type'], ['cnt'], sort='cnt', limit=5),
+    'Claims per food item': lambda r, p: _sorted(r.gather('''
+        SELECT f.food_id, f.food_name, COUNT(c.claim_id) AS claims_count
+        FROM food_listings_all f LEFT JOIN claims_all c ON c.food_id = f.food_id
+        GROUP BY f.food_id, f.food_name'''), 'claims_count', ascending=False),
+    'Claims status distribution': _status_distribution,
+    'Food listings near expiry (<=3 days)': lambda r, p: _sorted(r.gather(
+        "SELECT * FROM food_listings WHERE expiry_date <= date('now','+3 day')"), 'expiry_date'),
+    'Claims per week (time-series)': lambda r, p: regroup(r.gather('''
+        SELECT cal.week_label AS iso_week, COUNT(*) AS claims
+        FROM claims_all c JOIN calendar cal ON cal.day = c.ts_day
+        GROUP BY c.ts_week, cal.week_label'''), ['iso_week'], ['claims'], sort='iso_week', ascending=True),
+    'Listings by City': lambda r, p: regroup(r.gather('''
+        SELECT p.city, COUNT(*) as listings
+        FROM food_listings f JOIN providers p ON p.provider_id = f.provider_id
+        GROUP BY p.city'''), ['city'], ['listings']),
+    'Listings by Meal Type': lambda r, p: regroup(
+        r.gather("SELECT meal_type, COUNT(*) as count FROM food_listings GROUP BY meal_type"),
+        ['meal_type'], ['count'], sort='count'),
+    'Listings near expiry': lambda r, p: _sorted(r.gather(
+        "SELECT * FROM food_listings WHERE expiry_date <= date('now','+3 day')"), 'expiry_date'),
+}
+
+def run_scatter_report(name, params=None, router=None):
+    router = router or load_router()
+    return SCATTER_REPORTS[name](router, params)
+
+# Rows that follow a city, parents first: (table, WHERE clause given a city predicate)
+_CITY_ROWS = [
+    ('providers', "{match}"),
+    ('receivers', "{match}"),
+    ('food_listings', "provider_id IN (SELECT provider_id FROM main.providers WHERE {match})"),
+    ('food_listings_archive', "provider_id IN (SELECT provider_id FROM main.providers WHERE {match})"),
+    ('claims', "food_id IN (SELECT food_id FROM main.food_listings WHERE provider_id IN "
+               "(SELECT provider_id FROM main.providers WHERE {match}))"),
+    ('claims_archive', "food_id IN (SELECT food_id FROM main.food_listings_archive WHERE provider_id IN "
+                       "(SELECT provider_id FROM main.providers WHERE {match}))"),
+]
+
+def _tables(conn, schema='main'):
+    return {row[0] for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type='table'")}
+
+def move_city(router, city, source_region, target_region):
+    """Move every row belonging to `city` between shards in one transaction"""
+    conn = sqlite3.connect(str(router.shard_path(source_region)), timeout=30)
+    conn.isolation_level = None
+    try:
+        conn.execute("ATTACH DATABASE ? AS dst", (str(router.shard_path(target_region)),))
+        tables = [(t, w.format(match='city = :city COLLATE NOCASE')) for t, w in _CITY_ROWS
+                  if t in _tables(conn) and t in _tables(conn, 'dst')]
+        moved = {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Copy everything while the parent rows are still in main, then delete children first
+            for table, where in tables:
+                target_columns = {r[1] for r in conn.execute(f"PRAGMA dst.table_info({table})")}
+                columns = ', '.join(r[1] for r in conn.execute(f"PRAGMA main.table_info({table})") if r[1] in target_columns)
+                conn.execute(f"INSERT OR REPLACE INTO dst.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE {where}",
+                             {'city': city})
+            for table, where in reversed(tables):
+                moved[table] = conn.execute(f"DELETE FROM main.{table} WHERE {where}", {'city': city}).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return moved
+    finally:
+        conn.close()
+
+def split_database(router, source=None):
+    """Create one shard per region from the monolithic database"""
+    source = Path(source or db.DB_PATH)
+    router.shard_dir.mkdir(parents=True, exist_ok=True)
+    paths = {region: router.shard_path(region) for region in router.regions}
+    for path in paths.values():
+        if path.exists():
+            raise FileExistsError(f'{path} already exists; use rebalance to move cities')
+    src = sqlite3.connect(str(source))
+    try:
+        cities = [row[0] for row in src.execute("SELECT city FROM providers UNION SELECT city FROM receivers")
+                  if row[0] is not None]
+        for region, path in paths.items():
+            # Each shard starts as a full copy (schema, views, triggers, calendar) and
+            # then drops every row owned by another region
+            dst = sqlite3.connect(str(path))
+            try:
+                src.backup(dst)
+                dst.execute("CREATE TEMP TABLE owned (city TEXT PRIMARY KEY COLLATE NOCASE)")
+                dst.executemany("INSERT OR IGNORE INTO temp.owned VALUES (?)",
+                                [(c,) for c in cities if router.region_for_city(c) == region])
+                match = "city IN (SELECT city FROM temp.owned)"
+                if region == router.default_region:
+                    match = f"({match} OR city IS NULL)"
+                present = _tables(dst)
+                with dst:
+                    for table, where in reversed(_CITY_ROWS):
+                        if table in present:
+                            dst.execute(f"DELETE FROM {table} WHERE NOT ({where.format(match=match)})")
+                    if region != router.default_region and 'audit_log' in present:
+                        dst.execute("DELETE FROM audit_log")
+                dst.execute('VACUUM')
+            finally:
+                dst.close()
+    finally:
+        src.close()
+    return paths
+
+def shard_status(router):
+    rows = []
+    for region in router.regions:
+        path = router.shard_path(region)
+        if not path.exists():
+            rows.append({'region': region, 'path': str(path), 'exists': False})
+            continue
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                      for t in ('providers', 'receivers', 'food_listings', 'claims') if t in _tables(conn)}
+        finally:
+            conn.close()
+        rows.append({'region': region, 'path': str(path), 'exists': True, 'size_mb': round(path.stat().st_size / 2**20, 2), **counts})
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Region shard management')
+    parser.add_argument('--config', default=SHARD_CONFIG)
+    parser.add_argument('--shard-dir', default=str(SHARD_DIR))
+    sub = parser.add_subparsers(dest='command', required=True)
+    split = sub.add_parser('split', help='partition the monolithic database into region shards')
+    split.add_argument('--source', default=str(db.DB_PATH))
+    rebalance = sub.add_parser('rebalance', help='move a city to another region')
+    rebalance.add_argument('--city', required=True)
+    rebalance.add_argument('--to', required=True, dest='target')
+    sub.add_parser('status', help='row counts per shard')
+    args = parser.parse_args(argv)
+
+    router = ShardRouter.load(args.config, args.shard_dir)
+    if args.command == 'split':
+        for region, path in split_database(router, args.source).items():
+            print(f'{region}: {path}')
+        print(f'{args.source} is no longer used by the app: start one app per region with FOOD_RESCUE_REGION=<region> '
+              f'(default region: {router.default_region})')
+    elif args.command == 'rebalance':
+        source_region = router.region_for_city(args.city)
+        if source_region == args.target:
+            print(f'{args.city} is already in {args.target}')
+            return 0
+        router.shard_path(args.target).parent.mkdir(parents=True, exist_ok=True)
+        if not router.shard_path(args.target).exists():
+            # New region: clone an empty copy of the schema from the source shard
+            src = sqlite3.connect(str(router.shard_path(source_region)))
+            dst = sqlite3.connect(str(router.shard_path(args.target)))
+            for (sql,) in src.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+                                      f"AND NOT {GEO_INDEX_TABLES} "
+                                      "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END"):
+                dst.execute(sql)
+            dst.commit()
+            # The R*Tree (skipped above, its shadow tables would clash) and the gazetteer
+            ensure_geo_schema(dst)
+            src.close()
+            dst.close()
+        moved = move_city(router, args.city, source_region, args.target)
+        regions = router.config.setdefault('regions', {})
+        for cities in regions.values():
+            cities[:] = [c for c in cities if normalize_city(c) != normalize_city(args.city)]
+        regions.setdefault(args.target, []).append(args.city)
+        router.save(args.config)
+        print(f'Moved {args.city} from {source_region} to {args.target}: {moved}')
+    else:
+        for row in shard_status(router):
+            print(row)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
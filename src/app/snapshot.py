@@ -0,0 +1,243 @@
+"""Static snapshots of the home dashboard for public, read-only viewers.
+
+publish_snapshot() renders the Home KPIs, the claim status and weekly
+trend charts and the available-listings table (without PRIVATE_COLUMNS)
+into SNAPSHOT_DIR:
+
+    dashboard.json   all of the above as data (figures as Plotly JSON)
+    index.html       standalone page drawing it (auto-refreshes)
+    plotly.min.js    served next to it, so kiosks need no internet access
+
+Files are replaced atomically. The publish_snapshot job (jobs.py) checks
+every minute and republishes only when the change-log version moved, or
+when the snapshot is older than SNAPSHOT_MAX_AGE (expiry highlighting
+depends on the date).
+
+Viewers then cost the database nothing: point kiosks at the static files
+(`python snapshot.py serve`, or any web server / CDN), or open the app with
+?view=snapshot for the same dashboard rendered from dashboard.json.
+
+    python src/app/snapshot.py publish [--force]
+    python src/app/snapshot.py serve --port 8700
+"""
+import argparse
+import html
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import db
+from changefeed import current_version, get_dashboard_stats
+from dashboard import listings_table, near_expiry, status_pie, weekly_area
+from reports import DASHBOARD_LISTINGS_QUERY
+
+SNAPSHOT_DIR = Path(os.environ.get('FOOD_RESCUE_SNAPSHOT_DIR', db.ROOT / 'data' / 'snapshots'))
+# Republish at least this often even without data changes (seconds)
+SNAPSHOT_MAX_AGE = int(os.environ.get('FOOD_RESCUE_SNAPSHOT_MAX_AGE', 3600))
+# How often viewers reload the snapshot (seconds)
+SNAPSHOT_REFRESH = int(os.environ.get('FOOD_RESCUE_SNAPSHOT_REFRESH', 60))
+# Listings in the public table, soonest expiry first
+SNAPSHOT_MAX_LISTINGS = int(os.environ.get('FOOD_RESCUE_SNAPSHOT_MAX_LISTINGS', 1000))
+# Listing columns shown in the app but never published (personal contact details)
+PRIVATE_COLUMNS = ['provider_contact']
+DATA_FILE = 'dashboard.json'
+PLOTLY_JS = 'plotly.min.js'
+
+PAGE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta http-equiv="refresh" content="{refresh}">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Food Rescue Platform</title>
+<script src="{plotly_js}"></script>
+<style>
+body {{ font-family: -apple-system, 'Segoe UI', Roboto, sans-serif; margin: 0; padding: 1.5rem; background: #f5f7fb; color: #222; }}
+.hero {{ text-align: center; padding: 1.5rem 0; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; color: white; }}
+.hero h1 {{ margin: 0; font-size: 2.4rem; }}
+.kpis {{ display: grid; grid-template-columns: repeat(5, 1fr); gap: 1rem; margin: 1.5rem 0; }}
+.kpi {{ background: white; border-radius: 10px; padding: 1rem; box-shadow: 0 1px 4px rgba(0,0,0,.08); }}
+.kpi .label {{ color: #666; font-size: .9rem; }}
+.kpi .value {{ font-size: 1.8rem; font-weight: 600; }}
+.charts {{ display: grid; grid-template-columns: 1fr 1fr; gap: 1rem; }}
+.chart {{ background: white; border-radius: 10px; padding: .5rem; }}
+table {{ width: 100%; border-collapse: collapse; background: white; font-size: .9rem; }}
+th, td {{ padding: .4rem .6rem; border-bottom: 1px solid #eee; text-align: left; }}
+tr.near {{ background: #ffd6d6; }}
+.meta {{ color: #888; font-size: .8rem; }}
+</style>
+</head>
+<body>
+<div class="hero"><h1>🍽️ Food Rescue Platform</h1>
+<p>Connect surplus-food providers to receivers • Reduce waste • Fight hunger</p></div>
+<div class="kpis">{kpis}</div>
+<div class="charts">
+<div class="chart"><h3>📈 Claims Status Distribution</h3><div id="status"></div></div>
+<div class="chart"><h3>📊 Weekly Claims Trend</h3><div id="weekly"></div></div>
+</div>
+<h3>🍕 Available Food Listings</h3>
+<p class="meta">Quantity shown is the available quantity. Showing {shown} of {total} listings, soonest expiry first;
+highlighted rows expire within 3 days.</p>
+<table><thead><tr>{header}</tr></thead><tbody>{rows}</tbody></table>
+<p class="meta">Snapshot generated {generated_at} (data version {version}).</p>
+<script>
+var figures = {figures};
+for (var name in figures) {{
+  if (figures[name]) Plotly.newPlot(name, figures[name].data, figures[name].layout, {{responsive: true, displayModeBar: false}});
+}}
+</script>
+</body>
+</html>
+'''
+
+def _write_atomic(path, data):
+    """Write bytes via a temp file + rename, so viewers never read a half-written file"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def read_snapshot(out_dir=None):
+    """Published dashboard data, or None when nothing has been published"""
+    path = Path(out_dir or SNAPSHOT_DIR) / DATA_FILE
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+def _version():
+    try:
+        return current_version()
+    except sqlite3.OperationalError:
+        return None
+
+def build_snapshot():
+    """Dashboard data as a JSON-ready dict: KPIs, chart figures and the listings table"""
+    stats = get_dashboard_stats()
+    stats.refresh()
+    kpis = stats.snapshot()
+    listings = db.run_query(DASHBOARD_LISTINGS_QUERY)
+    table = listings_table(listings) if not listings.empty else listings
+    table = table.drop(columns=PRIVATE_COLUMNS, errors='ignore')
+    if not table.empty:
+        table = table.sort_values('expiry_date', kind='stable').head(SNAPSHOT_MAX_LISTINGS)
+        table.insert(len(table.columns), 'near_expiry', near_expiry(table))
+        table['expiry_date'] = table['expiry_date'].dt.strftime('%Y-%m-%d')
+    figures = {name: fig for name, fig in (('status', status_pie(kpis['status'])),
+                                           ('weekly', weekly_area(kpis['weekly'])))}
+    return {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'version': kpis['version'],
+        'counts': kpis['counts'],
+        'pct_completed': kpis['pct_completed'],
+        'figures': {name: json.loads(fig.to_json()) if fig is not None else None for name, fig in figures.items()},
+        'listings_total': len(listings),
+        'listings': json.loads(table.astype(object).to_json(orient='records')) if not table.empty else [],
+    }
+
+def render_html(data, plotly_js=PLOTLY_JS):
+    """Standalone HTML page for a snapshot"""
+    counts = data['counts']
+    kpis = [('🏪 Providers', counts.get('providers', 0)), ('🏥 Receivers', counts.get('receivers', 0)),
+            ('🍕 Listings', counts.get('listings', 0)), ('📋 Claims', counts.get('claims', 0)),
+            ('✅ Completed', f"{data['pct_completed']:.1f}%")]
+    listings = data['listings']
+    columns = [col for col in (listings[0] if listings else {}) if col != 'near_expiry']
+    rows = ''.join(
+        ('<tr class="near">' if row.get('near_expiry') else '<tr>')
+        + ''.join(f'<td>{html.escape("" if row[col] is None else str(row[col]))}</td>' for col in columns)
+        + '</tr>'
+        for row in listings)
+    return PAGE.format(
+        refresh=SNAPSHOT_REFRESH,
+        plotly_js=plotly_js,
+        kpis=''.join(f'<div class="kpi"><div class="label">{label}</div><div class="value">{html.escape(str(value))}</div></div>'
+                     for label, value in kpis),
+        shown=len(listings),
+        total=data['listings_total'],
+        header=''.join(f'<th>{html.escape(col)}</th>' for col in columns),
+        rows=rows,
+        generated_at=html.escape(data['generated_at']),
+        version=data['version'],
+        # </script> inside the data must not end the script block
+        figures=json.dumps(data['figures']).replace('</', '<\\/'),
+    )
+
+def publish_snapshot(out_dir=None, force=False):
+    """Write a new snapshot if the data changed (or it got old); returns a summary"""
+    out = Path(out_dir or SNAPSHOT_DIR)
+    previous = read_snapshot(out)
+    version = _version()
+    if previous is not None and not force and version is not None and previous['version'] == version:
+        age = time.time() - (out / DATA_FILE).stat().st_mtime
+        if age < SNAPSHOT_MAX_AGE:
+            return {'published': False, 'version': version, 'age_s': round(age)}
+    out.mkdir(parents=True, exist_ok=True)
+    if not (out / PLOTLY_JS).exists():
+        from plotly.offline import get_plotlyjs
+        _write_atomic(out / PLOTLY_JS, get_plotlyjs().encode())
+    data = build_snapshot()
+    payload = json.dumps(data, separators=(',', ':')).encode()
+    page = render_html(data).encode()
+    _write_atomic(out / DATA_FILE, payload)
+    _write_atomic(out / 'index.html', page)
+    return {'published': True, 'version': data['version'], 'listings': len(data['listings']),
+            'json_bytes': len(payload), 'html_bytes': len(page)}
+
+class SnapshotHandler(SimpleHTTPRequestHandler):
+    """Static file handler: revalidate the page and data, cache plotly.min.js"""
+
+    def end_headers(self):
+        if self.path.split('?')[0].endswith(PLOTLY_JS):
+            self.send_header('Cache-Control', 'public, max-age=86400')
+        else:
+            self.send_header('Cache-Control', 'no-cache')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(out_dir=None, host='0.0.0.0', port=8700):
+    """Serve the snapshot directory; the database is never touched"""
+    handler = partial(SnapshotHandler, directory=str(Path(out_dir or SNAPSHOT_DIR)))
+    server = ThreadingHTTPServer((host, port), handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Publish or serve static dashboard snapshots')
+    parser.add_argument('--out', default=str(SNAPSHOT_DIR), help='snapshot directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+    publish = sub.add_parser('publish', help='render the dashboard to static files')
+    publish.add_argument('--force', action='store_true', help='publish even if the data is unchanged')
+    serve_cmd = sub.add_parser('serve', help='serve the published files')
+    serve_cmd.add_argument('--host', default='0.0.0.0')
+    serve_cmd.add_argument('--port', type=int, default=8700)
+    args = parser.parse_args(argv)
+
+    if args.command == 'publish':
+        print(publish_snapshot(args.out, force=args.force))
+    else:
+        print(f'Serving {args.out} on http://{args.host}:{args.port}')
+        try:
+            serve(args.out, args.host, args.port)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Guarded ad-hoc SQL for analysts.
+
+Console queries run on a separate read-only connection (mode=ro plus
+PRAGMA query_only) whose authorizer only allows SELECT-type work: reading
+tables, calling functions and recursive CTEs. Writes, PRAGMAs, ATTACH and
+transaction control are refused before the statement runs.
+
+A progress handler checks every PROGRESS_STEPS virtual-machine steps
+whether the query has run past CONSOLE_TIMEOUT seconds or was cancelled,
+and aborts it if so. A runaway query therefore cannot hold its read snapshot
+(and with it the WAL checkpoint) open, or pin a worker. At most
+CONSOLE_WORKERS console queries run at once per process.
+
+Results are fetched a page at a time, never more than CONSOLE_PAGE_ROWS
+rows. Paging is keyset-based on a column the analyst names: the next page
+is `WHERE key > last key ORDER BY key`, so page 50 costs the same as page 1.
+The column must be unique and non-NULL: a page whose last key is NULL or
+repeats in the next row is refused, as `key > last` would skip rows.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import db
+from changefeed import current_version
+from typed_fetch import read_frame
+
+CONSOLE_TIMEOUT = float(os.environ.get('FOOD_RESCUE_CONSOLE_TIMEOUT', 10))
+CONSOLE_PAGE_ROWS = int(os.environ.get('FOOD_RESCUE_CONSOLE_PAGE_ROWS', 500))
+CONSOLE_WORKERS = int(os.environ.get('FOOD_RESCUE_CONSOLE_WORKERS', 2))
+CONSOLE_HISTORY = int(os.environ.get('FOOD_RESCUE_CONSOLE_HISTORY', 20))
+# Virtual-machine steps between timeout/cancel checks
+PROGRESS_STEPS = 10000
+# A console read waits at most this long for a lock
+CONSOLE_BUSY_TIMEOUT = 1.0
+
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+_DENIED_FUNCTIONS = {'load_extension'}
+_QUERY_KEYWORDS = ('select', 'with', 'values')
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+_workers = threading.BoundedSemaphore(CONSOLE_WORKERS)
+console_stats = {'queries': 0, 'timeouts': 0, 'cancelled': 0, 'rejected': 0, 'busy': 0}
+_stats_lock = threading.Lock()
+
+def _count(stat):
+    with _stats_lock:
+        console_stats[stat] += 1
+
+def console_metrics():
+    with _stats_lock:
+        return dict(console_stats)
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    if action not in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_FUNCTION and (arg2 or '').lower() in _DENIED_FUNCTIONS:
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+def console_connection():
+    """Read-only connection that only accepts SELECT statements"""
+    conn = sqlite3.connect(f'file:{db.DB_PATH}?mode=ro', uri=True, timeout=CONSOLE_BUSY_TIMEOUT,
+                           check_same_thread=False)
+    conn.execute('PRAGMA query_only = 1')
+    conn.set_authorizer(_authorizer)
+    return conn
+
+def clean_sql(sql):
+    """One statement without its trailing semicolon; ValueError otherwise"""
+    sql = (sql or '').strip().rstrip(';').strip()
+    if not sql:
+        raise ValueError('Enter a SELECT query')
+    if not sql.split(None, 1)[0].lower().startswith(_QUERY_KEYWORDS):
+        raise ValueError('Only read-only SELECT queries are allowed')
+    if ';' in sql and sqlite3.complete_statement(sql.split(';', 1)[0] + ';'):
+        raise ValueError('Only one statement can be run at a time')
+    return sql
+
+def page_sql(sql, key=None, after=None, limit=CONSOLE_PAGE_ROWS):
+    """(paged SQL, params) fetching one row more than `limit` to tell if there is a next page"""
+    # Newline so a trailing -- comment cannot swallow the closing parenthesis
+    sql = clean_sql(sql) + '\n'
+    if key is None:
+        return f'SELECT * FROM ({sql}) LIMIT ?', [limit + 1]
+    if not _IDENTIFIER.match(key):
+        raise ValueError(f'Invalid page-by column: {key}')
+    if after is None:
+        return f'SELECT * FROM ({sql}) ORDER BY "{key}" LIMIT ?', [limit + 1]
+    return f'SELECT * FROM ({sql}) WHERE "{key}" > ? ORDER BY "{key}" LIMIT ?', [after, limit + 1]
+
+class ConsoleQuery:
+    """One console query page, run on its own thread so it can be cancelled"""
+
+    def __init__(self, sql, key=None, after=None, limit=CONSOLE_PAGE_ROWS, timeout=CONSOLE_TIMEOUT):
+        self.sql = sql
+        self.key = key
+        self.after = after
+        self.limit = limit
+        self.timeout = timeout
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.started = None
+        self.elapsed = None
+        self.frame = None
+        self.has_more = False
+        self.version = None
+        self.error = None
+        self.status = 'pending'
+
+    def _progress(self):
+        # Non-zero aborts the statement with "interrupted"
+        if self.cancelled.is_set():
+            return 1
+        return 1 if time.monotonic() - self.started > self.timeout else 0
+
+    def _run(self):
+        conn = None
+        try:
+            paged, params = page_sql(self.sql, self.key, self.after, self.limit)
+            conn = console_connection()
+            conn.set_progress_handler(self._progress, PROGRESS_STEPS)
+            self.version = current_version(conn)
+            frame = read_frame(conn, paged, params)
+            self.has_more = len(frame) > self.limit
+            if self.has_more and self.key in frame.columns:
+                # The extra row shares the page's last key (or it is NULL): `key > last` would skip rows
+                last, extra = frame[self.key].iloc[self.limit - 1], frame[self.key].iloc[self.limit]
+                if pd.isna(last) or last == extra:
+                    raise ValueError(f'Page-by column "{self.key}" is not unique (or has NULLs); '
+                                     'page by a unique column such as an id')
+            self.frame = frame.iloc[:self.limit]
+            self.status = 'ok'
+        except ValueError as e:
+            self.error, self.status = str(e), 'rejected'
+        except sqlite3.DatabaseError as e:
+            if 'interrupted' in str(e) and self.cancelled.is_set():
+                self.error, self.status = 'Query cancelled', 'cancelled'
+            elif 'interrupted' in str(e):
+                self.error, self.status = f'Query stopped after {self.timeout:g}s timeout', 'timeout'
+            elif 'not authorized' in str(e) or 'readonly' in str(e):
+                self.error, self.status = 'Only read-only SELECT queries are allowed', 'rejected'
+            else:
+                self.error, self.status = str(e), 'error'
+        finally:
+            if conn is not None:
+                conn.close()
+            self.elapsed = time.monotonic() - self.started
+            _workers.release()
+            _count('queries')
+            if self.status in ('timeout', 'cancelled', 'rejected'):
+                _count({'timeout': 'timeouts'}.get(self.status, self.status))
+            self.done.set()
+
+    def start(self):
+        """Start on a worker thread; False when all console workers are busy"""
+        if not _workers.acquire(blocking=False):
+            _count('busy')
+            self.error, self.status = 'The SQL console is busy, try again shortly', 'busy'
+            self.done.set()
+            return False
+        self.started = time.monotonic()
+        self.status = 'running'
+        threading.Thread(target=self._run, name='food-rescue-console', daemon=True).start()
+        return True
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def wait(self, interval=None):
+        """Block until done (or `interval` seconds pass); returns True when done"""
+        return self.done.wait(interval)
+
+    @property
+    def next_after(self):
+        """Key value to pass as `after` for the next page, or None on the last page"""
+        if not self.has_more or self.key is None or self.frame is None or self.key not in self.frame.columns:
+            return None
+        value = self.frame[self.key].iloc[-1]
+        return value.item() if hasattr(value, 'item') else value
+
+class QueryHistory:
+    """Recent console queries with their result pages, newest first"""
+
+    def __init__(self, size=CONSOLE_HISTORY):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def key(self, sql, key, after):
+        return (' '.join(clean_sql(sql).split()), key, after)
+
+    def get(self, sql, key, after):
+        """Cached page while the database is unchanged since it was read, else None"""
+        try:
+            entry = self.entries.get(self.key(sql, key, after))
+        except ValueError:
+            return None
+        if entry is None or entry.status != 'ok':
+            return None
+        try:
+            conn = console_connection()
+            try:
+                version = current_version(conn)
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            return None
+        return entry if version == entry.version else None
+
+    def add(self, query):
+        try:
+            key = self.key(query.sql, query.key, query.after)
+        except ValueError:
+            return
+        self.entries[key] = query
+        self.entries.move_to_end(key, last=False)
+        while len(self.entries) > self.size:
+            self.entries.popitem()
+
+    def rows(self):
+        """History as rows for a table"""
+        return [{
+            'sql': ' '.join(query.sql.split())[:120],
+            'page by': query.key or '',
+            'after': '' if query.after is None else str(query.after),
+            'status': query.status,
+            'rows': 0 if query.frame is None else len(query.frame),
+            'seconds': round(query.elapsed or 0, 3),
+        } for query in self.entries.values()]
@@ -0,0 +1,47 @@
+"""Once-per-process startup work for the Streamlit app.
+
+Streamlit re-executes the app script on every rerun, so anything done at its
+top level is paid again on each click. Work that only needs to happen when
+something changed (database creation and migrations) goes through
+run_when_changed(), and static assets are read and minified once per
+process by stylesheet(). State lives here, in an imported module, because
+the app script's own globals are reset on every rerun.
+"""
+import re
+import threading
+import time
+from pathlib import Path
+
+ASSETS_DIR = Path(__file__).resolve().parent / 'assets'
+
+_stamps = {}
+_assets = {}
+_lock = threading.Lock()
+startup_timings = {}
+
+def run_when_changed(name, stamp, fn):
+    """Run fn() unless it already ran in this process for the current stamp(); True if it ran
+
+    Other sessions arriving meanwhile wait for the first one to finish.
+    """
+    with _lock:
+        if name in _stamps and _stamps[name] == stamp():
+            return False
+        started = time.perf_counter()
+        fn()
+        startup_timings[name] = round(time.perf_counter() - started, 4)
+        # Stamp after fn: its own changes (e.g. migrations) must not trigger a rerun
+        _stamps[name] = stamp()
+        return True
+
+def _minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{}:;,>])\s*', r'\1', css).strip()
+
+def stylesheet(name):
+    """<style> block for assets/<name>, minified on first use and cached"""
+    with _lock:
+        if name not in _assets:
+            _assets[name] = f'<style>{_minify_css((ASSETS_DIR / name).read_text(encoding="utf-8"))}</style>'
+        return _assets[name]
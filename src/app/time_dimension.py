@@ -0,0 +1,154 @@
+"""Integer time columns on claims and a calendar dimension table.
+
+claims.timestamp is text, so grouping by strftime(...) can't use an index.
+Triggers keep three integer columns in step with it:
+
+    ts_epoch  unix seconds
+    ts_day    days since 1970-01-01 (calendar.day)
+    ts_week   year * 100 + '%W' week, so labels match the old '%Y-W%W'
+
+and the calendar table maps a day to its week/month/year buckets and labels.
+"""
+from datetime import date
+
+CLAIM_TABLES = ('claims', 'claims_archive')
+
+TIME_COLUMNS = {
+    'ts_epoch': "CAST(strftime('%s', {ts}) AS INTEGER)",
+    'ts_day': "CAST(julianday(date({ts})) - 2440587.5 AS INTEGER)",
+    'ts_week': "CAST(strftime('%Y', {ts}) AS INTEGER) * 100 + CAST(strftime('%W', {ts}) AS INTEGER)",
+}
+
+# bucket -> (group key, label expression); `c` is the claims source, `cal` the calendar
+BUCKETS = {
+    'hour': ('c.ts_epoch / 3600', "strftime('%Y-%m-%d %H:00', (c.ts_epoch / 3600) * 3600, 'unixepoch')"),
+    'day': ('c.ts_day', 'cal.date'),
+    'week': ('c.ts_week', 'cal.week_label'),
+    'month': ('cal.month', 'cal.month_label'),
+    'year': ('cal.year', 'cal.year'),
+}
+
+_EPOCH = date(1970, 1, 1)
+
+CALENDAR_ROW = '''
+    SELECT {day},
+           date({day} * 86400, 'unixepoch'),
+           CAST(strftime('%Y', {day} * 86400, 'unixepoch') AS INTEGER),
+           CAST(strftime('%Y%m', {day} * 86400, 'unixepoch') AS INTEGER),
+           strftime('%Y-%m', {day} * 86400, 'unixepoch'),
+           CAST(strftime('%Y', {day} * 86400, 'unixepoch') AS INTEGER) * 100
+               + CAST(strftime('%W', {day} * 86400, 'unixepoch') AS INTEGER),
+           strftime('%Y-W%W', {day} * 86400, 'unixepoch'),
+           CAST(strftime('%w', {day} * 86400, 'unixepoch') AS INTEGER)
+'''
+
+def day_number(value):
+    """Convert a date/datetime to the ts_day / calendar.day integer"""
+    if hasattr(value, 'date'):
+        value = value.date()
+    return (value - _EPOCH).days
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def extend_calendar(conn, first_day, last_day):
+    """Make sure calendar has a row for every day in [first_day, last_day]"""
+    conn.execute(f'''
+        WITH RECURSIVE days(d) AS (
+            SELECT ? UNION ALL SELECT d + 1 FROM days WHERE d < ?
+        )
+        INSERT OR IGNORE INTO calendar(day, date, year, month, month_label, week, week_label, dow)
+        {CALENDAR_ROW.format(day='d')} FROM days
+    ''', (first_day, last_day))
+
+def _is_current(conn):
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger', 'index')")}
+    required = {'calendar', 'claims_time_ai', 'claims_time_au', 'idx_claims_ts_day'}
+    if 'claims_archive' in names:
+        required.add('idx_claims_archive_ts_day')
+    return required <= names
+
+def ensure_time_columns(conn):
+    """Add time columns, triggers, indexes and the calendar; backfill existing rows"""
+    # Runs on every rerun via migrate_database, so skip the backfill scan once set up
+    if _is_current(conn):
+        return
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS calendar (
+            day INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            month_label TEXT NOT NULL,
+            week INTEGER NOT NULL,
+            week_label TEXT NOT NULL,
+            dow INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_calendar_week ON calendar(week)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_calendar_month ON calendar(month)")
+
+    for table in CLAIM_TABLES:
+        existing = _columns(conn, table)
+        if not existing:
+            continue
+        for column in TIME_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        assignments = ', '.join(f"{col} = {expr.format(ts='timestamp')}" for col, expr in TIME_COLUMNS.items())
+        conn.execute(f"UPDATE {table} SET {assignments} WHERE ts_epoch IS NULL AND timestamp IS NOT NULL")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts_day ON {table}(ts_day)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts_week ON {table}(ts_week)")
+
+    if _columns(conn, 'claims'):
+        assignments = ', '.join(f"{col} = {expr.format(ts='NEW.timestamp')}" for col, expr in TIME_COLUMNS.items())
+        new_day = TIME_COLUMNS['ts_day'].format(ts='NEW.timestamp')
+        # Writers keep inserting plain timestamps; the triggers fill the integer
+        # columns and grow the calendar so every ts_day has a matching row
+        for name, event in (('claims_time_ai', 'AFTER INSERT ON claims'),
+                            ('claims_time_au', 'AFTER UPDATE OF timestamp ON claims')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {name} {event}
+                BEGIN
+                    UPDATE claims SET {assignments} WHERE claim_id = NEW.claim_id;
+                    INSERT OR IGNORE INTO calendar(day, date, year, month, month_label, week, week_label, dow)
+                    {CALENDAR_ROW.format(day=new_day)} WHERE NEW.timestamp IS NOT NULL;
+                END
+            ''')
+
+    first_day, last_day = None, None
+    for table in CLAIM_TABLES:
+        if _columns(conn, table):
+            lo, hi = conn.execute(f"SELECT MIN(ts_day), MAX(ts_day) FROM {table}").fetchone()
+            if lo is not None:
+                first_day = lo if first_day is None else min(first_day, lo)
+                last_day = hi if last_day is None else max(last_day, hi)
+    today = day_number(date.today())
+    extend_calendar(conn, min(first_day, today) if first_day is not None else today,
+                    max(last_day, today + 365) if last_day is not None else today + 365)
+    conn.commit()
+
+def claims_time_series_query(bucket='week', source='claims_all', label='week', start=None, end=None):
+    """SQL (and params) counting claims per time bucket, optionally within a date range"""
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}' (choose from {list(BUCKETS)})")
+    key, label_expr = BUCKETS[bucket]
+    where, params = [], []
+    if start is not None:
+        where.append('c.ts_day >= ?')
+        params.append(day_number(start))
+    if end is not None:
+        where.append('c.ts_day <= ?')
+        params.append(day_number(end))
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ''
+    # Group by the label too so engines stricter than SQLite (DuckDB) accept it
+    group_by = key if key == label_expr else f'{key}, {label_expr}'
+    sql = f'''
+        SELECT {label_expr} AS {label}, COUNT(*) AS claims
+        FROM {source} c
+        JOIN calendar cal ON cal.day = c.ts_day
+        {where_sql}
+        GROUP BY {group_by}
+        ORDER BY {key}
+    '''
+    return sql, tuple(params)
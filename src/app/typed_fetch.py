@@ -0,0 +1,201 @@
+"""Column-wise fetch path for query results.
+
+pd.read_sql_query() fetches every row as a tuple (or, with the sqlite3.Row
+factory our connections use, as a Row it must first turn back into a
+tuple), builds a 2-D object array from them and only then infers each
+column's dtype. read_frame() instead pulls batches of plain tuples from the
+cursor, transposes each batch once and writes it straight into
+preallocated per-column NumPy buffers. Integer and real columns go into
+int64/float64 buffers at C speed, and only text stays as Python objects.
+A column's buffer type comes from KNOWN_COLUMN_TYPES, or from the first
+batch for unknown columns, and is widened on the fly (int -> float when
+NULLs or reals show up, anything -> object for mixed values), so the result
+matches pd.read_sql_query() for SQLite's dynamic typing. A column that
+holds only NULLs stays an object column of None, as read_sql_query leaves it.
+
+    python src/app/typed_fetch.py --rows 100000,1000000,10000000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FAST_FETCH = os.environ.get('FOOD_RESCUE_FAST_FETCH', '1') != '0'
+FETCH_BATCH_SIZE = 50000
+INITIAL_CAPACITY = 1024
+
+# Columns whose SQLite type is known from the schema (anything else is inferred)
+KNOWN_COLUMN_TYPES = {
+    **dict.fromkeys(('provider_id', 'receiver_id', 'food_id', 'claim_id', 'quantity', 'claimed_quantity',
+                     'total_claimed', 'available_quantity', 'ts_day', 'ts_week', 'ts_epoch', 'version',
+                     'row_key', 'count', 'listings', 'claims'), 'int'),
+    **dict.fromkeys(('name', 'address', 'contact', 'food_name', 'provider_name', 'provider_contact',
+                     'city', 'type', 'provider_type', 'location', 'food_type', 'meal_type', 'status',
+                     'expiry_date', 'timestamp', 'ts_utc'), 'text'),
+}
+
+def _kind_of(value):
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    return 'text'
+
+class _ColumnBuffer:
+    """Growable NumPy buffer for one result column"""
+
+    DTYPES = {'int': np.int64, 'float': np.float64, 'text': object}
+
+    def __init__(self, kind, capacity):
+        self.kind = kind
+        self.data = np.empty(capacity, dtype=self.DTYPES[kind])
+        # read_sql_query leaves a column with no values at all as object Nones
+        self.seen = False
+
+    def grow(self, capacity):
+        data = np.empty(capacity, dtype=self.data.dtype)
+        data[:len(self.data)] = self.data
+        self.data = data
+
+    def _widen(self, kind, n):
+        # int -> float keeps values; anything -> text boxes what was filled so far
+        data = np.empty(len(self.data), dtype=self.DTYPES[kind])
+        data[:n] = self.data[:n]
+        self.kind, self.data = kind, data
+
+    def put(self, values, n):
+        """Write one batch (a 1-D object array) at offset n"""
+        k = len(values)
+        if not self.seen:
+            self.seen = bool(pd.notna(values).any())
+        if self.kind != 'text':
+            inferred = pd.api.types.infer_dtype(values, skipna=True)
+            if inferred == 'integer' and self.kind == 'int':
+                try:
+                    values = values.astype(np.int64)
+                except TypeError:
+                    # NULLs among integers: NaN in a float column, as read_sql_query gives
+                    self._widen('float', n)
+                except OverflowError:
+                    self._widen('text', n)
+            elif inferred in ('integer', 'floating', 'mixed-integer-float', 'empty'):
+                if self.kind == 'int':
+                    self._widen('float', n)
+            else:
+                self._widen('text', n)
+            if self.kind == 'float':
+                values = values.astype(np.float64)
+        self.data[n:n + k] = values
+
+    def finish(self, n):
+        if not self.seen:
+            return np.full(n, None, dtype=object)
+        data = self.data[:n]
+        # Same string dtype read_sql_query gives; mixed/binary columns stay object
+        if self.kind == 'text' and pd.api.types.infer_dtype(data, skipna=True) in ('string', 'empty'):
+            return pd.array(data, dtype='str')
+        return data
+
+def read_frame(conn, query, params=None, batch_size=FETCH_BATCH_SIZE):
+    """Run a query and return its result as a DataFrame, filled column by column"""
+    cursor = conn.cursor()
+    # Plain tuples whatever row_factory the connection was given
+    cursor.row_factory = None
+    try:
+        cursor.execute(query, params or ())
+        names = [col[0] for col in cursor.description]
+        columns = None
+        capacity = INITIAL_CAPACITY
+        n = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            k = len(rows)
+            if columns is None:
+                capacity = max(capacity, k)
+                columns = [_ColumnBuffer(KNOWN_COLUMN_TYPES.get(name) or _kind_of(
+                    next((row[i] for row in rows if row[i] is not None), '')), capacity)
+                    for i, name in enumerate(names)]
+            if n + k > capacity:
+                while n + k > capacity:
+                    capacity *= 2
+                for column in columns:
+                    column.grow(capacity)
+            # One C-level transpose per batch instead of a tuple per cell
+            block = np.array(rows, dtype=object)
+            for i, column in enumerate(columns):
+                column.put(block[:, i], n)
+            n += k
+    finally:
+        cursor.close()
+    if columns is None:
+        return pd.DataFrame(columns=names)
+    frame = pd.DataFrame(dict(enumerate(column.finish(n) for column in columns)))
+    frame.columns = names
+    return frame
+
+def fetch_frame(conn, query, params=None):
+    """read_frame(), or pd.read_sql_query() with FOOD_RESCUE_FAST_FETCH=0"""
+    if FAST_FETCH:
+        return read_frame(conn, query, params)
+    return pd.read_sql_query(query, conn, params=params or None)
+
+def _build_claims(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE claims (claim_id INTEGER PRIMARY KEY, food_id INTEGER, receiver_id INTEGER,
+                             claimed_quantity INTEGER, status TEXT, timestamp DATETIME);
+    ''')
+    conn.execute('''
+        WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < ?)
+        INSERT INTO claims
+        SELECT i, i % 50000 + 1, i % 20000 + 1, CASE WHEN i % 97 = 0 THEN NULL ELSE i % 40 + 1 END,
+               CASE i % 3 WHEN 0 THEN 'Pending' WHEN 1 THEN 'Completed' ELSE 'Cancelled' END,
+               datetime('2024-01-01', '+' || (i % 40000) || ' minutes')
+        FROM seq
+    ''', (rows,))
+    conn.commit()
+    conn.close()
+
+def _time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark read_frame against pd.read_sql_query')
+    parser.add_argument('--rows', default='100000,1000000', help='comma-separated claim counts')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'read_sql (Row)':>15} {'read_sql':>10} {'read_frame':>11} {'speedup':>8}")
+    for rows in (int(r) for r in args.rows.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'claims.db'
+            _build_claims(path, rows)
+            conn = sqlite3.connect(path)
+            query = 'SELECT * FROM claims'
+            plain, expected = _time(lambda: pd.read_sql_query(query, conn), args.repeat)
+            conn.row_factory = sqlite3.Row
+            with_row, _ = _time(lambda: pd.read_sql_query(query, conn), args.repeat)
+            fast, frame = _time(lambda: read_frame(conn, query), args.repeat)
+            conn.close()
+        pd.testing.assert_frame_equal(frame, expected, check_dtype=False)
+        print(f'{rows:>10} {with_row:>14.3f}s {plain:>9.3f}s {fast:>10.3f}s {with_row / fast:>7.2f}x')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
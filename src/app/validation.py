@@ -0,0 +1,381 @@
+"""Declarative, vectorized validation for CSV imports.
+
+Each table has a schema of column rules (type, required, range, allowed
+values, uniqueness, foreign key). A chunk of rows is checked one column at a
+time with pandas operations instead of row by row; rows that break any rule
+are written to a reject CSV together with their line number and every reason,
+and the remaining rows are loaded.
+
+    python src/app/validation.py data/claims_data.csv --table claims
+"""
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import db
+from coordination import retry_on_busy
+from entity_resolution import normalize_phone
+
+CHUNK_SIZE = 100000
+REJECT_DIR = db.ROOT / 'data' / 'rejects'
+
+DATE_FORMATS = ('%m/%d/%Y', 'ISO8601', 'mixed')
+DATETIME_FORMATS = ('%m/%d/%Y %H:%M', 'ISO8601', 'mixed')
+CLAIM_STATUSES = ('Pending', 'Completed', 'Cancelled')
+BULK_CHUNK_SIZE = 5000
+NORMALIZERS = {'phone': normalize_phone}
+
+# table -> column -> rule. Rule keys:
+#   type        'int' | 'text' | 'date' | 'datetime'
+#   required    value must be present (and the column must exist)
+#   min / max   inclusive numeric bounds
+#   choices     allowed values
+#   unique      no repeats within the file or the table (first occurrence wins)
+#   references  (table, column) the value must already exist in
+#   normalize   key function applied before the unique check ('phone')
+#   available   claimed quantities must fit the listing's unclaimed quantity
+#   region      city must belong to the region shard this process serves (once split)
+IMPORT_SCHEMAS = {
+    'providers': {
+        'provider_id': {'type': 'int', 'required': True, 'unique': True, 'min': 1},
+        'name': {'type': 'text', 'required': True},
+        'type': {'type': 'text'},
+        'address': {'type': 'text'},
+        'city': {'type': 'text'},
+        'contact': {'type': 'text', 'unique': True, 'normalize': 'phone'},
+    },
+    'receivers': {
+        'receiver_id': {'type': 'int', 'required': True, 'unique': True, 'min': 1},
+        'name': {'type': 'text'},
+        'type': {'type': 'text'},
+        'city': {'type': 'text'},
+        'contact': {'type': 'text', 'unique': True, 'normalize': 'phone'},
+    },
+    'food_listings': {
+        'food_id': {'type': 'int', 'required': True, 'unique': True, 'min': 1},
+        'food_name': {'type': 'text'},
+        'quantity': {'type': 'int', 'min': 0},
+        'expiry_date': {'type': 'date', 'required': True},
+        'provider_id': {'type': 'int', 'required': True, 'references': ('providers', 'provider_id')},
+        'provider_type': {'type': 'text'},
+        'location': {'type': 'text'},
+        'food_type': {'type': 'text'},
+        'meal_type': {'type': 'text'},
+    },
+    'claims': {
+        'claim_id': {'type': 'int', 'required': True, 'unique': True, 'min': 1},
+        'food_id': {'type': 'int', 'required': True, 'references': ('food_listings', 'food_id')},
+        'receiver_id': {'type': 'int', 'required': True, 'references': ('receivers', 'receiver_id')},
+        'claimed_quantity': {'type': 'int', 'min': 0},
+        'status': {'type': 'text', 'required': True, 'choices': CLAIM_STATUSES},
+        'timestamp': {'type': 'datetime', 'required': True},
+    },
+}
+
+PRIMARY_KEYS = {table: next(iter(schema)) for table, schema in IMPORT_SCHEMAS.items()}
+
+# Uploads through the UI are new activity rather than history: claims need a
+# quantity that is still available, and may leave status/timestamp blank
+BULK_RULES = {
+    'providers': {'city': {'region': True}},
+    'receivers': {'city': {'region': True}},
+    'claims': {'claimed_quantity': {'required': True, 'min': 1, 'available': True}},
+}
+BULK_DEFAULTS = {
+    'claims': {'status': 'Pending', 'timestamp': lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S')},
+}
+
+def bulk_schema(table):
+    """Import schema with the stricter upload rules merged in"""
+    schema = {col: dict(rule) for col, rule in IMPORT_SCHEMAS[table].items()}
+    for col, extra in BULK_RULES.get(table, {}).items():
+        schema[col].update(extra)
+    return schema
+
+def normalize_columns(df):
+    """Lowercase column names with underscores, as the CSV headers are 'Food_ID' style"""
+    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+    return df
+
+def _blank_to_na(raw):
+    if raw.dtype == object or pd.api.types.is_string_dtype(raw):
+        raw = raw.astype('string').str.strip()
+        raw = raw.mask(raw == '')
+    return raw
+
+def _parse_datetimes(raw, formats):
+    parsed = pd.Series(pd.NaT, index=raw.index, dtype='datetime64[ns]')
+    for fmt in formats:
+        pending = parsed.isna() & raw.notna()
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(raw[pending], format=fmt, errors='coerce')
+    return parsed
+
+def coerce_column(raw, rule):
+    """Convert a raw column to its rule type; returns (values, invalid mask)"""
+    raw = _blank_to_na(raw)
+    kind = rule.get('type', 'text')
+    if kind == 'int':
+        numbers = pd.to_numeric(raw, errors='coerce')
+        invalid = raw.notna() & (numbers.isna() | (numbers % 1 != 0))
+        return numbers.mask(invalid).astype('Int64'), invalid
+    if kind in ('date', 'datetime'):
+        parsed = _parse_datetimes(raw, DATE_FORMATS if kind == 'date' else DATETIME_FORMATS)
+        invalid = raw.notna() & parsed.isna()
+        fmt = '%Y-%m-%d' if kind == 'date' else '%Y-%m-%d %H:%M:%S'
+        return parsed.dt.strftime(fmt).astype('string'), invalid
+    return raw.astype('string'), pd.Series(False, index=raw.index)
+
+class TableValidator:
+    """Validates successive chunks of one table's CSV against its schema"""
+
+    def __init__(self, table, conn, schema=None):
+        self.table = table
+        self.conn = conn
+        self.schema = schema or IMPORT_SCHEMAS[table]
+        # Unique keys and foreign keys are checked against what is already in the database
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        self.seen = {}
+        for col, rule in self.schema.items():
+            if rule.get('unique'):
+                rows = conn.execute(f"SELECT {col} FROM {table} WHERE {col} IS NOT NULL") if col in existing else []
+                self.seen[col] = set(self._unique_key(col, pd.Series([row[0] for row in rows], dtype=object)).dropna())
+        self.known = {}
+        for col, rule in self.schema.items():
+            if 'references' in rule:
+                ref_table, ref_col = rule['references']
+                self.known[col] = pd.Index([row[0] for row in conn.execute(f"SELECT {ref_col} FROM {ref_table}")])
+
+    def _unique_key(self, col, column):
+        normalize = self.schema[col].get('normalize')
+        return NORMALIZERS[normalize](column) if normalize else column
+
+    def _available(self, food_ids):
+        """Unclaimed quantity per listing, counting claims already in the table"""
+        available = {}
+        for start in range(0, len(food_ids), 500):
+            part = [int(i) for i in food_ids[start:start + 500]]
+            available.update(self.conn.execute(f'''
+                SELECT f.food_id, COALESCE(f.quantity, 0) - COALESCE(SUM(c.claimed_quantity), 0)
+                FROM food_listings f
+                LEFT JOIN claims c ON c.food_id = f.food_id AND c.status != 'Cancelled'
+                WHERE f.food_id IN ({', '.join('?' for _ in part)})
+                GROUP BY f.food_id
+            ''', part).fetchall())
+        return pd.Series(available, dtype='float64')
+
+    def _over_claimed(self, values, col, ok):
+        """Rows whose running total per listing (in file order) passes what is left"""
+        counted = ok & values[col].notna()
+        if 'status' in values:
+            counted &= (values['status'] != 'Cancelled').fillna(True)
+        food_ids = values['food_id'][counted]
+        running = values[col][counted].groupby(food_ids).cumsum()
+        limit = food_ids.map(self._available(food_ids.unique().tolist())).fillna(0)
+        over = pd.Series(False, index=ok.index)
+        over[running.index] = (running > limit).to_numpy()
+        return over
+
+    def validate(self, chunk):
+        """Split a raw chunk into (good rows typed for insert, rejected raw rows with reasons)
+
+        The chunk's index is reported as the line number of rejected rows.
+        """
+        chunk = normalize_columns(chunk.copy())
+        index = chunk.index
+        reasons = pd.Series('', index=index, dtype=object)
+        values = {}
+
+        def fail(mask, reason):
+            if mask.any():
+                reasons[mask] = reasons[mask] + reason + '; '
+
+        for col, rule in self.schema.items():
+            if col not in chunk.columns:
+                if rule.get('required'):
+                    fail(pd.Series(True, index=index), f'missing column {col}')
+                continue
+            column, invalid = coerce_column(chunk[col], rule)
+            values[col] = column
+            fail(invalid, f"{col}: not a valid {rule.get('type', 'text')}")
+            present = column.notna()
+            if rule.get('required'):
+                fail(~present & ~invalid, f'{col} is required')
+            if 'min' in rule:
+                fail(present & (column < rule['min']).fillna(False), f"{col} < {rule['min']}")
+            if 'max' in rule:
+                fail(present & (column > rule['max']).fillna(False), f"{col} > {rule['max']}")
+            if 'choices' in rule:
+                fail(present & ~column.isin(rule['choices']), f"{col} not one of {', '.join(rule['choices'])}")
+            if rule.get('region') and db.REGION is not None:
+                regions = {city: db.region_for_city(city) for city in column.dropna().unique()}
+                fail(present & (column.map(regions) != db.REGION).fillna(False), f'{col} belongs to another region shard')
+            if col in self.known:
+                ref_table, ref_col = rule['references']
+                fail(present & ~column.isin(self.known[col]), f'{col} not found in {ref_table}.{ref_col}')
+
+        # Uniqueness last, so a row rejected for other reasons doesn't claim its key
+        ok = reasons == ''
+        for col, seen in self.seen.items():
+            if col not in values:
+                continue
+            column = self._unique_key(col, values[col])
+            candidate = ok & column.notna()
+            keys = column[candidate]
+            duplicate = keys.duplicated(keep='first') | keys.isin(seen)
+            duplicate_mask = pd.Series(False, index=index)
+            duplicate_mask[keys.index] = duplicate.to_numpy()
+            fail(duplicate_mask, f'duplicate {col}')
+            ok &= ~duplicate_mask
+        for col, rule in self.schema.items():
+            if rule.get('available') and col in values and 'food_id' in values:
+                over = self._over_claimed(values, col, ok)
+                fail(over, f'{col} exceeds the available quantity')
+                ok &= ~over
+        for col, seen in self.seen.items():
+            if col in values:
+                seen.update(self._unique_key(col, values[col])[ok].dropna().tolist())
+
+        good = pd.DataFrame({col: column[ok] for col, column in values.items()})
+        rejected = chunk[~ok].copy()
+        rejected.insert(0, 'line', rejected.index)
+        rejected['reasons'] = reasons[~ok].str.rstrip('; ')
+        return good, rejected
+
+def _insert_rows(conn, table, good):
+    if good.empty:
+        return 0
+    # Validated columns the table doesn't have (e.g. before a migration) are left out
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    columns = [col for col in good.columns if col in existing]
+    good = good[columns]
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    rows = good.astype(object).where(good.notna(), None)
+    conn.executemany(query, rows.itertuples(index=False, name=None))
+    return len(good)
+
+def reject_path(table, reject_dir=None):
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Path(reject_dir or REJECT_DIR) / f'{table}_rejects_{stamp}.csv'
+
+def _record_rejects(summary, rejected, reject_dir):
+    if rejected.empty:
+        return
+    if summary['reject_file'] is None:
+        path = reject_path(summary['table'], reject_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rejected.to_csv(path, index=False)
+        summary['reject_file'] = str(path)
+    else:
+        rejected.to_csv(summary['reject_file'], mode='a', header=False, index=False)
+    summary['rejected'] += len(rejected)
+    for reason, count in rejected['reasons'].str.split('; ').explode().value_counts().items():
+        summary['reasons'][reason] = summary['reasons'].get(reason, 0) + int(count)
+
+def _read_chunks(source, chunk_size):
+    """Raw CSV chunks with normalized headers, indexed by file line number"""
+    line = 2
+    for chunk in pd.read_csv(source, dtype=str, chunksize=chunk_size, skipinitialspace=True):
+        chunk.index = pd.RangeIndex(line, line + len(chunk))
+        line += len(chunk)
+        yield normalize_columns(chunk)
+
+def import_table(conn, table, csv_path, reject_dir=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Validate a CSV chunk by chunk, insert the good rows and write rejects; returns a summary
+
+    The caller owns the transaction (nothing is committed here).
+    progress, if given, is called as progress(rows_read) after each chunk.
+    """
+    validator = TableValidator(table, conn)
+    summary = {'table': table, 'rows': 0, 'loaded': 0, 'rejected': 0, 'reject_file': None, 'reasons': {}}
+    for chunk in _read_chunks(csv_path, chunk_size):
+        good, rejected = validator.validate(chunk)
+        summary['rows'] += len(chunk)
+        summary['loaded'] += _insert_rows(conn, table, good)
+        _record_rejects(summary, rejected, reject_dir)
+        if progress is not None:
+            progress(summary['rows'])
+    return summary
+
+def _assign_ids(conn, table, chunk, last_assigned):
+    """Fill blank primary keys with fresh IDs above everything in the table and the file"""
+    pk = PRIMARY_KEYS[table]
+    if pk not in chunk.columns:
+        chunk[pk] = pd.NA
+    blank = chunk[pk].isna() | (chunk[pk].astype('string').str.strip() == '')
+    if not blank.any():
+        return last_assigned
+    current = conn.execute(f"SELECT MAX({pk}) FROM {table}").fetchone()[0] or 0
+    given = pd.to_numeric(chunk.loc[~blank, pk], errors='coerce').max()
+    start = int(max(current, last_assigned, 0 if pd.isna(given) else given)) + 1
+    ids = range(start, start + int(blank.sum()))
+    chunk.loc[blank, pk] = [str(i) for i in ids]
+    return ids[-1]
+
+def bulk_import(table, source, chunk_size=BULK_CHUNK_SIZE, progress=None, reject_dir=None):
+    """Upload path: assign IDs, validate and insert, one short write transaction per chunk
+
+    Unlike import_table this commits as it goes, so other writers are only
+    blocked for one chunk at a time and a failure keeps the chunks already loaded.
+    """
+    conn = db.get_db_connection()
+    conn.isolation_level = None
+    summary = {'table': table, 'rows': 0, 'loaded': 0, 'rejected': 0, 'reject_file': None, 'reasons': {}, 'first_id': None, 'last_id': None}
+    try:
+        validator = TableValidator(table, conn, schema=bulk_schema(table))
+        last_assigned = 0
+        for chunk in _read_chunks(source, chunk_size):
+            for column, default in BULK_DEFAULTS.get(table, {}).items():
+                value = default() if callable(default) else default
+                chunk[column] = chunk[column].fillna(value) if column in chunk.columns else value
+            retry_on_busy(conn.execute, 'BEGIN IMMEDIATE')
+            try:
+                # IDs are taken inside the write transaction so concurrent forms can't reuse them
+                last_assigned = _assign_ids(conn, table, chunk, last_assigned)
+                good, rejected = validator.validate(chunk)
+                loaded = _insert_rows(conn, table, good)
+                retry_on_busy(conn.execute, 'COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            if loaded:
+                ids = good[PRIMARY_KEYS[table]]
+                summary['first_id'] = int(ids.min()) if summary['first_id'] is None else min(summary['first_id'], int(ids.min()))
+                summary['last_id'] = max(summary['last_id'] or 0, int(ids.max()))
+            summary['rows'] += len(chunk)
+            summary['loaded'] += loaded
+            _record_rejects(summary, rejected, reject_dir)
+            if progress is not None:
+                progress(summary['rows'])
+    finally:
+        conn.close()
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate a CSV against an import schema without loading it')
+    parser.add_argument('csv')
+    parser.add_argument('--table', required=True, choices=sorted(IMPORT_SCHEMAS))
+    parser.add_argument('--reject-dir', default=str(REJECT_DIR))
+    args = parser.parse_args(argv)
+
+    conn = db.get_db_connection()
+    try:
+        # Dry run: validate against the live keys, then roll the inserts back
+        conn.execute('BEGIN')
+        summary = import_table(conn, args.table, args.csv, args.reject_dir)
+        conn.rollback()
+    finally:
+        conn.close()
+    print(f"{summary['rows']} rows: {summary['loaded']} valid, {summary['rejected']} rejected")
+    for reason, count in sorted(summary['reasons'].items(), key=lambda item: -item[1]):
+        print(f'  {count:>8}  {reason}')
+    if summary['reject_file']:
+        print(f"Rejects written to {summary['reject_file']}")
+    return 1 if summary['rejected'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Single-writer queue with group commit.
+
+All execute_query writes in a process are handed to one writer thread that
+owns a long-lived connection. It drains whatever requests are waiting,
+runs each inside its own SAVEPOINT and commits the whole batch at once, so
+N concurrent writes cost one fsync instead of N connect/commit/close cycles.
+A failing statement only rolls back its own savepoint; every caller gets
+its own rowcount or exception through a Future.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from coordination import retry_on_busy
+from metrics import DB_LOCK_WAIT
+
+MAX_BATCH_SIZE = 128
+# How long the writer waits for more requests before committing a short batch
+BATCH_WINDOW = 0.002
+
+_STOP = object()
+
+class WriteRequest:
+    __slots__ = ('query', 'params', 'future', 'enqueued_at', 'lastrowid')
+
+    def __init__(self, query, params):
+        self.query = query
+        self.params = params
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.lastrowid = None
+
+class WriteQueue:
+    """Serializes writes onto one connection and commits them in groups"""
+
+    def __init__(self, connect, max_batch_size=MAX_BATCH_SIZE, batch_window=BATCH_WINDOW, after_batch=None):
+        self.connect = connect
+        # Called as after_batch(conn, batch_count) on the writer thread, e.g. for checkpoints
+        self.after_batch = after_batch
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = {
+            'submitted': 0,
+            'committed': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_queue_depth': 0,
+            'queue_wait_s': 0.0,
+        }
+        self.batch_sizes = Counter()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='food-rescue-writer', daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=None):
+        with self.lock:
+            thread = self.thread
+        if thread is not None and thread.is_alive():
+            self.requests.put(_STOP)
+            thread.join(timeout)
+
+    def _enqueue(self, query, params):
+        request = WriteRequest(query, params)
+        self.requests.put(request)
+        # After the put: a writer that is exiting either drains this request or
+        # has already cleared self.thread, so start() launches a new one
+        self.start()
+        with self.lock:
+            self.stats['submitted'] += 1
+            depth = self.requests.qsize()
+            if depth > self.stats['max_queue_depth']:
+                self.stats['max_queue_depth'] = depth
+        return request
+
+    def submit(self, query, params=None):
+        """Queue a write; returns a Future resolving to its rowcount"""
+        return self._enqueue(query, params).future
+
+    def execute(self, query, params=None, timeout=None):
+        """Queue a write and wait for its group commit"""
+        return self.submit(query, params).result(timeout)
+
+    def insert(self, query, params=None, timeout=None):
+        """Queue an INSERT and wait for its group commit; returns (rowcount, lastrowid)"""
+        request = self._enqueue(query, params)
+        rowcount = request.future.result(timeout)
+        return rowcount, request.lastrowid
+
+    def metrics(self):
+        """Queue depth and commit-batch statistics"""
+        with self.lock:
+            stats = dict(self.stats)
+            sizes = dict(self.batch_sizes)
+        batches = stats['batches']
+        done = stats['committed'] + stats['failed']
+        stats['queue_depth'] = self.requests.qsize()
+        stats['avg_batch_size'] = done / batches if batches else 0.0
+        stats['avg_queue_wait_ms'] = stats['queue_wait_s'] * 1000 / done if done else 0.0
+        stats['batch_size_histogram'] = dict(sorted(sizes.items()))
+        return stats
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self.requests.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run_batch(self, conn, batch):
+        results = []
+        # Other processes may hold the write lock past busy_timeout; back off and retry
+        with DB_LOCK_WAIT.time():
+            retry_on_busy(conn.execute, 'BEGIN IMMEDIATE')
+        for i, request in enumerate(batch):
+            savepoint = f'w{i}'
+            conn.execute(f'SAVEPOINT {savepoint}')
+            try:
+                cursor = conn.execute(request.query, request.params) if request.params else conn.execute(request.query)
+                request.lastrowid = cursor.lastrowid
+                results.append((request, cursor.rowcount, None))
+                conn.execute(f'RELEASE {savepoint}')
+            except Exception as e:
+                conn.execute(f'ROLLBACK TO {savepoint}')
+                conn.execute(f'RELEASE {savepoint}')
+                results.append((request, None, e))
+        retry_on_busy(conn.commit)
+        return results
+
+    def _run(self):
+        conn = None
+        stopped = sqlite3.OperationalError('write queue stopped')
+        try:
+            try:
+                conn = self.connect()
+            except Exception as e:
+                # No connection, no writer: queued callers get the reason instead of
+                # waiting forever, and the next write starts a fresh writer thread
+                stopped = e
+                return
+            # Transactions are managed explicitly with BEGIN/SAVEPOINT
+            conn.isolation_level = None
+            while True:
+                first = self.requests.get()
+                if first is _STOP:
+                    break
+                batch = self._collect(first)
+                try:
+                    results = self._run_batch(conn, batch)
+                except Exception as e:
+                    # BEGIN or COMMIT itself failed: nothing in the batch is durable
+                    if conn.in_transaction:
+                        conn.rollback()
+                    results = [(request, None, e) for request in batch]
+                now = time.perf_counter()
+                with self.lock:
+                    self.stats['batches'] += 1
+                    self.batch_sizes[len(batch)] += 1
+                    for request, _, error in results:
+                        self.stats['failed' if error else 'committed'] += 1
+                        self.stats['queue_wait_s'] += now - request.enqueued_at
+                for request, rowcount, error in results:
+                    if error is not None:
+                        request.future.set_exception(error)
+                    else:
+                        request.future.set_result(rowcount)
+                if self.after_batch is not None:
+                    try:
+                        self.after_batch(conn, self.stats['batches'])
+                    except Exception:
+                        pass
+        finally:
+            if conn is not None:
+                conn.close()
+            # Fail anything still queued rather than leaving callers blocked
+            with self.lock:
+                while True:
+                    try:
+                        item = self.requests.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        item.future.set_exception(stopped)
+                if self.thread is threading.current_thread():
+                    self.thread = None